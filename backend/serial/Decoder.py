@@ -0,0 +1,239 @@
+"""
+Decoders that turn the frames of a SerialPort into columnar batches.
+
+A batch is a dict {column name: 1-D numpy array}, with the same length for every column,
+so it can be consumed directly by the plot or a recorder.
+"""
+
+import re
+import typing
+
+import numpy as np
+
+from .Structures import SerialSettings
+
+
+# name:type[*scale][+offset]     e.g.  "ax:<i2*0.01, ay:<i2*0.01, t:u4, _pad:V2"
+FIELD_REGEX = re.compile(r"^\s*(\w+)\s*:\s*([<>=|]?[a-zA-Z]\d*)\s*(?:\*\s*([-+]?[0-9.]+(?:[eE][-+]?\d+)?))?\s*(?:([-+])\s*([0-9.]+(?:[eE][-+]?\d+)?))?\s*$")
+
+# CSV separators: tabs and semicolons are translated to commas, '\r' is deleted
+CSV_TRANSLATION = bytes.maketrans(b"\t;", b",,")
+# Runs of separators between values, and separators (or empty lines) around a line end
+CSV_DELIMITERS_REGEX = re.compile(rb"[ ,]+")
+CSV_LINE_END_REGEX = re.compile(rb"[ ,]*\n[ ,\n]*")
+
+
+class PacketField:
+    def __init__(self, name: str, dtype: np.dtype, scale: float = 1.0, offset: float = 0.0):
+        self.name = name
+        self.dtype = dtype
+        self.scale = scale
+        self.offset = offset
+
+    @property
+    def hidden(self) -> bool:
+        """ Fields starting with '_' are padding and are not decoded """
+        return self.name.startswith('_')
+
+
+class PacketLayout:
+    """ Binary layout of a frame: an ordered list of fields with a type, endianness, scale and offset """
+    def __init__(self, fields: typing.List[PacketField]):
+        if len(fields) == 0:
+            raise ValueError("The packet layout has no fields")
+        names = [f.name for f in fields]
+        if len(names) != len(set(names)):
+            raise ValueError("Repeated field names in the packet layout")
+        self.fields = fields
+        self.dtype = np.dtype([(f.name, f.dtype) for f in fields])
+
+    @classmethod
+    def parse(cls, spec: str, endianness: str = "Little") -> 'PacketLayout':
+        """ Parse a layout like "ax:<i2*0.01, ay:i2*0.01+2.5, t:u4".
+        - type: numpy type code (i1, u1, i2, u2, i4, u4, i8, u8, f4, f8, V<n> for padding),
+          optionally prefixed with '<' (little) or '>' (big) endian
+        - endianness: default endianness ("Little" or "Big") for types without prefix
+        """
+        default = '<' if endianness == "Little" else '>'
+        fields = []
+        for item in spec.split(','):
+            if item.strip() == "":
+                continue
+            match = FIELD_REGEX.match(item)
+            if match is None:
+                raise ValueError(f"Invalid field '{item.strip()}' in the packet layout")
+            name, code, scale, sign, offset = match.groups()
+            if code[0] not in '<>=|':
+                code = default + code
+            try:
+                dtype = np.dtype(code)
+            except TypeError:
+                raise ValueError(f"Invalid type '{code}' for field '{name}'")
+            scale = float(scale) if scale is not None else 1.0
+            offset = float(offset) if offset is not None else 0.0
+            offset = -offset if sign == '-' else offset
+            fields.append(PacketField(name, dtype, scale, offset))
+        return cls(fields)
+
+    @property
+    def itemsize(self) -> int:
+        return self.dtype.itemsize
+
+    @property
+    def names(self) -> typing.List[str]:
+        return [f.name for f in self.fields if not f.hidden]
+
+    def columns(self, packets: np.ndarray) -> typing.Dict[str, np.ndarray]:
+        """ Split a structured array into scaled columns """
+        batch = {}
+        for f in self.fields:
+            if f.hidden:
+                continue
+            column = packets[f.name]
+            if f.scale != 1.0 or f.offset != 0.0:
+                column = column * f.scale + f.offset
+            elif not column.dtype.isnative:
+                column = column.astype(column.dtype.newbyteorder('='))
+            batch[f.name] = column
+        return batch
+
+
+class BinaryDecoder:
+    """ Decodes frames with a PacketLayout, all the frames of a read in one np.frombuffer call.
+
+    - If the frames are packets (a header is set), every frame must have the layout size.
+      Shorter frames are counted as errors, longer frames are truncated.
+    - If the port is in raw mode, the frames are a continuous stream and the incomplete
+      packet at the end of a read is kept for the next one.
+    """
+    def __init__(self, layout: PacketLayout, stream: bool = False):
+        self.layout = layout
+        self.stream = stream
+        self.errors = 0             # frames that could not be decoded
+        self.packets = 0            # packets decoded
+        self._remainder = b''
+
+    def reset(self):
+        self._remainder = b''
+
+    def decode(self, frames: typing.List[bytearray]) -> typing.Optional[typing.Dict[str, np.ndarray]]:
+        """ Decode a list of frames. Returns a batch, or None if there is nothing to decode """
+        size = self.layout.itemsize
+        if self.stream:
+            block = self._remainder + b''.join(frames)
+            usable = len(block) - len(block) % size
+            block, self._remainder = block[:usable], block[usable:]
+        else:
+            lengths = set(map(len, frames))
+            if lengths == {size}:
+                block = b''.join(frames)
+            else:
+                valid = [f[:size] for f in frames if len(f) >= size]
+                self.errors += len(frames) - len(valid)
+                block = b''.join(valid)
+
+        if len(block) == 0:
+            return None
+        packets = np.frombuffer(block, dtype=self.layout.dtype)
+        self.packets += len(packets)
+        return self.layout.columns(packets)
+
+
+class CsvLineParser:
+    """ Parser for text streams with one sample per line, like "v1,v2,v3\\n" (Arduino style).
+
+    Values can be separated by commas, semicolons, tabs or spaces. The incomplete line at the
+    end of a read is kept for the next one, and every complete line of a read is converted
+    to a 2-D float array with a single vectorized call.
+    Lines with a different number of values, or with values that are not numbers, are counted
+    as errors (malformed lines) and skipped.
+    """
+    def __init__(self, columns: int = 0, stream: bool = True):
+        self.columns = int(columns)     # 0: use the most common number of values of the first batch
+        self.stream = stream            # False if every frame is already a line (header framing)
+        self.errors = 0                 # malformed lines
+        self.lines = 0                  # lines decoded
+        self._partial = b''
+
+    def reset(self):
+        self._partial = b''
+
+    def feed(self, data: bytes) -> np.ndarray:
+        """ Parse the complete lines of data. Returns an array of shape (lines, columns) """
+        data = self._partial + bytes(data)
+        end = data.rfind(b'\n')
+        if end < 0:
+            self._partial = data
+            return np.empty((0, max(self.columns, 1)))
+        self._partial = data[end + 1:]
+        return self.parse(data[:end])
+
+    def parse(self, block: bytes) -> np.ndarray:
+        """ Parse a block of complete lines (without the last newline) """
+        block = block.translate(CSV_TRANSLATION, b'\r')
+        if b' ' in block or b',,' in block or b',\n' in block or b'\n,' in block or b'\n\n' in block:
+            block = CSV_DELIMITERS_REGEX.sub(b',', CSV_LINE_END_REGEX.sub(b'\n', block))
+        block = block.strip(b' ,\n')
+        if len(block) == 0:
+            return np.empty((0, max(self.columns, 1)))
+
+        # Count the values of every line, without splitting the block
+        chars = np.frombuffer(block, dtype=np.uint8)
+        newlines = np.flatnonzero(chars == ord('\n'))
+        nlines = len(newlines) + 1
+        commas = np.flatnonzero(chars == ord(','))
+        counts = np.bincount(np.searchsorted(newlines, commas), minlength=nlines) + 1
+
+        if self.columns <= 0:
+            # The first line is often incomplete (port opened in the middle of a line)
+            self.columns = int(np.bincount(counts).argmax())
+        columns = self.columns
+
+        # Fast path: every line has the right number of values
+        if np.all(counts == columns):
+            try:
+                values = np.fromstring(block.replace(b'\n', b','), dtype=float, sep=',')
+                if len(values) == nlines * columns:
+                    self.lines += nlines
+                    return values.reshape(nlines, columns)
+            except ValueError:
+                pass
+
+        # Slow path: parse the lines one by one to find the malformed ones
+        rows = []
+        for line, count in zip(block.split(b'\n'), counts):
+            if count != columns:
+                continue
+            try:
+                values = np.fromstring(line, dtype=float, sep=',')
+            except ValueError:
+                continue
+            if len(values) == columns:
+                rows.append(values)
+        self.errors += nlines - len(rows)
+        self.lines += len(rows)
+        if len(rows) == 0:
+            return np.empty((0, columns))
+        return np.vstack(rows)
+
+    def decode(self, frames: typing.List[bytearray]) -> typing.Optional[typing.Dict[str, np.ndarray]]:
+        """ Decode a list of frames into a batch with one column per value ('ch0', 'ch1', ...) """
+        if self.stream:
+            values = self.feed(b''.join(frames))
+        else:
+            values = self.parse(b'\n'.join(frames))
+        if len(values) == 0:
+            return None
+        values = np.ascontiguousarray(values.T)
+        return {f"ch{i}": column for i, column in enumerate(values)}
+
+
+def make_decoder(settings: SerialSettings):
+    """ Create the decoder configured in the settings, or None for raw data.
+    Raises ValueError if the configuration is invalid """
+    if settings['decoder'] == "Binary":
+        layout = PacketLayout.parse(settings['layout'], settings['endianness'])
+        return BinaryDecoder(layout, stream=(len(settings['header']) == 0))
+    if settings['decoder'] == "CSV":
+        return CsvLineParser(int(settings['columns']), stream=(len(settings['header']) == 0))
+    return None
@@ -0,0 +1,159 @@
+import typing
+
+from .Structures import SerialBuffer, SerialSettings
+
+
+def to_bytes(value) -> bytes:
+    """ Convert a header/footer setting to bytes.
+    Hex strings like '0xAA55' are converted to their raw bytes, other strings are UTF-8 encoded.
+    """
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    value = str(value)
+    if len(value) > 2 and value[:2].lower() == '0x':
+        try:
+            return bytes.fromhex(value[2:])
+        except ValueError:
+            pass
+    return value.encode('utf-8')
+
+
+class SerialFramer:
+    """ Resumable frame parser for the header / footer / expected_size framing of a SerialPort
+
+    The framer keeps its scan position between calls, so every byte of the buffer is
+    searched only once, and every complete frame found is returned in a single batch.
+    Frames are returned without their header and footer.
+
+    Framing modes:
+    - no header:                raw mode, everything in the buffer is one frame
+    - header only:              a frame is the data between two consecutive headers
+    - header + expected_size:   a frame is expected_size bytes long, starting at the header
+    - header + footer:          a frame is the data between a header and the next footer
+                                (if expected_size > 0, longer frames are discarded)
+
+    Data that does not start with a header is discarded (resync).
+    """
+    def __init__(self, header: bytes = b'', footer: bytes = b'', expected_size: int = 0):
+        self.header = to_bytes(header)
+        self.footer = to_bytes(footer)
+        self.expected_size = int(expected_size)
+        if self.header and self.expected_size > 0:
+            self.expected_size = max(self.expected_size, len(self.header) + len(self.footer))
+
+        self.frames = 0             # frames returned
+        self.resyncs = 0            # times the framer lost sync and searched a new header
+        self.garbage_bytes = 0      # bytes discarded while searching a header
+        self.dropped_frames = 0     # frames in progress lost (overwritten or too long)
+        self.reset()
+
+    @classmethod
+    def from_settings(cls, settings: SerialSettings) -> 'SerialFramer':
+        return cls(settings['header'], settings['footer'], int(settings['expected_size']))
+
+    def reset(self):
+        """ Forget the scan state (e.g. after clearing the buffer) """
+        self._start = None          # stream position of the header of the frame in progress
+        self._scan = 0              # stream position where the next search starts
+
+    def discard_partial(self, buffer: SerialBuffer):
+        """ Drop the incomplete frame left in the buffer, e.g. when the data that followed it was lost """
+        if len(self.header) > 0 and len(buffer) > 0:
+            if self._start is not None:
+                self.dropped_frames += 1
+            buffer.clear()
+            self.reset()
+
+    def feed(self, buffer: SerialBuffer) -> typing.List[bytearray]:
+        """ Pop every complete frame from the buffer. Returns a (possibly empty) list of frames """
+        if len(self.header) == 0:
+            if len(buffer) == 0:
+                return []
+            self.frames += 1
+            return [buffer.pop_all()]
+
+        # The start of the frame in progress was overwritten by the buffer
+        if self._start is not None and self._start < buffer.tell():
+            self._start = None
+            self.dropped_frames += 1
+            self.resyncs += 1
+        self._scan = max(self._scan, buffer.tell())
+
+        frames = []
+        while self._sync(buffer):
+            frame = self._pop_frame(buffer)
+            if frame is not None:
+                frames.append(frame)
+            elif self._start is not None:
+                break       # Incomplete frame, wait for more data
+        self.frames += len(frames)
+        return frames
+
+    def _sync(self, buffer: SerialBuffer) -> bool:
+        """ Move the buffer to the next header. Returns True if the buffer starts with a header """
+        if self._start is not None:
+            return True
+
+        hlen = len(self.header)
+        index = buffer.find(self.header, self._scan - buffer.tell())
+        if index < 0:
+            # Keep the last bytes, they can be the beginning of a header
+            garbage = len(buffer) - (hlen - 1)
+            if garbage > 0:
+                buffer.discard(garbage)
+                self.garbage_bytes += garbage
+            self._scan = buffer.tell()
+            return False
+
+        if index > 0:
+            buffer.discard(index)
+            self.garbage_bytes += index
+            self.resyncs += 1
+        self._start = buffer.tell()
+        self._scan = self._start + hlen
+        return True
+
+    def _resync(self, buffer: SerialBuffer):
+        """ Drop the frame in progress and search the next header after its start """
+        self._start = None
+        self._scan = buffer.tell() + 1
+        self.dropped_frames += 1
+        self.resyncs += 1
+
+    def _pop_frame(self, buffer: SerialBuffer) -> typing.Optional[bytearray]:
+        """ Pop the frame at the front of the buffer (which starts with a header).
+        Returns None if the frame is incomplete or was discarded """
+        hlen = len(self.header)
+        position = buffer.tell()
+
+        if len(self.footer) > 0:
+            index = buffer.find(self.footer, self._scan - position)
+            end = index + len(self.footer)
+            if self.expected_size > 0 and (end > self.expected_size or (index < 0 and len(buffer) > self.expected_size)):
+                self._resync(buffer)
+                return None
+            if index < 0:
+                self._scan = position + max(hlen, len(buffer) - len(self.footer) + 1)
+                return None
+            frame = buffer.peek(hlen, index)
+            buffer.discard(end)
+            self._start = None
+
+        elif self.expected_size > 0:
+            if len(buffer) < self.expected_size:
+                return None
+            frame = buffer.peek(hlen, self.expected_size)
+            buffer.discard(self.expected_size)
+            self._start = None
+
+        else:
+            index = buffer.find(self.header, self._scan - position)
+            if index < 0:
+                self._scan = position + max(hlen, len(buffer) - hlen + 1)
+                return None
+            frame = buffer.peek(hlen, index)
+            buffer.discard(index)
+            self._start = buffer.tell()     # The next frame starts at this header
+
+        self._scan = buffer.tell() + (hlen if self._start is not None else 0)
+        return frame
@@ -4,37 +4,63 @@ from PyQt5.QtSerialPort import QSerialPort, QSerialPortInfo
 from utils.ParamList import ParameterList, NumParam, ChoiceParam, BoolParam, TextParam
 
 from dataclasses import dataclass
+import time
 import typing
 
 from .Structures import PortInfo, SerialSettings
 # from Structures import PortInfo, SerialSettings
 
 from .Port import SerialPort
+from .Hotplug import DeviceWatcher
 
 class SerialPortScannerThread(QThread):
-    portScanned = pyqtSignal(dict)
-    onScanInterval = pyqtSignal()
-
-    available_ports: typing.Dict[str, PortInfo] = {}
-
-    time_interval = 1
+    """
+    Keeps the list of available ports up to date.
+
+    The thread sleeps on a DeviceWatcher and queries QSerialPortInfo when a serial device
+    appears or disappears in /dev (or every time_interval seconds if it has to poll), and every
+    busy_interval seconds to refresh the busy status (a port opened or closed by another program).
+    Every change emits portsAdded / portsRemoved with the delta and portScanned with all the ports.
+    Signals are emitted without holding the mutex.
+    """
+    portScanned = pyqtSignal(dict)      # all the available ports {name: PortInfo}
+    portsAdded = pyqtSignal(dict)       # new ports {name: PortInfo}
+    portsRemoved = pyqtSignal(list)     # names of the removed ports
+
+    time_interval = 1           # polling interval (s), if the device events are not available
+    settle_time = 100           # wait (ms) for a burst of device events to end before scanning
+    retry_time = 500            # rescan delay (ms) if a device event did not change the ports yet
+    busy_interval = 5           # refresh interval (s) of the busy status of the ports
 
     def __init__(self):
         super().__init__()
         self.mutex = QMutex()
+        self.available_ports: typing.Dict[str, PortInfo] = {}
+        self.watcher = DeviceWatcher()      # created here, so stop() can interrupt it before the thread starts
 
     def scan_ports(self) -> typing.Dict[str, PortInfo]:
+        """ Query the available ports now, emit the signals if they changed. Returns a copy of the ports """
         with QMutexLocker(self.mutex):
-            self.__scan_ports()
-        return self.available_ports
-
-    def __scan_ports(self) -> typing.Dict[str, PortInfo]:
+            added, removed, busyChanged = self.__scan_ports()
+            available_ports = dict(self.available_ports)
+        if len(added) > 0 or len(removed) > 0 or busyChanged:
+            self._emit_changes(available_ports, added, removed)
+        return available_ports
+
+    def __scan_ports(self) -> typing.Tuple[typing.Dict[str, PortInfo], typing.List[str], bool]:
+        """ Update available_ports. Returns the added ports, the names of the removed ports and
+        whether the busy status of a known port changed """
+        added = {}
+        busyChanged = False
         scannedPorts = []
         for port in QSerialPortInfo.availablePorts():
 
             # If the port is already in the available_ports dict, update the busy status
             if port.portName() in self.available_ports:
-                self.available_ports[port.portName()].busy = port.isBusy()
+                portInfo = self.available_ports[port.portName()]
+                busy = port.isBusy()
+                busyChanged = busyChanged or busy != portInfo.busy
+                portInfo.busy = busy
             
             # If the port is not in the available_ports dict, add it
             else:
@@ -46,29 +72,68 @@ class SerialPortScannerThread(QThread):
                     portInfo.baudrates.append(str(baudrate))
                 portInfo.busy = port.isBusy()
                 self.available_ports[port.portName()] = portInfo
+                added[port.portName()] = portInfo
             scannedPorts.append(port.portName())
 
         # Remove ports that are no longer available
-        for port in list(self.available_ports.keys()):
-            if port not in scannedPorts:
-                self.available_ports.pop(port, None)
+        removed = [port for port in self.available_ports if port not in scannedPorts]
+        for port in removed:
+            self.available_ports.pop(port, None)
+
+        return added, removed, busyChanged
 
-        return self.available_ports
+    def _emit_changes(self, available_ports: typing.Dict[str, PortInfo], added: typing.Dict[str, PortInfo], removed: typing.List[str]):
+        if len(removed) > 0:
+            self.portsRemoved.emit(removed)
+        if len(added) > 0:
+            self.portsAdded.emit(added)
+        self.portScanned.emit(available_ports)
 
     def run(self):
-        while True:
+        watcher = self.watcher
+        with QMutexLocker(self.mutex):
+            self.__scan_ports()
+            available_ports = dict(self.available_ports)
+        self.portScanned.emit(available_ports)
+
+        timeout = self.busy_interval if watcher.event_driven else self.time_interval
+        busyTime = time.monotonic() + self.busy_interval
+        while not watcher.stopped:
+            if not watcher.wait(timeout):
+                if not watcher.stopped and time.monotonic() >= busyTime:
+                    busyTime = time.monotonic() + self.busy_interval
+                    self.scan_ports()       # refresh the busy status
+                continue
+            # Coalesce the events of one plug / unplug (a device can create several nodes)
+            while watcher.wait(self.settle_time / 1000):
+                pass
+            if watcher.stopped:
+                break
             with QMutexLocker(self.mutex):
-                available_ports = self.__scan_ports()
-                self.portScanned.emit(available_ports)
-                self.onScanInterval.emit()
-            self.sleep(self.time_interval)  # sleep for time_interval seconds
+                before = set(self.available_ports)
+            ports = self.scan_ports()
+            # The device node can appear before the port is registered (e.g. by udev)
+            if watcher.event_driven and set(ports) == before:
+                watcher.wait(self.retry_time / 1000)
+                if not watcher.stopped:
+                    self.scan_ports()
+            busyTime = time.monotonic() + self.busy_interval
+
+    def stop(self):
+        """ Stop the thread and wait for it to finish """
+        self.watcher.stop()
+        self.wait()
+        self.watcher.close()
 
 
 
 class SerialPortsHandler(QObject):
 
     portScanned = pyqtSignal(dict)
+    portsAdded = pyqtSignal(dict)               # new ports {name: PortInfo}
+    portsRemoved = pyqtSignal(list)             # names of the ports that disappeared
     activePortsChanged = pyqtSignal(dict)
+    portMetrics = pyqtSignal(str, dict)         # port name, PortMetrics snapshot (about once per second per port)
 
     def __init__(self):
         super().__init__()
@@ -79,30 +144,67 @@ class SerialPortsHandler(QObject):
         self.portScannerThread = SerialPortScannerThread()
         self.portScannerThread.portScanned.connect(self._handle_scanned_ports)
         self.portScannerThread.portScanned.connect(self.portScanned)
-        self.portScannerThread.onScanInterval.connect(self.check_byte_rate)
+        self.portScannerThread.portsAdded.connect(self.portsAdded)
+        self.portScannerThread.portsRemoved.connect(self.portsRemoved)
         self.portScannerThread.start()
 
-    def on_port_data_received(self, port: str, callback: typing.Callable[[bytearray], None]):
+    def stop(self):
+        """ Close the active ports and stop the port scanner thread """
+        for port in list(self._active_ports.keys()):
+            self.close_port(port)
+        self.portScannerThread.stop()
+
+    def on_port_data_received(self, port: str, callback: typing.Callable, max_rate: typing.Optional[float] = None, batched: bool = False):
         """ 
-        Connect or disconnect a callback function to the dataReceived signal of a port.
+        Connect or disconnect a callback function to the data of a port.
         - port: str
         - callback: callable function or None
             - If None, disconnect the signal
-            - If a function, connect the signal to a callback function that receives a bytearray
+            - If a function, connect the signal to a callback function that receives a bytearray per frame,
+              see max_rate and batched
+        - max_rate: maximum number of calls per second (e.g. 30 or 60), or None for a call per frame.
+            With a max_rate, the callback receives the frames of each period concatenated in one bytearray,
+            and optionally (data, chunks, ends, times) with the number of frames merged, and the end offset
+            and read time (time.monotonic) of every read merged.
+        - batched: without max_rate, call the callback once per read with the list of its frames, instead
+            of once per frame with a bytearray
+        """
+        if port in self._active_ports:
+            try:
+                if callback is None:
+                    self._active_ports[port].unsubscribe()
+                else:
+                    self._active_ports[port].subscribe(callback, max_rate, batched)
+            except:
+                pass
+
+    def on_port_batch_received(self, port: str, callback: typing.Callable[[dict], None]):
+        """
+        Connect or disconnect a callback function to the decoded batches of a port.
+        - port: str
+        - callback: callable function that receives a batch {column: np.ndarray} per read (see Decoder), or None to disconnect
         """
         if port in self._active_ports:
             try:
                 if callback is None:
-                    self._active_ports[port].dataReceived.disconnect()
+                    self._active_ports[port].batchReceived.disconnect()
                 else:
-                    self._active_ports[port].dataReceived.connect(callback)
+                    self._active_ports[port].batchReceived.connect(callback)
             except:
                 pass
 
+    def buffer_stats(self, port: str) -> typing.Optional[dict]:
+        """ Buffer statistics of an active port (capacity, used, policy, high_water, bytes_dropped, frames_dropped),
+        or None if the port is not active """
+        if port not in self._active_ports:
+            return None
+        return self._active_ports[port].buffer_stats()
+
     def is_port_active(self, port: str) -> bool:
         return (port in self._active_ports)
 
     def scan_ports(self):
+        """ Query the available ports now (the scanner thread only does it when a device changes) """
         ports = self.portScannerThread.scan_ports()
         self._handle_scanned_ports(ports)
 
@@ -136,12 +238,16 @@ class SerialPortsHandler(QObject):
         """
         return dict(self.available_ports)
 
-    def check_byte_rate(self):
-        for port in list(self._active_ports.keys()):
-            if port in self.available_ports:
-                bytesRead = self._active_ports[port].bytesRead
-                self.available_ports[port].bytesPerSecond = bytesRead / self.portScannerThread.time_interval
-                self._active_ports[port].bytesRead = 0
+    def metrics(self, port: str) -> typing.Optional[dict]:
+        """ PortMetrics snapshot of an active port (rates, errors, buffer fill, latency), or None if not active """
+        if port not in self._active_ports:
+            return None
+        return self._active_ports[port].metrics_snapshot()
+
+    def _handle_port_metrics(self, port: str, metrics: dict):
+        if port in self.available_ports:
+            self.available_ports[port].bytesPerSecond = metrics["bytes_per_second"]
+        self.portMetrics.emit(port, metrics)
             
     def _handle_scanned_ports(self, available_ports: typing.Dict[str, PortInfo]):
         self.available_ports = available_ports
@@ -168,6 +274,7 @@ class SerialPortsHandler(QObject):
         
         serialPort = SerialPort(settings)
         if serialPort.connect():
+            serialPort.metricsUpdated.connect(lambda metrics, p=port: self._handle_port_metrics(p, metrics))
             self._active_ports[port] = serialPort
             self.activePortsChanged.emit(self._active_ports)
             return serialPort
@@ -175,7 +282,8 @@ class SerialPortsHandler(QObject):
             return None
 
     def close_port(self, name):
-        if name in self._active_ports and self._active_ports[name].ser.isOpen():
+        """ Close an active port (and stop its reader thread, if any) """
+        if name in self._active_ports and self._active_ports[name].isOpen():
             self._active_ports[name].close()
             self._active_ports.pop(name, None)
             self.activePortsChanged.emit(self._active_ports)
@@ -0,0 +1,133 @@
+"""
+Serial device hotplug detection.
+
+On Linux, the /dev directory is watched with inotify (through ctypes, no extra dependency),
+so the thread sleeps until a tty node is created or deleted. Elsewhere, or if inotify is not
+available, the watcher falls back to polling.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import typing
+
+
+# Device nodes of serial ports (ttyUSB0, ttyACM0, ttyS0, rfcomm0, cu.usbserial on macOS, ...)
+DEVICE_PREFIXES = ("tty", "rfcomm", "cu.")
+
+# inotify constants (linux/inotify.h)
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+IN_EVENT = struct.Struct("iIII")    # wd, mask, cookie, len (followed by len bytes of name)
+
+
+def _inotify_libc():
+    """ The libc with the inotify functions, or None if not available """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1, libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class DeviceWatcher:
+    """ Waits until a serial device appears or disappears.
+
+    - inotify mode (Linux): wait() blocks until a tty node is created, deleted or renamed in /dev
+    - polling mode: wait() sleeps for the timeout and compares the tty nodes of /dev
+      (if /dev can not be listed, e.g. on Windows, every timeout is reported as a change)
+
+    stop() makes the current and every later wait() return at once, from any thread.
+    """
+    def __init__(self, path: str = "/dev", prefixes: typing.Tuple[str, ...] = DEVICE_PREFIXES):
+        self.path = path
+        self.prefixes = prefixes
+        self._fd = -1
+        self._stopEvent = threading.Event()
+        self._wakeRead, self._wakeWrite = -1, -1     # pipe written by stop(), never drained: select() returns at once
+        self._devices = self._list_devices()
+
+        libc = _inotify_libc()
+        if libc is None:
+            return
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return
+        mask = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+        if libc.inotify_add_watch(fd, os.fsencode(path), mask) < 0:
+            print(f"DeviceWatcher: inotify on {path} failed ({os.strerror(ctypes.get_errno())}), polling")
+            os.close(fd)
+            return
+        self._fd = fd
+        self._wakeRead, self._wakeWrite = os.pipe()
+
+    @property
+    def event_driven(self) -> bool:
+        return self._fd >= 0
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopEvent.is_set()
+
+    def _list_devices(self) -> typing.Optional[typing.Set[str]]:
+        try:
+            return {name for name in os.listdir(self.path) if name.startswith(self.prefixes)}
+        except OSError:
+            return None
+
+    def wait(self, timeout: float) -> bool:
+        """ Wait up to timeout seconds (None: until a change). Returns True if the serial devices changed """
+        if not self.event_driven:
+            if self._stopEvent.wait(timeout):
+                return False
+            devices = self._list_devices()
+            changed = devices is None or devices != self._devices
+            self._devices = devices
+            return changed
+
+        ready, _, _ = select.select([self._fd, self._wakeRead], [], [], timeout)
+        if self._wakeRead in ready:
+            return False
+        return self._fd in ready and self._read_events()
+
+    def _read_events(self) -> bool:
+        """ Read the pending inotify events. Returns True if one of them is a serial device """
+        changed = False
+        while True:
+            try:
+                data = os.read(self._fd, 4096)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset + IN_EVENT.size <= len(data):
+                _, mask, _, length = IN_EVENT.unpack_from(data, offset)
+                offset += IN_EVENT.size
+                name = data[offset:offset + length].rstrip(b"\0").decode(errors="replace")
+                offset += length
+                if mask & IN_Q_OVERFLOW or name.startswith(self.prefixes):
+                    changed = True
+
+    def stop(self):
+        """ Interrupt the current wait() and make the next ones return at once """
+        self._stopEvent.set()
+        if self._wakeWrite >= 0:
+            os.write(self._wakeWrite, b"\0")
+
+    def close(self):
+        """ Release the file descriptors. Only once no thread waits or stops the watcher """
+        for fd in (self._fd, self._wakeRead, self._wakeWrite):
+            if fd >= 0:
+                os.close(fd)
+        self._fd, self._wakeRead, self._wakeWrite = -1, -1, -1
@@ -0,0 +1,120 @@
+from PyQt5.QtCore import QMutex, QMutexLocker
+
+import time
+import typing
+
+import numpy as np
+
+
+class PortMetrics:
+    """
+    Throughput and latency metrics of a serial port, over a sliding window.
+
+    Counters are kept in time slots (window / slots seconds each) measured with a monotonic
+    clock, so recording an event is O(1) and the rates do not depend on how often they are read.
+    Events can be recorded from the reader thread while the GUI takes snapshots.
+
+    Tracked:
+    - bytes/s and frames/s
+    - parse errors (framer resyncs and decoder errors)
+    - buffer fill
+    - read-to-emit latency histogram (time from reading the data to delivering its frames)
+    """
+    # Upper edges of the latency histogram bins, in seconds (the last bin is open)
+    LATENCY_EDGES = [50e-6, 100e-6, 200e-6, 500e-6, 1e-3, 2e-3, 5e-3, 10e-3, 20e-3, 50e-3, 100e-3, 200e-3, 500e-3, 1.0]
+
+    def __init__(self, window: float = 1.0, slots: int = 10):
+        self.mutex = QMutex()
+        self.window = window
+        self.slots = slots
+        self.slotTime = window / slots
+        self._edges = np.array(self.LATENCY_EDGES)
+        self.reset()
+
+    def reset(self):
+        with QMutexLocker(self.mutex):
+            self._start = time.monotonic()
+            self._slot = int(self._start / self.slotTime)
+            self._counts = np.zeros((self.slots, 3), dtype=np.int64)       # bytes, frames, errors
+            self._latency = np.zeros((self.slots, len(self._edges) + 1), dtype=np.int64)
+            self._totals = np.zeros(3, dtype=np.int64)
+            self._errorCount = 0        # cumulative parse error count of the last read
+            self._bufferUsed = 0
+            self._bufferCapacity = 0
+
+    def _advance(self, now: float) -> int:
+        """ Clear the slots that left the window. Returns the index of the current slot """
+        slot = int(now / self.slotTime)
+        if slot != self._slot:
+            for s in range(self._slot + 1, min(slot, self._slot + self.slots) + 1):
+                self._counts[s % self.slots] = 0
+                self._latency[s % self.slots] = 0
+            self._slot = slot
+        return slot % self.slots
+
+    def record_read(self, nbytes: int, frames: int, error_count: int = 0, now: typing.Optional[float] = None):
+        """ Record a read of nbytes that completed frames.
+        - error_count: parse errors counted since the port was (re)connected, the new ones are the
+          difference with the previous read (a lower count, e.g. of the framer before a reset, adds none) """
+        now = time.monotonic() if now is None else now
+        with QMutexLocker(self.mutex):
+            errors = max(0, error_count - self._errorCount)
+            self._errorCount = error_count
+            i = self._advance(now)
+            self._counts[i, 0] += nbytes
+            self._counts[i, 1] += frames
+            self._counts[i, 2] += errors
+            self._totals += (nbytes, frames, errors)
+
+    def record_latency(self, readTime: float, now: typing.Optional[float] = None):
+        """ Record the delivery of data read at readTime (time.monotonic) """
+        now = time.monotonic() if now is None else now
+        with QMutexLocker(self.mutex):
+            i = self._advance(now)
+            self._latency[i, np.searchsorted(self._edges, now - readTime)] += 1
+
+    def set_buffer_fill(self, used: int, capacity: int):
+        self._bufferUsed = used
+        self._bufferCapacity = capacity
+
+    def snapshot(self) -> dict:
+        """ Current metrics as a dict:
+        - bytes_per_second, frames_per_second, errors_per_second: rates over the window
+        - bytes_total, frames_total, parse_errors: totals since the last reset
+        - buffer_used, buffer_capacity, buffer_fill (0 to 1)
+        - latency_edges (s), latency_counts (len(edges) + 1 bins) over the window
+        - latency_p50, latency_p99 (s, upper edge of the bin), None if there was no delivery
+        """
+        now = time.monotonic()
+        with QMutexLocker(self.mutex):
+            self._advance(now)
+            counts = self._counts.sum(axis=0)
+            latency = self._latency.sum(axis=0)
+            totals = self._totals.copy()
+
+        # The current slot is only partially elapsed
+        elapsed = min(self.window - self.slotTime + (now % self.slotTime), now - self._start)
+        elapsed = max(elapsed, 1e-9)
+        capacity = self._bufferCapacity
+        return {
+            "bytes_per_second": float(counts[0] / elapsed),
+            "frames_per_second": float(counts[1] / elapsed),
+            "errors_per_second": float(counts[2] / elapsed),
+            "bytes_total": int(totals[0]),
+            "frames_total": int(totals[1]),
+            "parse_errors": int(totals[2]),
+            "buffer_used": self._bufferUsed,
+            "buffer_capacity": capacity,
+            "buffer_fill": self._bufferUsed / capacity if capacity > 0 else 0.0,
+            "latency_edges": list(self.LATENCY_EDGES),
+            "latency_counts": latency.tolist(),
+            "latency_p50": self._percentile(latency, 0.50),
+            "latency_p99": self._percentile(latency, 0.99),
+        }
+
+    def _percentile(self, counts: np.ndarray, q: float) -> typing.Optional[float]:
+        total = counts.sum()
+        if total == 0:
+            return None
+        index = int(np.searchsorted(np.cumsum(counts), q * total))
+        return self.LATENCY_EDGES[index] if index < len(self.LATENCY_EDGES) else float('inf')
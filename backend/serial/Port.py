@@ -1,20 +1,73 @@
-from PyQt5.QtCore import QObject, pyqtSignal, QThread, QTimer, QMutex, QMutexLocker
+from PyQt5.QtCore import QObject, pyqtSignal, QThread, QTimer, QMutex, QMutexLocker, QMetaObject, Qt, Q_RETURN_ARG, QByteArray
 from PyQt5.QtSerialPort import QSerialPort, QSerialPortInfo
 
 from utils.ParamList import ParameterList, NumParam, ChoiceParam, BoolParam, TextParam
 
+import time
 import typing
 
+import numpy as np
+
 
 from backend.serial.Structures import SerialBuffer, SerialSettings
+from backend.serial.Framer import SerialFramer
+from backend.serial.Decoder import make_decoder
+from backend.serial.Worker import SerialReaderWorker
+from backend.serial.Metrics import PortMetrics
+
+class DataCoalescer(QObject):
+    """ Accumulates the frames of a port and emits them concatenated, at most max_rate times per second.
+    dataReady carries the data, the number of chunks (frames) that were merged, and for every read
+    merged its end offset in the data (np.int64 array) and its read time (time.monotonic, np.float64 array) """
+    dataReady = pyqtSignal(bytearray, int, object, object)
+
+    def __init__(self, max_rate: float):
+        super().__init__()
+        self.max_rate = max_rate
+        self._data = bytearray()
+        self._chunks = 0
+        self._ends = []
+        self._times = []
+        self.timer = QTimer(self)
+        self.timer.setInterval(max(1, int(1000 / max_rate)))
+        self.timer.timeout.connect(self.flush)
+
+    def push(self, frames: typing.List[bytearray], readTime: typing.Optional[float] = None):
+        for frame in frames:
+            self._data += frame
+        self._chunks += len(frames)
+        self._ends.append(len(self._data))
+        self._times.append(time.monotonic() if readTime is None else readTime)
+
+    def flush(self):
+        if self._chunks == 0:
+            return
+        data, chunks = self._data, self._chunks
+        ends, times = np.array(self._ends, dtype=np.int64), np.array(self._times, dtype=np.float64)
+        self._data = bytearray()
+        self._chunks = 0
+        self._ends = []
+        self._times = []
+        self.dataReady.emit(data, chunks, ends, times)
+
+    def has_subscribers(self) -> bool:
+        return self.receivers(self.dataReady) > 0
+
+    def stop(self):
+        self.timer.stop()
+        self.deleteLater()
+
 
 class SerialPort(QObject):
     portClosed = pyqtSignal()
     errorOcurred = pyqtSignal(str)
-    dataReceived = pyqtSignal(bytearray)
+    dataReceived = pyqtSignal(bytearray)    # one emit per frame, only if something is connected
+    framesReceived = pyqtSignal(list)       # every frame found in one read, as a list of bytearray
+    batchReceived = pyqtSignal(object)      # decoded frames of one read, as a dict {column: np.ndarray}
+    writeRequested = pyqtSignal(bytes)      # forwards send() to the reader thread
+    metricsUpdated = pyqtSignal(dict)       # PortMetrics snapshot, every metricsInterval ms
+    metricsInterval = 1000
     emittingDataFlag = True
-    buffer = SerialBuffer(max_size=1024)
-    bytesRead = 0
 
     # [ ] (2) SerialPort: Rewrite the __init__ method to use the SerialSettings class for configuration
     def __init__(self, settings: SerialSettings):
@@ -23,16 +76,44 @@ class SerialPort(QObject):
         self.ser.errorOccurred.connect(self._serial_error_handler)
         self.ser.readyRead.connect(self._handle_read)
         self.settings = settings
+        self.buffer = SerialBuffer(int(settings['buffer_size']), settings['overflow'])
+        self.framer = SerialFramer.from_settings(settings)
+        self.bufferMutex = QMutex()     # guards buffer and framer: the reader thread updates them while the GUI reads the stats
+        self.decoder = None
+        self.worker = None          # SerialReaderWorker, if the port is read from its own thread
+        self.workerThread = None
+        self.coalescers: typing.Dict[float, DataCoalescer] = {}    # rate-limited subscribers, by max rate
+        self.frameSubscribers: typing.List[typing.Callable] = []    # callbacks connected to framesReceived by subscribe
+
+        self.metrics = PortMetrics()
+        self.metricsTimer = QTimer(self)
+        self.metricsTimer.setInterval(self.metricsInterval)
+        self.metricsTimer.timeout.connect(self._emit_metrics)
 
 
     def connect(self) -> bool:
         """ Connect to the serial port. Returns True if the connection was successful, otherwise False."""
         print("SerialPort::connect()")
         try:
-            self.ser.setPortName(self.settings['port'])
-            self.ser.setBaudRate(self.settings.asInt('baudrate'))
+            self._stop_worker()
+            if self.ser.isOpen():
+                self.ser.close()
+
+            self.buffer = SerialBuffer(int(self.settings['buffer_size']), self.settings['overflow'])
+            self.framer = SerialFramer.from_settings(self.settings)
+            self.decoder = make_decoder(self.settings)
 
-            if self.ser.open(QSerialPort.OpenModeFlag.ReadWrite):
+            if self.settings['reader_thread']:
+                opened = self._start_worker()
+            else:
+                self.ser.setPortName(self.settings['port'])
+                self.ser.setBaudRate(self.settings.asInt('baudrate'))
+                self.ser.setReadBufferSize(self.read_buffer_size())
+                opened = self.ser.open(QSerialPort.OpenModeFlag.ReadWrite)
+
+            if opened:
+                self.metrics.reset()
+                self.metricsTimer.start()
                 return True
             else:
                 self.errorOcurred.emit(f"Error opening {self.settings['port']}")
@@ -83,6 +164,52 @@ class SerialPort(QObject):
                 self.errorOcurred.emit(f"Undefined Error {str(error)} on {self.settings['port']}")
 
 
+    def subscribe(self, callback: typing.Callable, max_rate: typing.Optional[float] = None, batched: bool = False):
+        """ Connect a callback to the data of the port.
+        - max_rate: None to call the callback once per frame with a bytearray (dataReceived),
+          or the maximum number of calls per second.
+          Rate-limited callbacks receive the frames received since the last call concatenated, and can
+          take more arguments: the number of frames merged, and the end offsets and read times of the
+          reads merged (see DataCoalescer).
+        - batched: without max_rate, call the callback once per read with the list of its frames
+          (framesReceived) instead of once per frame, which is cheaper at high frame rates
+        """
+        if max_rate is None or max_rate <= 0:
+            if batched:
+                self.framesReceived.connect(callback)
+                self.frameSubscribers.append(callback)
+            else:
+                self.dataReceived.connect(callback)
+            return
+        if max_rate not in self.coalescers:
+            self.coalescers[max_rate] = DataCoalescer(max_rate)
+            self.coalescers[max_rate].timer.start()
+        self.coalescers[max_rate].dataReady.connect(callback)
+
+    def unsubscribe(self, callback: typing.Optional[typing.Callable] = None):
+        """ Disconnect a callback (or every callback, if None) from the data of the port """
+        if callback is None:
+            if self.receivers(self.dataReceived) > 0:
+                self.dataReceived.disconnect()
+            for subscriber in self.frameSubscribers:
+                self.framesReceived.disconnect(subscriber)
+            self.frameSubscribers.clear()
+            for coalescer in self.coalescers.values():
+                coalescer.stop()
+            self.coalescers.clear()
+            return
+
+        for signal in [self.dataReceived, self.framesReceived] + [c.dataReady for c in self.coalescers.values()]:
+            try:
+                signal.disconnect(callback)
+            except TypeError:
+                pass        # not connected to this signal
+        self.frameSubscribers = [subscriber for subscriber in self.frameSubscribers if subscriber != callback]
+        for rate, coalescer in list(self.coalescers.items()):
+            if not coalescer.has_subscribers():
+                coalescer.stop()
+                self.coalescers.pop(rate)
+
     def pause(self):
         self.emittingDataFlag = False
 
@@ -90,45 +217,94 @@ class SerialPort(QObject):
         self.emittingDataFlag = True
 
     def send(self, data):
-        self.ser.write(data)
+        if self.worker is not None:
+            self.writeRequested.emit(bytes(data))
+        else:
+            self.ser.write(data)
+
+    def read_buffer_size(self) -> int:
+        """ Size of the QSerialPort read buffer: limited to the buffer capacity with the Block policy,
+        so the device is held back (by the OS buffer and flow control) instead of losing data here """
+        if self.buffer.policy == SerialBuffer.BLOCK:
+            return self.buffer.max_size
+        return 0    # unlimited
+
+    def buffer_stats(self) -> dict:
+        """ Capacity, usage and loss counters of the port buffer """
+        with QMutexLocker(self.bufferMutex):
+            stats = {
+                "capacity": self.buffer.max_size,
+                "used": len(self.buffer),
+                "policy": self.buffer.policy,
+                "high_water": self.buffer.high_water,
+                "bytes_dropped": self.buffer.dropped_bytes,
+                "frames_dropped": self.framer.dropped_frames,
+            }
+        if self.worker is not None:
+            stats["frames_dropped"] += self.worker.droppedFrames
+        return stats
+
+    def metrics_snapshot(self) -> dict:
+        """ Current PortMetrics snapshot, with the buffer fill updated """
+        with QMutexLocker(self.bufferMutex):
+            used, capacity = len(self.buffer), self.buffer.max_size
+        self.metrics.set_buffer_fill(used, capacity)
+        return self.metrics.snapshot()
+
+    def _emit_metrics(self):
+        self.metricsUpdated.emit(self.metrics_snapshot())
+
+    def isOpen(self) -> bool:
+        if self.worker is not None:
+            return self.worker.isOpen()
+        return self.ser.isOpen()
 
     def close(self):
+        self.metricsTimer.stop()
+        self._stop_worker()
+        self.unsubscribe()
         self.portClosed.emit()
         del self.ser
 
+    def _start_worker(self) -> bool:
+        """ Open the port in a new reader thread. Returns True if the port was opened """
+        self.worker = SerialReaderWorker(self)
+        self.workerThread = QThread()
+        self.worker.moveToThread(self.workerThread)
+        self.workerThread.finished.connect(self.worker.deleteLater)     # deleted in its thread once the loop ends
+        self.worker.batchReady.connect(self._handle_batches)
+        self.writeRequested.connect(self.worker.write)
+        self.workerThread.start()
+
+        opened = QMetaObject.invokeMethod(self.worker, "open", Qt.BlockingQueuedConnection, Q_RETURN_ARG(bool))
+        if not opened:
+            self._stop_worker()
+        return opened
+
+    def _stop_worker(self):
+        if self.worker is None:
+            return
+        QMetaObject.invokeMethod(self.worker, "close", Qt.BlockingQueuedConnection)
+        self.writeRequested.disconnect(self.worker.write)
+        self.workerThread.quit()
+        self.workerThread.wait()
+        self._handle_batches()      # deliver what was already read
+        self.workerThread.deleteLater()
+        self.worker = None
+        self.workerThread = None
+
     @property
     def port(self):
         return self.settings['port']
 
     def _handle_read(self):
-        if self.ser.bytesAvailable():
+        if hasattr(self, 'ser') and self.ser.bytesAvailable():
             try:
-                newData = self.ser.readAll()
-                output = None
-
-                if len(newData) > 0:
-                    self.bytesRead += len(newData)
-                    self.buffer.push(newData)              # Add the data to the buffer
-
-                # Process the buffer in packets (if a header is set)
-                if len(self.settings['header']) > 0 and len(self.settings['footer']) == 0:
-                    while self.buffer.count(self.settings['header']) > 1:
-                        psize = self.settings['expected_size']
-                        output = self.buffer.pop_from(self.settings['header'], psize)
-
-                # Process the buffer in packets (if a header and footer are set)
-                elif len(self.settings['header']) > 0 and len(self.settings['footer']) > 0:
-                    while self.settings['header'] in self.buffer and self.settings['footer'] in self.buffer:
-                        output = self.buffer.pop_from_to(self.settings['header'], self.settings['footer'])
-
-                # Process the buffer in raw data
-                else:
-                    if len(self.buffer) > 0:
-                        output = self.buffer.pop_all()
-
-                if output is not None and self.emittingDataFlag and len(output) > 0:  # Ignore empty packets
-                    self.dataReceived.emit(output)
-
+                result = self._process(self._read(self.ser))
+                if result is not None:
+                    self._deliver(*result)
+                if self.ser.bytesAvailable():
+                    QTimer.singleShot(0, self._handle_read)    # Block policy: read the rest once there is room
 
             except ValueError as e:
                 self.errorOcurred.emit(str(e))
@@ -137,4 +313,71 @@ class SerialPort(QObject):
             except Exception as e:
                 self.errorOcurred.emit(str(e))
                 print(e)
-                return
\ No newline at end of file
+                return
+
+    def _handle_batches(self):
+        """ Deliver the results queued by the reader thread """
+        if self.worker is None:
+            return
+        for result in self.worker.take_all():
+            self._deliver(*result)
+
+    def _read(self, ser: QSerialPort):
+        """ Read the available data. With the Block policy, only what fits in the buffer is read:
+        nothing while it is full, the data stays in the QSerialPort / OS buffer until there is room """
+        if self.buffer.policy == SerialBuffer.BLOCK:
+            with QMutexLocker(self.bufferMutex):
+                free = self.buffer.free()
+            if free == 0:
+                return QByteArray()
+            return ser.read(min(ser.bytesAvailable(), free))
+        return ser.readAll()
+
+    def _process(self, newData) -> typing.Optional[typing.Tuple[list, typing.Optional[dict], float]]:
+        """ Frame and decode new data. Runs in the thread that reads the port.
+        Returns (frames, batch, readTime), or None if no frame is complete """
+        readTime = time.monotonic()
+        with QMutexLocker(self.bufferMutex):
+            dropped = 0
+            if len(newData) > 0:
+                dropped = self.buffer.push(newData)    # Add the data to the buffer
+
+            # Pop every complete frame (or all the raw data if no header is set)
+            frames = [frame for frame in self.framer.feed(self.buffer) if len(frame) > 0]  # Ignore empty packets
+
+            # The newest data was dropped: the frame left in the buffer can not be completed
+            if dropped > 0 and self.buffer.policy != SerialBuffer.DROP_OLDEST:
+                self.framer.discard_partial(self.buffer)
+
+            # Block: a buffer still full after popping the frames holds a frame longer than the buffer,
+            # it would never make room for the next read
+            if self.buffer.policy == SerialBuffer.BLOCK and self.buffer.free() == 0:
+                self.buffer.dropped_bytes += len(self.buffer)
+                self.framer.discard_partial(self.buffer)
+            resyncs = self.framer.resyncs
+
+        # Decode all the frames at once
+        batch = None
+        if len(frames) > 0 and self.decoder is not None:
+            batch = self.decoder.decode(frames)
+
+        errorCount = resyncs + (self.decoder.errors if self.decoder is not None else 0)
+        self.metrics.record_read(len(newData), len(frames), errorCount, readTime)
+
+        if len(frames) == 0:
+            return None
+        return frames, batch, readTime
+
+    def _deliver(self, frames: typing.List[bytearray], batch: typing.Optional[dict], readTime: float):
+        """ Emit the frames and the decoded batch of one read. Runs in the GUI thread """
+        if not self.emittingDataFlag:
+            return
+        self.metrics.record_latency(readTime)
+        if self.receivers(self.dataReceived) > 0:
+            for frame in frames:
+                self.dataReceived.emit(frame)
+        for coalescer in self.coalescers.values():
+            coalescer.push(frames, readTime)
+        self.framesReceived.emit(frames)
+        if batch is not None:
+            self.batchReceived.emit(batch)
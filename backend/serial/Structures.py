@@ -1,3 +1,4 @@
+import collections
 import typing
 
 from utils.ParamList import ParameterList, NumParam, ChoiceParam, BoolParam, TextParam, ConstParam
@@ -25,39 +26,215 @@ class SerialSettings(ParameterList):
             NumParam("timeout", (0, 1), step=.001, value=.05, text="Timeout (s)"),
             TextParam("header", "", "Header"),
             TextParam("footer", "", "Footer"),
-            NumParam("expected_size", (0, 1024), value=0, text="Expected Size")
+            NumParam("expected_size", (0, 1024), value=0, text="Expected Size"),
+            ChoiceParam("decoder", ["None", "Binary", "CSV"], value="None", text="Decoder"),
+            TextParam("layout", "", "Binary Layout (name:type*scale+offset, ...)", regex="^$|^[a-zA-Z0-9_:<>=\\*\\+\\-\\.,\\s]*$"),
+            ChoiceParam("endianness", ["Little", "Big"], value="Little", text="Endianness"),
+            NumParam("columns", (0, 64), value=0, text="CSV Columns (0 = auto)"),
+            BoolParam("reader_thread", value=False, text="Reader Thread"),
+            NumParam("buffer_size", (1024, 4194304), value=65536, text="Buffer Size (bytes)"),
+            ChoiceParam("overflow", SerialBuffer.POLICIES, value=SerialBuffer.DROP_OLDEST, text="Buffer Overflow"),
         ])
 
 
 class SerialBuffer:
-    def __init__(self, max_size=1024):
-        self.max_size = max_size
-        self.buffer = bytearray()
+    """ Fixed-capacity ring buffer for incoming serial data
+
+    The bytes are written once, in a ring of max_size bytes followed by a mirror area of the
+    same size. When the unread region wraps around the end of the ring, its wrapped part is
+    copied to the mirror area the first time it has to be read contiguously (search, peek,
+    pop), so the unread region can always be searched or viewed through a memoryview without
+    copying, and a push only costs one copy of its data. Popping only moves the read cursor,
+    so the cost of a pop depends on the size of the popped data, not on the size of the buffer.
+
+    Raw streams (push then pop_all) never touch the ring: a chunk pushed into an empty buffer
+    is kept as it is until something else has to read it, so pop_all returns it directly.
+
+    When a push exceeds the capacity, the overflow policy decides what is lost:
+    - DROP_OLDEST:  the oldest bytes are dropped
+    - DROP_NEWEST:  the bytes that do not fit are dropped
+    - BLOCK:        the reader should not push more than free() bytes (backpressure),
+                    anything pushed beyond that is dropped like DROP_NEWEST
+    Dropped bytes and the high-water mark are counted.
+    """
+    DROP_OLDEST = "Drop Oldest"
+    DROP_NEWEST = "Drop Newest"
+    BLOCK = "Block"
+    POLICIES = [DROP_OLDEST, DROP_NEWEST, BLOCK]
+    COUNT_SCAN = 4096       # count() rescans up to this many unread bytes, it is faster than the bookkeeping
+
+    def __init__(self, max_size=1024, policy=DROP_OLDEST):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Invalid overflow policy '{policy}'")
+        self.max_size = int(max_size)
+        self.policy = policy
+        self.dropped_bytes = 0      # bytes lost because the buffer was full
+        self.high_water = 0         # maximum number of unread bytes
+        self._data = bytearray(2 * self.max_size)
+        self._view = memoryview(self._data)
+        self._head = 0          # read cursor, in [0, max_size)
+        self._size = 0          # number of unread bytes
+        self._position = 0      # stream position of the read cursor (bytes consumed so far)
+        self._mirrored = 0      # bytes at the start of the ring already copied to the mirror area
+        self._chunk = None      # the whole unread data (bytes), when it was pushed into an empty buffer (not in the ring yet)
+        self._counts = {}       # item -> [stream positions of its occurrences, stream position to scan from], None if it can overlap itself
 
     def clear(self):
-        self.buffer.clear()
+        self._position += self._size
+        self._head = 0
+        self._size = 0
+        self._mirrored = 0
+        self._chunk = None
+
+    @property
+    def buffer(self) -> memoryview:
+        """ Read-only view of the unread data (valid until the next push/pop) """
+        self._contiguous()
+        return self._view[self._head:self._head + self._size].toreadonly()
+
+    def free(self) -> int:
+        """ Number of bytes that can be pushed without dropping data """
+        return self.max_size - self._size
+
+    def push(self, data: bytes) -> int:
+        """ Add data to the buffer. Returns the number of bytes dropped """
+        n = len(data)
+        if self._size == 0 and n <= self.max_size:
+            # Raw fast path (_head and _mirrored are 0 when the buffer is empty): keep the chunk,
+            # it is only written to the ring if something else than pop_all reads it
+            self._chunk = data if type(data) is bytes else bytes(data)     # immutable, so it can be kept without a copy
+            self._size = n
+            if n > self.high_water:
+                self.high_water = n
+            return 0
+        if n == 0:
+            return 0
+        if not isinstance(data, (bytes, bytearray)):
+            data = bytes(data)          # e.g. QByteArray or memoryview
+        self._flush()
+        cap = self.max_size
+        dropped = 0
+        if self.policy != self.DROP_OLDEST and self._size + n > cap:
+            dropped = self._size + n - cap
+            data = data[:n - dropped]
+            n -= dropped
+            if n == 0:
+                self.dropped_bytes += dropped
+                return dropped
+        elif n >= cap:
+            # Only the last max_size bytes survive
+            dropped = self._size + n - cap
+            self._position += dropped
+            data = data[n - cap:]
+            n = cap
+            self._head = 0
+            self._size = 0
+            self._mirrored = 0
+        elif self._size + n > cap:
+            dropped = self._size + n - cap
+            self._consume(dropped)
+
+        self._write(data)
+        self.high_water = max(self.high_water, self._size)
+        self.dropped_bytes += dropped
+        return dropped
+
+    def _write(self, data) -> None:
+        """ Append data (at most free() bytes) to the ring """
+        cap = self.max_size
+        n = len(data)
+        write = self._head + self._size
+        if write >= cap:
+            write -= cap
+        end = write + n
+        if end <= cap:
+            self._data[write:end] = data
+        else:
+            first = cap - write
+            self._data[write:cap] = data[:first]
+            self._data[:n - first] = data[first:]
+        self._size += n
+
+    def _flush(self) -> None:
+        """ Write the kept chunk to the ring """
+        if self._chunk is not None:
+            chunk, self._chunk = self._chunk, None
+            self._size = 0
+            self._write(chunk)
+
+    def _contiguous(self) -> None:
+        """ Make _data[_head:_head + _size] the unread data: copy the part that wrapped around the ring to the mirror area """
+        if self._chunk is not None:
+            self._flush()
+        wrapped = self._head + self._size - self.max_size
+        if wrapped > self._mirrored:
+            cap = self.max_size
+            self._data[cap + self._mirrored:cap + wrapped] = self._view[self._mirrored:wrapped]
+            self._mirrored = wrapped
 
-    def push(self, data: bytes) -> None:
-        """ Add data to the buffer """
-        self.buffer.extend(data)
-        if len(self.buffer) > self.max_size:
-            self.buffer = self.buffer[-self.max_size:]
+    def _consume(self, size: int) -> None:
+        """ Advance the read cursor by size bytes """
+        if self._chunk is not None:
+            self._flush()
+        self._position += size
+        self._size -= size
+        if self._size == 0:
+            self._head = 0
+            self._mirrored = 0
+        else:
+            self._head += size
+            if self._head >= self.max_size:
+                # The unread data does not wrap any more, the mirror area is stale
+                self._head -= self.max_size
+                self._mirrored = 0
+
+    def _find(self, item: bytes, start: int = 0) -> int:
+        """ Index of item relative to the read cursor, or -1 """
+        self._contiguous()
+        index = self._data.find(item, self._head + start, self._head + self._size)
+        return -1 if index < 0 else index - self._head
+
+    def _copy(self, start: int, end: int) -> bytearray:
+        self._contiguous()
+        return self._data[self._head + start:self._head + end]
+
+    def tell(self) -> int:
+        """ Stream position of the first unread byte (total bytes consumed or dropped so far) """
+        return self._position
+
+    def find(self, item: bytes, start: int = 0) -> int:
+        """ Index of item relative to the first unread byte, searching from start. Returns -1 if not found """
+        return self._find(item, max(start, 0))
+
+    def peek(self, start: int, end: int) -> bytearray:
+        """ Copy of the unread data between start and end, without popping it """
+        return self._copy(start, min(end, self._size))
+
+    def discard(self, size: int) -> None:
+        """ Drop size bytes from the front of the buffer """
+        self._consume(min(size, self._size))
 
     def to_ascii(self) -> str:
         """ Convert the buffer to an ASCII string """
-        return self.buffer.decode("ascii")
+        return self._copy(0, self._size).decode("ascii")
 
     def pop_all(self) -> bytearray:
         """ Pop all data from the buffer """
-        data = bytearray(self.buffer)
-        self.buffer.clear()
+        chunk = self._chunk
+        if chunk is not None:
+            self._chunk = None
+            self._position += self._size
+            self._size = 0
+            return bytearray(chunk)
+        data = self._copy(0, self._size)
+        self.clear()
         return data
 
     def pop_bytes(self, size: int) -> bytearray:
         """ Pop a specific amount of bytes from the buffer """
-        if len(self.buffer) >= size:
-            data = bytearray(self.buffer[:size])
-            self.buffer = self.buffer[size:]
+        if self._size >= size:
+            data = self._copy(0, size)
+            self._consume(size)
             return data
         else:
             raise ValueError("The buffer does not contain enough data to pop the specified size")
@@ -69,19 +246,21 @@ class SerialBuffer:
         - header: bytes
         - size: int (optional)
         """
-        if header not in self.buffer:
+        self._contiguous()
+        head = self._head
+        index = self._data.find(header, head, head + self._size) - head
+        if index < 0:
             raise ValueError("The buffer does not contain the specified header")
-        index = self.buffer.index(header)
         if size > 0:
-            if len(self.buffer) >= index + size:
-                output = bytearray(self.buffer[:index])
-                self.buffer = self.buffer[index + size:]  # Adjust for the length of the header
+            if self._size >= index + size:
+                output = self._data[head:head + index]
+                self._consume(index + size)  # Adjust for the length of the header
                 return output
             else:
                 raise ValueError("The buffer does not contain enough data to pop the specified size")
         else:
-            output = bytearray(self.buffer[:index])
-            self.buffer = self.buffer[index + len(header):]
+            output = self._data[head:head + index]
+            self._consume(index + len(header))
             return output
         
     def pop_from_to(self, header: bytes, footer: bytes) -> bytearray:
@@ -91,23 +270,51 @@ class SerialBuffer:
         - header: bytes
         - footer: bytes
         """
-        if header not in self.buffer or footer not in self.buffer:
-            raise ValueError("The buffer does not contain the specified header or footer")
-        index0 = self.buffer.index(header)
-        index1 = self.buffer.index(footer, index0 + len(header))
-        if index0 < index1:
-            output = bytearray(self.buffer[index0:index1])
-            self.buffer = self.buffer[index1 + len(footer):]
-            return output
-        else:
+        self._contiguous()
+        head, end = self._head, self._head + self._size
+        index0 = self._data.find(header, head, end)
+        index1 = -1 if index0 < 0 else self._data.find(footer, index0 + len(header), end)
+        if index1 < 0:
             raise ValueError("The buffer does not contain the specified header or footer")
+        output = self._data[index0:index1]
+        self._consume(index1 + len(footer) - head)
+        return output
             
     def count(self, item: bytes) -> int:
-        """ Count the number of occurrences of an item in the buffer """
-        return self.buffer.count(item)
+        """ Count the number of occurrences of an item in the buffer
+
+        The occurrences found in large buffers are remembered (as stream positions), so the next calls
+        only scan the data pushed since then. Items that can overlap themselves are counted from scratch.
+        """
+        self._contiguous()
+        head, end = self._head, self._head + self._size
+        if self._size <= self.COUNT_SCAN:
+            return self._data.count(item, head, end)
+        occurrences = self._counts.get(item)
+        if occurrences is None:
+            length = len(item)
+            overlaps = length == 0 or any(item[:k] == item[-k:] for k in range(1, length))
+            occurrences = None if overlaps else [collections.deque(), self._position]
+            self._counts[bytes(item)] = occurrences
+        if occurrences is None:
+            return self._data.count(item, head, end)
+        length = len(item)
+        positions = occurrences[0]
+        while len(positions) > 0 and positions[0] < self._position:
+            positions.popleft()         # consumed
+        offset = self._position - head         # stream position of _data[0]
+        index = self._data.find(item, max(occurrences[1], self._position) - offset, end)
+        scanned = self._position
+        while index >= 0:
+            positions.append(index + offset)
+            scanned = index + length + offset
+            index = self._data.find(item, index + length, end)
+        # A partial occurrence at the end can be completed by the next push
+        occurrences[1] = max(scanned, end - length + 1 + offset)
+        return len(positions)
 
     def __contains__(self, item):
-        return item in self.buffer
+        return self._find(item) >= 0
 
     def __len__(self):
-        return len(self.buffer)
\ No newline at end of file
+        return self._size
@@ -0,0 +1,36 @@
+import codecs
+import time
+import typing
+
+import numpy as np
+
+
+class TextDecoder:
+    """ Incremental UTF-8 decoder for the data of a port, that also times every line.
+
+    The decoder keeps the bytes of a character split between two reads until it is complete,
+    so multibyte characters are never broken. Invalid bytes are replaced by U+FFFD.
+    The arrival time of every line is the read time of the data that contains its '\\n'
+    (in UTF-8 a '\\n' byte is always a '\\n' character), returned as a float64 array.
+    """
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def reset(self):
+        self._decoder.reset()
+
+    def decode(self, data: bytes, ends: typing.Optional[np.ndarray] = None, times: typing.Optional[np.ndarray] = None) -> typing.Tuple[str, np.ndarray]:
+        """ Decode data. Returns the text and the arrival time of each '\\n' of data.
+        - ends, times: end offset in data and read time of every read merged in data (see DataCoalescer),
+          or None to use the current time for every line
+        """
+        return self._decoder.decode(bytes(data)), line_times(data, ends, times)
+
+
+def line_times(data: bytes, ends: typing.Optional[np.ndarray] = None, times: typing.Optional[np.ndarray] = None) -> np.ndarray:
+    """ Arrival time of each '\\n' of data, from the end offset and read time of the reads merged in data """
+    newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord('\n'))
+    if ends is None or times is None or len(times) == 0:
+        return np.full(len(newlines), time.monotonic())
+    reads = np.minimum(np.searchsorted(ends, newlines, side='right'), len(times) - 1)
+    return np.asarray(times, dtype=np.float64)[reads]
@@ -0,0 +1,99 @@
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot, QTimer
+from PyQt5.QtSerialPort import QSerialPort
+
+import queue
+import typing
+
+
+class SerialReaderWorker(QObject):
+    """
+    Reads a serial port from its own QThread.
+
+    The QSerialPort is created inside the worker thread, and the framing and decoding of the
+    SerialPort are done there too. The results are handed to the GUI thread through a bounded
+    queue: when the queue is full, the oldest batch is dropped (and counted in droppedBatches).
+    batchReady is emitted only when the GUI has to be woken up, not once per read.
+    """
+    batchReady = pyqtSignal()
+
+    def __init__(self, port, queue_size: int = 256):
+        super().__init__()
+        self.port = port            # SerialPort that owns this worker (provides settings and _process)
+        self.ser = None
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.droppedBatches = 0     # batches dropped because the queue was full
+        self.droppedFrames = 0      # frames of the dropped batches
+        self._notified = False
+
+    @pyqtSlot(result=bool)
+    def open(self) -> bool:
+        """ Open the port. Must run in the worker thread """
+        settings = self.port.settings
+        self.ser = QSerialPort()
+        self.ser.errorOccurred.connect(self._serial_error_handler)
+        self.ser.readyRead.connect(self._handle_read)
+        self.ser.setPortName(settings['port'])
+        self.ser.setBaudRate(settings.asInt('baudrate'))
+        self.ser.setReadBufferSize(self.port.read_buffer_size())
+        return self.ser.open(QSerialPort.OpenModeFlag.ReadWrite)
+
+    @pyqtSlot()
+    def close(self):
+        """ Close the port. Must run in the worker thread """
+        if self.ser is not None:
+            self.ser.close()
+            self.ser.deleteLater()
+            self.ser = None
+
+    @pyqtSlot(bytes)
+    def write(self, data: bytes):
+        if self.ser is not None:
+            self.ser.write(data)
+
+    def _serial_error_handler(self, error):
+        # Handled in this thread, the SerialPort only emits errorOcurred(str) to the GUI
+        self.port._serial_error_handler(error)
+
+    def isOpen(self) -> bool:
+        return self.ser is not None and self.ser.isOpen()
+
+    def _handle_read(self):
+        if self.ser is None or not self.ser.bytesAvailable():
+            return
+        try:
+            result = self.port._process(self.port._read(self.ser))
+        except Exception as e:
+            self.port.errorOcurred.emit(str(e))
+            print(e)
+            return
+
+        if result is not None:
+            self._enqueue(result)
+        if self.ser.bytesAvailable():
+            QTimer.singleShot(0, self._handle_read)    # Block policy: read the rest once there is room
+
+    def _enqueue(self, result: tuple):
+        try:
+            self.queue.put_nowait(result)
+        except queue.Full:
+            try:
+                frames = self.queue.get_nowait()[0]
+                self.droppedBatches += 1
+                self.droppedFrames += len(frames)
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(result)
+
+        if not self._notified:
+            self._notified = True
+            self.batchReady.emit()
+
+    def take_all(self) -> typing.List[tuple]:
+        """ Pop every queued result. Called from the GUI thread """
+        self._notified = False
+        results = []
+        while True:
+            try:
+                results.append(self.queue.get_nowait())
+            except queue.Empty:
+                return results
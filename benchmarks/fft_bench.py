@@ -0,0 +1,63 @@
+"""
+Benchmark of the FFT backend (utils/FFT.py) against the previous path of the waveform viewer:
+signal.get_window + np.fft.rfft of the exact length of the (padded) capture.
+
+Run from the repository root:
+    python benchmarks/fft_bench.py
+"""
+
+import os
+import sys
+import timeit
+
+import numpy as np
+from scipy import signal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.FFT import amplitude_spectrum, next_fast_len, rfft, WORKERS
+
+
+def legacy_spectrum(y, Ts, window):
+    """ Copy of the previous FFT mode of WaveformViewerWidget, kept here as the reference """
+    y = y * signal.get_window(window, len(y))
+    return np.fft.rfftfreq(len(y), d=Ts), np.abs(np.fft.rfft(y)) / len(y)
+
+
+def legacy_frames(frames):
+    return np.abs(np.fft.rfft(frames, axis=1))
+
+
+def best(func, repeat=3):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+# Lengths of real captures: 10 s at 44.1 kHz plus a padding of 1, one million samples plus 3 (prime),
+# a minute at 48 kHz with 2 * 1000 padding samples, and a power of two for reference
+CAPTURES = {
+    "10 s @ 44.1 kHz + 1": 441001,
+    "1M + 3 (prime)": 1000003,
+    "60 s @ 48 kHz + 2000": 2882000,
+    "2**20": 1 << 20,
+}
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    print(f"FFT workers: {WORKERS}")
+    print(f"{'capture':<24} {'length':>9} {'fft length':>11} {'legacy (ms)':>12} {'backend (ms)':>13} {'speedup':>9}")
+    for name, length in CAPTURES.items():
+        y = rng.standard_normal(length)
+        legacy = best(lambda: legacy_spectrum(y, 1e-3, 'hann'))
+        backend = best(lambda: amplitude_spectrum(y, 1e-3, 'hann'))
+        print(f"{name:<24} {length:>9} {next_fast_len(length):>11} {legacy * 1e3:>12.2f} {backend * 1e3:>13.2f} {legacy / backend:>8.2f}x")
+
+    # Spectrogram frames: one batched FFT of many segments, split between the workers
+    print(f"\n{'frames':<24} {'nperseg':>9} {'legacy (ms)':>24} {'backend (ms)':>13} {'speedup':>9}")
+    for count, nperseg in ((2000, 1024), (500, 8192)):
+        frames = rng.standard_normal((count, nperseg))
+        legacy = best(lambda: legacy_frames(frames))
+        backend = best(lambda: np.abs(rfft(frames, nperseg, axis=1)))
+        print(f"{count:<24} {nperseg:>9} {legacy * 1e3:>24.2f} {backend * 1e3:>13.2f} {legacy / backend:>8.2f}x")
@@ -0,0 +1,122 @@
+""" 
+Microbenchmark of the ring buffer SerialBuffer against the previous (reslicing) implementation.
+
+Run from the repository root:
+    python benchmarks/serial_buffer_bench.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.serial.Structures import SerialBuffer
+
+
+class LegacySerialBuffer:
+    """ Copy of the bytearray based SerialBuffer, kept here as the reference """
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.buffer = bytearray()
+
+    def push(self, data: bytes) -> None:
+        self.buffer.extend(data)
+        if len(self.buffer) > self.max_size:
+            self.buffer = self.buffer[-self.max_size:]
+
+    def pop_all(self) -> bytearray:
+        data = bytearray(self.buffer)
+        self.buffer.clear()
+        return data
+
+    def pop_from(self, header: bytes, size: int = 0) -> bytearray:
+        if header not in self.buffer:
+            raise ValueError("The buffer does not contain the specified header")
+        index = self.buffer.index(header)
+        if size > 0:
+            if len(self.buffer) >= index + size:
+                output = bytearray(self.buffer[:index])
+                self.buffer = self.buffer[index + size:]
+                return output
+            else:
+                raise ValueError("The buffer does not contain enough data to pop the specified size")
+        else:
+            output = bytearray(self.buffer[:index])
+            self.buffer = self.buffer[index + len(header):]
+            return output
+
+    def pop_from_to(self, header: bytes, footer: bytes) -> bytearray:
+        if header not in self.buffer or footer not in self.buffer:
+            raise ValueError("The buffer does not contain the specified header or footer")
+        index0 = self.buffer.index(header)
+        index1 = self.buffer.index(footer, index0 + len(header))
+        if index0 < index1:
+            output = bytearray(self.buffer[index0:index1])
+            self.buffer = self.buffer[index1 + len(footer):]
+            return output
+        else:
+            raise ValueError("The buffer does not contain the specified header or footer")
+
+    def count(self, item: bytes) -> int:
+        return self.buffer.count(item)
+
+    def __contains__(self, item):
+        return item in self.buffer
+
+    def __len__(self):
+        return len(self.buffer)
+
+
+HEADER = b'\xaa\x55'
+FOOTER = b'\r\n'
+PAYLOAD = bytes(range(12))
+
+
+def make_chunk(frames: int, footer: bool) -> bytes:
+    frame = HEADER + PAYLOAD + (FOOTER if footer else b'')
+    return frame * frames
+
+
+def run_header_footer(buf, chunk):
+    buf.push(chunk)
+    while HEADER in buf and FOOTER in buf:
+        try:
+            buf.pop_from_to(HEADER, FOOTER)
+        except ValueError:
+            break
+
+
+def run_header_size(buf, chunk):
+    buf.push(chunk)
+    while buf.count(HEADER) > 1:
+        buf.pop_from(HEADER, len(HEADER) + len(PAYLOAD))
+    buf.pop_all()
+
+
+def run_raw(buf, chunk):
+    for _ in range(64):
+        buf.push(chunk)
+        buf.pop_all()
+
+
+def bench(name, func, capacity, chunk, repeat=5):
+    results = []
+    for cls in (LegacySerialBuffer, SerialBuffer):
+        buf = cls(max_size=capacity)
+        timer = timeit.Timer(lambda: func(buf, chunk))
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=repeat, number=number)) / number
+        results.append(best)
+    legacy, ring = results
+    print(f"{name:<28} {capacity:>9} {len(chunk):>9} {legacy * 1e3:>12.3f} {ring * 1e3:>12.3f} {legacy / ring:>8.2f}x")
+
+
+if __name__ == '__main__':
+    print(f"{'case':<28} {'capacity':>9} {'chunk':>9} {'legacy (ms)':>12} {'ring (ms)':>12} {'speedup':>9}")
+    for capacity in (1024, 16 * 1024, 256 * 1024):
+        frames = capacity // (len(HEADER) + len(PAYLOAD) + len(FOOTER))
+        bench("header + footer", run_header_footer, capacity, make_chunk(frames, footer=True))
+        frames = capacity // (len(HEADER) + len(PAYLOAD))
+        bench("header + expected_size", run_header_size, capacity, make_chunk(frames, footer=False))
+        bench("raw push/pop_all", run_raw, capacity, make_chunk(frames // 4, footer=False))
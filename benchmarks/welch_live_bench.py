@@ -0,0 +1,77 @@
+"""
+Benchmark of the live Welch FFT of WaveformViewerWidget: samples appended in real time (chunks
+of a 1 MS/s stream, as PlotPage appends the batches of a channel) while the Qt event loop runs,
+so the refresh timer competes with the appends as in the application.
+
+Reports the samples appended per second, the refreshes per second (at most liveRate) and the
+time of a refresh (renderLive) and of an append.
+
+Run from the repository root:
+    python benchmarks/welch_live_bench.py
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+
+from frontend.widgets.WaveformViewerWidget import WaveformViewerWidget
+
+
+RATE = 1_000_000        # samples per second of the stream
+CHUNK = 10_000          # samples per batch (100 batches per second)
+DURATION = 5.0          # seconds
+
+
+def run(app, viewer, segment):
+    viewer.settingsDialog.settings["welchSegment"] = segment
+    viewer.settingsDialog.settings["welchOverlap"] = segment // 2
+    viewer.stopLive()
+    renders, appends = [], []
+    render = viewer.renderLive
+
+    def timed_render():
+        start = time.perf_counter()
+        render()
+        renders.append(time.perf_counter() - start)
+    viewer.liveTimer.timeout.disconnect()
+    viewer.liveTimer.timeout.connect(timed_render)
+
+    rng = np.random.default_rng(0)
+    chunk = rng.standard_normal(CHUNK)
+    start = time.perf_counter()
+    sent = 0
+    while time.perf_counter() - start < DURATION:
+        # Append the samples due by now, then let the event loop run the refreshes
+        due = int((time.perf_counter() - start) * RATE) // CHUNK
+        while sent < due:
+            t0 = time.perf_counter()
+            viewer.appendSamples(chunk, RATE)
+            appends.append(time.perf_counter() - t0)
+            sent += 1
+        app.processEvents()
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    viewer.liveTimer.timeout.disconnect()
+    viewer.liveTimer.timeout.connect(render)
+    return sent * CHUNK / elapsed, len(renders) / elapsed, np.median(renders), np.median(appends)
+
+
+if __name__ == '__main__':
+    app = QApplication.instance() or QApplication([])
+    viewer = WaveformViewerWidget()
+    viewer.resize(1200, 600)
+    viewer.show()
+    viewer.plotTypeMenu.call_selected_option("Welch FFT")
+    print(f"Stream: {RATE / 1e6:.0f} MS/s in chunks of {CHUNK}, refresh rate: {viewer.liveRate}/s, {DURATION:.0f} s per segment size")
+    print(f"{'segment':>8} {'samples/s':>12} {'refreshes/s':>12} {'refresh (ms)':>13} {'append (ms)':>12}")
+    for segment in (1024, 4096, 16384, 65536):
+        samples, refreshes, render, append = run(app, viewer, segment)
+        print(f"{segment:>8} {samples:>12.0f} {refreshes:>12.1f} {render * 1e3:>13.2f} {append * 1e3:>12.2f}")
+    viewer.stopLive()
@@ -1,14 +1,20 @@
-from PyQt5.QtWidgets import QHBoxLayout
+from PyQt5.QtWidgets import QHBoxLayout, QFileDialog
 
 from frontend.pages.BaseClassPage import BaseClassPage
-from frontend.widgets.BasicWidgets import DropDownMenu, Button, NumberInput
+from frontend.widgets.BasicWidgets import DropDownMenu, Button, NumberInput, SwitchButton
 from frontend.widgets.ConsoleWidget import ConsoleWidget
+from frontend.widgets.HexViewWidget import HexViewWidget
+
+from backend.serial.TextDecoder import TextDecoder, line_times
+from utils.LineStore import LineStore, DiskLineStore
 
 class MonitorPage(BaseClassPage):
 
     title = "Monitor"
 
     def initUI(self, layout):
+        self.textDecoders = {}      # port -> TextDecoder, keeps the characters split between two reads
+        self.hexEnabled = False     # the hex view only gets the data while it is on
         self.initTopLayout(layout)
     
     def initTopLayout(self, layout):
@@ -22,10 +28,14 @@ class MonitorPage(BaseClassPage):
         closeButton = Button("Close Monitor", on_click=self.close_monitor)
         reconnectButton = Button("Reconnect", on_click=self.reconnect)
 
-        maxLines = NumberInput("Max Lines", interval=(1, 10000), step=1, default=1000, on_change=self.on_max_lines_changed)
+        self.scrollback = NumberInput("Scrollback (MB)", interval=(1, 1024), step=1, default=16, on_change=self.on_scrollback_changed)
+        self.diskScrollbackButton = SwitchButton("Disk Scrollback On", "Disk Scrollback Off", on_click=self.on_disk_scrollback)
+        hexButton = SwitchButton("Hex View On", "Hex View Off", on_click=self.on_hex_view)
 
         # add a console widget to display the serial port data
-        self.consoleWidget = ConsoleWidget()
+        self.consoleWidget = ConsoleWidget(memoryBudget=16 * 1024 * 1024)
+        self.hexWidget = HexViewWidget(memoryBudget=16 * 1024 * 1024)
+        self.hexWidget.hide()
 
         # add the widgets to the layout
         hTopLayout = QHBoxLayout()
@@ -34,12 +44,15 @@ class MonitorPage(BaseClassPage):
         hTopLayout.addWidget(openButton)
         hTopLayout.addWidget(closeButton)
         hTopLayout.addSpacing(20)
-        hTopLayout.addWidget(maxLines)
+        hTopLayout.addWidget(self.scrollback)
+        hTopLayout.addWidget(self.diskScrollbackButton)
+        hTopLayout.addWidget(hexButton)
         hTopLayout.addStretch(1)
         hTopLayout.addWidget(reconnectButton)
 
         layout.addLayout(hTopLayout)
         layout.addWidget(self.consoleWidget)
+        layout.addWidget(self.hexWidget)
 
     def close_monitor(self):
         port = self.portMenu.selected_title
@@ -49,13 +62,19 @@ class MonitorPage(BaseClassPage):
     def open_monitor(self):
         port = self.portMenu.selected_title
         if self.model.serial.is_port_active(port):
-            self.model.serial.on_port_data_received(port, self.on_data_received)
-
-    def on_data_received(self, data: bytearray):
-        try:
-            self.consoleWidget.appendText(data.decode())
-        except UnicodeDecodeError:
-            self.consoleWidget.appendText(str(data))
+            self.textDecoders[port] = TextDecoder()
+            self.model.serial.on_port_data_received(port, lambda data, chunks, ends, times, p=port: self.on_data_received(data, ends, times, p), max_rate=30)
+
+    def on_data_received(self, data: bytearray, ends=None, times=None, port: str = None):
+        if self.hexEnabled:
+            self.hexWidget.appendData(data)
+        decoder = self.textDecoders.setdefault(port, TextDecoder())
+        if self.consoleWidget.store.binary:
+            decoder.reset()
+            self.consoleWidget.appendText(bytes(data), line_times(data, ends, times))     # Session file: keep the raw bytes
+        else:
+            text, lineTimes = decoder.decode(data, ends, times)
+            self.consoleWidget.appendText(text, lineTimes)
 
     def on_active_ports_changed(self, active_ports):
         self.portMenu.set_options(active_ports)
@@ -71,8 +90,41 @@ class MonitorPage(BaseClassPage):
             self.model.serial.open_port(port_settings)
             self.open_monitor()
 
-    def on_max_lines_changed(self, value):
-        self.consoleWidget.consoleOutput.document().setMaximumBlockCount(value)
+    def on_scrollback_changed(self, value):
+        self.consoleWidget.setMemoryBudget(int(value) * 1024 * 1024)
+        self.hexWidget.setMemoryBudget(int(value) * 1024 * 1024)
+
+    def on_hex_view(self, enabled: bool):
+        """ Show the received bytes as a hex dump instead of text.
+        In memory, the hex view keeps the bytes received while it is on (the console only keeps the decoded
+        text), and releases them when it is turned off. With a disk scrollback it shows the whole session file """
+        self.hexEnabled = enabled
+        if not enabled:
+            self.hexWidget.clear()
+        self.hexWidget.setVisible(enabled)
+        self.consoleWidget.setVisible(not enabled)
+
+    def on_disk_scrollback(self, enabled: bool):
+        """ Write the session to a file (paged in with mmap) instead of keeping a scrollback in memory """
+        if enabled:
+            path, _ = QFileDialog.getSaveFileName(self, "Session File", "session.log", "Log Files (*.log);;All Files (*)")
+            if len(path) == 0:
+                self.diskScrollbackButton.set_value(False)
+                return
+            try:
+                store = DiskLineStore(path)
+            except OSError as e:
+                print(f"Could not open the session file: {e}")
+                self.diskScrollbackButton.set_value(False)
+                return
+        else:
+            store = LineStore(int(self.scrollback.current_value) * 1024 * 1024)
+
+        previous = self.consoleWidget.store
+        self.consoleWidget.setStore(store)
+        self.hexWidget.setStore(store if store.binary else None)   # The hex view reads the session file
+        if isinstance(previous, DiskLineStore):
+            previous.close()
 
     def on_tab_focus(self):
         print("on_tab_focus")
@@ -1,16 +1,289 @@
+from PyQt5.QtWidgets import QHBoxLayout, QLabel
+from PyQt5.QtCore import QTimer, QRectF
+
+import pyqtgraph as pg
 
 from frontend.pages.BaseClassPage import BaseClassPage
+from frontend.widgets.BasicWidgets import DropDownMenu, Button, NumberInput, SwitchButton
+from frontend.widgets.WaveformViewerWidget import WaveformViewerWidget
+
+from utils.RingBuffer import RingBuffer
+from utils.PlotData import minmax_decimate
+from utils.Spectral import StreamingSTFT
 
+import time
+import typing
 
+import numpy as np
 
 
 class PlotPage(BaseClassPage):
+    """
+    Live plot of the decoded channels of a port.
+
+    Every batch is only copied into a fixed-length ring buffer per channel (the last window
+    seconds at the sample rate). The curves are persistent PlotCurveItems, updated with setData
+    from a timer at most fps times per second with the min/max envelope of the window at the
+    plot width, so the cost of a frame depends on the plot width, not on the window length.
+    A render frame is counted as dropped when the timer fires late by a whole frame interval.
 
+    The waterfall shows the live spectrogram of one channel: a StreamingSTFT computes only the
+    columns completed by every batch, and they are written (in dB) into a ring buffer of columns
+    that covers the window, which the image shows scrolling with the curves.
+
+    The spectrum shows the averaged spectrum of the same channel: its samples are appended to a
+    WaveformViewerWidget in the Welch FFT mode, which refreshes it at its own rate.
+    """
     title = "Plot"
 
     def initUI(self, layout):
-        pass
+        self.port = None
+        self.rings: typing.Dict[str, RingBuffer] = {}
+        self.curves: typing.Dict[str, pg.PlotCurveItem] = {}
+        self.x = np.empty(0)            # sample positions of a full window, reused every frame
+        self.dirty = False
+        self.lastFrame = None
+        self.frames = 0
+        self.droppedFrames = 0
+        self.samples = 0
+        self.statsTime = time.perf_counter()
+
+        self.stft = None                # StreamingSTFT of the waterfall channel
+        self.waterfallChannel = None
+        self.stftStart = 0
+        self.spectra = None             # RingBuffer of the waterfall columns (in dB)
+        self.waterfallLevels = None
+        self.waterfallDirty = False
+
+        self.renderTimer = QTimer(self)
+        self.renderTimer.timeout.connect(self.render)
+        self.statsTimer = QTimer(self)
+        self.statsTimer.setInterval(1000)
+        self.statsTimer.timeout.connect(self.update_stats)
+
+        self.initTopLayout(layout)
+        self.on_fps_changed(self.fps.current_value)
+
+    def initTopLayout(self, layout):
+        self.portMenu = DropDownMenu("Select Port", firstSelected=True, onChoose=self.on_port_selected)
+        self.model.serial.activePortsChanged.connect(self.on_active_ports_changed)
+
+        startButton = Button("Start Plot", on_click=self.start_plot)
+        stopButton = Button("Stop Plot", on_click=self.stop_plot)
+        clearButton = Button("Clear", on_click=self.clear)
+
+        self.window = NumberInput("Window (s)", interval=(1, 60), step=1, default=10, on_change=self.on_capacity_changed)
+        self.sampleRate = NumberInput("Sample Rate (Hz)", interval=(1, 100000), step=1, default=10000, on_change=self.on_capacity_changed)
+        self.fps = NumberInput("FPS", interval=(1, 120), step=1, default=60, on_change=self.on_fps_changed)
+        self.statsLabel = QLabel("")
+
+        self.waterfallButton = SwitchButton("Waterfall On", "Waterfall Off", on_click=self.on_waterfall)
+        self.channelMenu = DropDownMenu("Channel", options=[], onChoose=self.on_waterfall_channel)
+        self.fftSize = NumberInput("FFT Size", interval=(16, 8192), step=1, default=1024, on_change=lambda value: self.reset_waterfall())
+
+        self.plotWidget = pg.PlotWidget()
+        self.plotItem = self.plotWidget.getPlotItem()
+        self.plotItem.showGrid(x=True, y=True)
+        self.plotItem.setLabel('bottom', "Time", units='s')
+        self.plotItem.addLegend()
+        self.plotItem.getViewBox().enableAutoRange(x=False, y=True)
+
+        self.waterfallWidget = pg.PlotWidget()
+        self.waterfallPlot = self.waterfallWidget.getPlotItem()
+        self.waterfallPlot.setLabel('left', "Frequency", units='Hz')
+        self.waterfallPlot.setXLink(self.plotItem)
+        self.waterfallImage = pg.ImageItem(axisOrder='col-major')      # image[column, frequency]
+        self.waterfallImage.setLookupTable(pg.colormap.get('viridis').getLookupTable())
+        self.waterfallPlot.addItem(self.waterfallImage)
+        self.waterfallWidget.hide()
+
+        self.spectrumButton = SwitchButton("Spectrum On", "Spectrum Off", on_click=self.on_spectrum)
+        self.spectrumWidget = WaveformViewerWidget(plotTypeMenu=False, addonsMenu=False)
+        self.spectrumWidget.plotTypeMenu.call_selected_option("Welch FFT")
+        self.spectrumWidget.hide()
+
+        hTopLayout = QHBoxLayout()
+        hTopLayout.addWidget(self.portMenu)
+        hTopLayout.addSpacing(20)
+        hTopLayout.addWidget(startButton)
+        hTopLayout.addWidget(stopButton)
+        hTopLayout.addWidget(clearButton)
+        hTopLayout.addSpacing(20)
+        hTopLayout.addWidget(self.window)
+        hTopLayout.addWidget(self.sampleRate)
+        hTopLayout.addWidget(self.fps)
+        hTopLayout.addSpacing(20)
+        hTopLayout.addWidget(self.waterfallButton)
+        hTopLayout.addWidget(self.spectrumButton)
+        hTopLayout.addWidget(self.channelMenu)
+        hTopLayout.addWidget(self.fftSize)
+        hTopLayout.addStretch(1)
+        hTopLayout.addWidget(self.statsLabel)
+
+        layout.addLayout(hTopLayout)
+        layout.addWidget(self.plotWidget)
+        layout.addWidget(self.waterfallWidget)
+        layout.addWidget(self.spectrumWidget)
+
+    def capacity(self) -> int:
+        return int(self.window.current_value * self.sampleRate.current_value)
+
+    def start_plot(self):
+        port = self.portMenu.selected_title
+        if not self.model.serial.is_port_active(port):
+            return
+        self.stop_plot()
+        self.port = port
+        self.model.serial.on_port_batch_received(port, self.on_batch_received)
+        self.on_fps_changed(self.fps.current_value)
+        self.lastFrame = None
+        self.renderTimer.start()
+        self.statsTimer.start()
 
+    def stop_plot(self):
+        if self.port is not None:
+            self.model.serial.on_port_batch_received(self.port, None)
+            self.port = None
+        self.renderTimer.stop()
+        self.statsTimer.stop()
+
+    def clear(self):
+        for ring in self.rings.values():
+            ring.clear()
+        self.reset_waterfall()
+        self.spectrumWidget.stopLive()
+        self.dirty = True
+        self.render()
+
+    def on_batch_received(self, batch: dict):
+        """ Copy the new samples into the ring buffers, the curves are updated by the next frame """
+        rate = float(self.sampleRate.current_value)
+        for name, column in batch.items():
+            ring = self.rings.get(name)
+            if ring is None:
+                ring = self.add_channel(name)
+            ring.extend(column)
+            if name == self.waterfallChannel and self.stft is not None:
+                self.add_spectra(self.stft.push(column))
+            if name == self.waterfallChannel and self.spectrumButton.value:
+                self.spectrumWidget.appendSamples(column, rate)
+        if len(batch) > 0:
+            self.samples += len(next(iter(batch.values())))
+        self.dirty = True
+
+    def add_channel(self, name: str) -> RingBuffer:
+        ring = RingBuffer(self.capacity())
+        curve = pg.PlotCurveItem(name=name, pen=pg.intColor(len(self.curves), hues=9), skipFiniteCheck=True)
+        self.plotItem.addItem(curve)
+        self.rings[name] = ring
+        self.curves[name] = curve
+        self.channelMenu.set_options(list(self.rings.keys()))
+        return ring
+
+    def add_spectra(self, spectra: np.ndarray):
+        """ Add the new columns of the waterfall (in dB). The levels follow the range of the columns received """
+        if len(spectra) == 0:
+            return
+        spectra = 20 * np.log10(spectra + 1e-12)
+        self.spectra.extend(spectra)
+        low, high = float(spectra.min()), float(spectra.max())
+        if self.waterfallLevels is not None:
+            low, high = min(low, self.waterfallLevels[0]), max(high, self.waterfallLevels[1])
+        self.waterfallLevels = (max(low, high - 120), high)
+        self.waterfallDirty = True
+
+    def reset_waterfall(self):
+        """ Restart the waterfall (after a change of channel, FFT size, window or sample rate) """
+        self.stft = None
+        self.spectra = None
+        self.waterfallLevels = None
+        self.waterfallImage.clear()
+        if not self.waterfallButton.value or self.waterfallChannel is None:
+            return
+        rate = float(self.sampleRate.current_value)
+        self.stft = StreamingSTFT(int(self.fftSize.current_value), int(self.fftSize.current_value) // 2, rate)
+        ring = self.rings.get(self.waterfallChannel)
+        self.stftStart = ring.total if ring is not None else 0      # samples received before the first column
+        columns = self.capacity() // self.stft.hop + 1
+        self.spectra = RingBuffer(columns, shape=(len(self.stft.frequencies),))
+
+    def render_waterfall(self):
+        """ Show the columns kept, placed at their time so they scroll with the curves """
+        self.waterfallDirty = False
+        spectra = self.spectra.view()
+        rate = self.stft.fs
+        first = self.stft.columns - len(spectra)
+        left = (self.stftStart + self.stft.nperseg / 2 + self.stft.hop * (first - 0.5)) / rate      # left edge of the first column
+        self.waterfallImage.setImage(spectra, autoLevels=False, levels=self.waterfallLevels)
+        self.waterfallImage.setRect(QRectF(left, 0, len(spectra) * self.stft.hop / rate, rate / 2))
+
+    def render(self):
+        """ Update the curves with the samples kept (runs every 1 / fps seconds) """
+        now = time.perf_counter()
+        if self.lastFrame is not None:
+            missed = round((now - self.lastFrame) * 1000 / self.renderTimer.interval()) - 1
+            self.droppedFrames += max(0, missed)
+        self.lastFrame = now
+        if not self.dirty:
+            return
+        self.dirty = False
+        self.frames += 1
+
+        rate = float(self.sampleRate.current_value)
+        if len(self.x) != self.capacity():
+            self.x = np.arange(self.capacity(), dtype=np.float64) / rate
+        # Set the range first, so the curves are only updated once
+        end = max([ring.total / rate for ring in self.rings.values()], default=0.0)
+        self.plotItem.setXRange(max(0.0, end - self.window.current_value), max(end, self.window.current_value), padding=0)
+
+        bins = max(1, int(self.plotItem.getViewBox().width()))
+        for name, ring in self.rings.items():
+            y = ring.view()
+            first = ring.total - len(y)     # absolute index of y[0]
+            # x of the last len(y) samples: the fixed positions, shifted by the samples received (after the decimation)
+            x, y = minmax_decimate(self.x[:len(y)], y, bins, first)
+            self.curves[name].setData(x + first / rate, y)
+        if self.waterfallDirty and self.spectra is not None:
+            self.render_waterfall()
+
+    def update_stats(self):
+        now = time.perf_counter()
+        elapsed = now - self.statsTime
+        self.statsTime = now
+        self.statsLabel.setText(f"FPS: {self.frames / elapsed:.0f}   Dropped frames: {self.droppedFrames}   Samples/s: {self.samples / elapsed:.0f}")
+        self.frames = 0
+        self.samples = 0
+
+    def on_fps_changed(self, value):
+        self.renderTimer.setInterval(max(1, int(1000 / float(value))))
+        self.droppedFrames = 0
+
+    def on_capacity_changed(self, value):
+        for ring in self.rings.values():
+            ring.resize(self.capacity())
+        self.reset_waterfall()
+        self.dirty = True
+
+    def on_waterfall(self, enabled: bool):
+        """ Show the live spectrogram of the selected channel """
+        self.waterfallWidget.setVisible(enabled)
+        self.reset_waterfall()
+
+    def on_spectrum(self, enabled: bool):
+        """ Show the averaged spectrum of the selected channel """
+        self.spectrumWidget.setVisible(enabled)
+        self.spectrumWidget.stopLive()
+
+    def on_waterfall_channel(self, channel: str):
+        self.waterfallChannel = channel
+        self.reset_waterfall()
+        self.spectrumWidget.stopLive()
+
+    def on_active_ports_changed(self, active_ports):
+        self.portMenu.set_options(active_ports)
+
+    def on_port_selected(self, port: str, _):
+        pass
 
     def on_tab_focus(self):
-        pass
\ No newline at end of file
+        self.portMenu.set_options(self.model.serial.active_ports())
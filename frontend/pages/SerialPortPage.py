@@ -59,6 +59,11 @@ class SerialPortPage(BaseClassPage):
         self.cardList = CardListWidget()
         layout.addWidget(self.cardList)
 
+        self.menuPorts: typing.Dict[str, str] = {}              # port name -> menu entry, of the last scan
+        self.metricsLabels: typing.Dict[str, QLabel] = {}       # port name -> stats label of its card
+        self.model.serial.portMetrics.connect(self.on_port_metrics)
+        self.model.serial.activePortsChanged.connect(self.update_port_cards)
+
 
     def initTopLayout(self, layout):
         scanButton = Button('Scan')
@@ -86,32 +91,62 @@ class SerialPortPage(BaseClassPage):
 
 
     def on_ports_scanned(self, portListInfo: typing.Dict[str, PortInfo]):
-        portsMenuDict = {}
-        for item in portListInfo.items():
-            k, v = item
-            k = (k + f"  ({v.manufacturer})") if len(v.manufacturer) > 0 else k
-            k = (k + f"  {v.description}") if len(v.description) > 0 else k
-            portsMenuDict[k] = v
-
-        self.portMenu.set_options(portsMenuDict)
-        self.cardList.clear()
-        for port in self.model.serial.active_ports():
-            title = ""
+        # Only rebuild the menu if a port or its description changed
+        menuPorts = {}
+        for k, v in portListInfo.items():
+            title = (k + f"  ({v.manufacturer})") if len(v.manufacturer) > 0 else k
+            title = (title + f"  {v.description}") if len(v.description) > 0 else title
+            menuPorts[k] = title
+        if menuPorts != self.menuPorts:
+            self.menuPorts = menuPorts
+            self.portMenu.set_options({title: portListInfo[k] for k, title in menuPorts.items()})
+
+        self.update_port_cards()
+
+    def update_port_cards(self, *args):
+        """ Add the cards of the new active ports and remove the cards of the closed ones.
+        The cards of the ports that are still active are kept, their stats are updated by on_port_metrics """
+        activePorts = self.model.serial.active_ports()
+        for port in self.cardList.keys():
+            if port not in activePorts:
+                self.cardList.removeKey(port)
+                self.metricsLabels.pop(port, None)
+        for port in activePorts:
+            if port not in self.cardList:
+                self.cardList.addCard(self.create_port_card(port), key=port)
+
+    def create_port_card(self, port: str) -> CardWidget:
+        title = ""
+        if self.model.serial.port_info(port) is not None:
             title += self.model.serial.description(port)
-            if len(title) == 0:
-                title = port
-
-            child = QLabel(f"B/s: {portListInfo[port].bytesPerSecond}\n")
-
-            btnSizePolicy = (QSizePolicy.Expanding, QSizePolicy.Expanding)
-            closeBtn = Button('Close', background_color='red', color='white', hover_color='lightcoral',     
-                              text_size=20, sizePolicy=btnSizePolicy)
-            closeBtn.clicked.connect(lambda: self.model.serial.close_port(port))
-
-            iconPath = "frontend/assets/usb_icon.png"
-            card = CardWidget(title=title, subtitle=f"port: {port}", icon=iconPath, iconSize=64,
-                              child=child, tail=closeBtn)
-            self.cardList.addCard(card)
+        if len(title) == 0:
+            title = port
+
+        child = QLabel(self.metrics_text(self.model.serial.metrics(port)))
+        self.metricsLabels[port] = child
+
+        btnSizePolicy = (QSizePolicy.Expanding, QSizePolicy.Expanding)
+        closeBtn = Button('Close', background_color='red', color='white', hover_color='lightcoral',     
+                          text_size=20, sizePolicy=btnSizePolicy)
+        closeBtn.clicked.connect(lambda checked=False, p=port: self.model.serial.close_port(p))
+
+        iconPath = "frontend/assets/usb_icon.png"
+        return CardWidget(title=title, subtitle=f"port: {port}", icon=iconPath, iconSize=64,
+                          child=child, tail=closeBtn)
+
+    def on_port_metrics(self, port: str, metrics: dict):
+        if port in self.metricsLabels:
+            self.metricsLabels[port].setText(self.metrics_text(metrics))
+
+    @staticmethod
+    def metrics_text(metrics: typing.Optional[dict]) -> str:
+        if metrics is None:
+            return "B/s: 0\n"
+        latency = metrics["latency_p99"]
+        latency = f"{latency * 1000:g} ms" if latency is not None else "-"
+        return (f"B/s: {metrics['bytes_per_second']:.0f}    Frames/s: {metrics['frames_per_second']:.1f}\n"
+                f"Parse errors: {metrics['parse_errors']}    Buffer: {metrics['buffer_fill'] * 100:.0f}%\n"
+                f"Latency p99: {latency}")
 
 
     def open_port(self, serialSettings: SerialSettings):
@@ -126,10 +126,14 @@ class CardWidget(QWidget):
 
 
 class CardListWidget(QWidget):
+    """ Scrollable list of cards.
+    Cards can be added with a key (e.g. a port name) to find, update or remove them later
+    without rebuilding the list. """
     def __init__(self):
         super(CardListWidget, self).__init__()
         
         self.children = []  # Initialize the list to keep track of card widgets
+        self.keyedCards = {}  # key -> card widget, for the cards added with a key
         
         # Scroll Area Setup
         self.scrollArea = QScrollArea()
@@ -164,13 +168,33 @@ class CardListWidget(QWidget):
     def __iter__(self):
         return iter(self.children)
 
-    def addCard(self, cardWidget):
-        """Add a CardWidget to the list."""
+    def __contains__(self, key):
+        return key in self.keyedCards
+
+    def keys(self):
+        """Keys of the cards added with a key."""
+        return list(self.keyedCards.keys())
+
+    def card(self, key):
+        """Card added with this key, or None."""
+        return self.keyedCards.get(key, None)
+
+    def addCard(self, cardWidget, key=None):
+        """Add a CardWidget to the list. If a key is given, the card with the same key is replaced."""
+        if key is not None:
+            self.removeKey(key)
+            self.keyedCards[key] = cardWidget
         self.containerLayout.addWidget(cardWidget)
         self.children.append(cardWidget)  # Keep track of the card
     
+    def removeKey(self, key):
+        """Remove the card added with this key, if any."""
+        if key in self.keyedCards:
+            self.removeCard(self.keyedCards[key])
+
     def clearAllCards(self):
         """Remove all cards from the list."""
+        self.keyedCards.clear()
         while self.children:
             card = self.children.pop()
             self.containerLayout.removeWidget(card)
@@ -182,6 +206,7 @@ class CardListWidget(QWidget):
         """Remove a specific card from the list."""
         if cardWidget in self.children:
             self.children.remove(cardWidget)
+            self._forget(cardWidget)
             self.containerLayout.removeWidget(cardWidget)
             cardWidget.deleteLater()
 
@@ -189,9 +214,15 @@ class CardListWidget(QWidget):
         """Remove the last card from the list."""
         if self.children:
             card = self.children.pop()
+            self._forget(card)
             self.containerLayout.removeWidget(card)
             card.deleteLater()
+
+    def _forget(self, cardWidget):
+        for key, card in list(self.keyedCards.items()):
+            if card is cardWidget:
+                del self.keyedCards[key]
     
     def applyStyles(self):
         # You can add styles specific to the card list here
-        pass
\ No newline at end of file
+        pass
@@ -1,61 +1,380 @@
-from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout, QScrollArea, QHBoxLayout, QTextEdit
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QFont, QTextCursor
-from frontend.widgets.BasicWidgets import TextInput, Button
+from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout, QHBoxLayout, QAbstractScrollArea, QApplication
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QFont, QFontMetrics, QPainter, QPalette, QKeySequence
+from frontend.widgets.BasicWidgets import TextInput, Button, SwitchButton, DropDownMenu
+
+from utils.LineStore import LineStore
+from utils.LineSearch import LineSearch
+
+import re
+import time
+import typing
+
+import numpy as np
+
+
+class ConsoleView(QAbstractScrollArea):
+    """
+    Virtualized view of a LineStore: only the visible rows are painted, so the cost of a
+    repaint does not depend on the number of lines kept.
+
+    The view follows the end of the text while the scroll bar is at the bottom. Otherwise it
+    keeps the same (absolute) first line while new lines arrive.
+    With a filter (a LineSearch), only the matching lines are shown.
+    With a time mode, every line is prefixed with its arrival time ("time", seconds since the
+    first line) or with the time since the previous line ("delta").
+    Rows can be selected with the mouse and copied with Ctrl+C.
+    """
+    def __init__(self, store: LineStore, textSelectable: bool = True, placeholder: str = ""):
+        super(ConsoleView, self).__init__()
+        self.store = store
+        self.filter = None              # LineSearch, to show only its matches
+        self.textSelectable = textSelectable
+        self.placeholder = placeholder
+        self.follow = True
+        self.topLine = 0                # absolute index of the first visible line
+        self.selection = None           # (anchor, current) absolute line indices
+        self.timeMode = None            # None, "time" or "delta"
+        self._updating = False
+
+        self.setFont(QFont("Monospace", 10))
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.verticalScrollBar().setSingleStep(1)
+        self.viewport().setBackgroundRole(QPalette.Base)
+        self.viewport().setAutoFillBackground(True)
+
+    def lineHeight(self) -> int:
+        return QFontMetrics(self.font()).lineSpacing()
+
+    def visibleRows(self) -> int:
+        return max(1, self.viewport().height() // self.lineHeight())
+
+    def rowCount(self) -> int:
+        return len(self.filter) if self.filter is not None else len(self.store)
+
+    def rowOfLine(self, line: int) -> int:
+        """ Row of the first shown line >= line """
+        if self.filter is not None:
+            return self.filter.row(line)
+        return max(0, line - self.store.first)
+
+    def lineOfRow(self, row: int) -> int:
+        if self.filter is not None:
+            return int(self.filter.matches[row]) if row < len(self.filter) else self.store.end
+        return self.store.first + row
+
+    def refresh(self):
+        """ Update the scroll bars after the store changed, and repaint """
+        self._updating = True
+        rows = self.rowCount()
+        visible = self.visibleRows()
+        vbar = self.verticalScrollBar()
+        vbar.setRange(0, max(0, rows - visible))
+        vbar.setPageStep(visible)
+        if self.follow:
+            self.topLine = self.lineOfRow(vbar.maximum())
+        self.topLine = max(self.topLine, self.store.first)
+        vbar.setValue(self.rowOfLine(self.topLine))
+
+        hbar = self.horizontalScrollBar()
+        charWidth = QFontMetrics(self.font()).horizontalAdvance('M')
+        prefix = 0 if self.timeMode is None else 16
+        hbar.setRange(0, max(0, (self.store.max_length + prefix + 1) * charWidth - self.viewport().width()))
+        hbar.setPageStep(self.viewport().width())
+        hbar.setSingleStep(charWidth)
+        self._updating = False
+        self.viewport().update()
+
+    def scrollToLine(self, index: int):
+        """ Show the line with absolute index at the top of the view """
+        self.follow = False
+        self.topLine = max(self.store.first, index)
+        self.refresh()
+
+    def showLine(self, index: int):
+        """ Select the line with absolute index and scroll to show it in the middle of the view """
+        self.selection = (index, index)
+        row = max(0, self.rowOfLine(index) - self.visibleRows() // 2)
+        self.scrollToLine(self.lineOfRow(row))
+
+    def scrollContentsBy(self, dx: int, dy: int):
+        if not self._updating:
+            vbar = self.verticalScrollBar()
+            self.topLine = self.lineOfRow(vbar.value())
+            self.follow = vbar.value() == vbar.maximum()
+        self.viewport().update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.refresh()
+
+    def rowText(self, index: int) -> str:
+        text = self.store.line(index)
+        if self.timeMode is None or index >= self.store.end:
+            return text         # The incomplete last line has no time yet
+        times = self.store.times(index - 1, index + 1)
+        if len(times) == 0:
+            return text
+        if self.timeMode == "delta":
+            delta = times[-1] - times[0] if len(times) == 2 else 0.0
+            return f"[+{delta:.6f}] {text}"
+        return f"[{times[-1] - self.store.time_origin:12.6f}] {text}"
+
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        lineHeight = self.lineHeight()
+        ascent = QFontMetrics(self.font()).ascent()
+        x = -self.horizontalScrollBar().value() + 2
+
+        if self.rowCount() == 0:
+            painter.setPen(self.palette().color(QPalette.Disabled, QPalette.Text))
+            painter.drawText(x, ascent, self.placeholder if self.filter is None else "No matching lines")
+            return
+
+        selected = None
+        if self.selection is not None:
+            selected = (min(self.selection), max(self.selection))
+        top = self.rowOfLine(self.topLine)
+        for row in range(top, min(top + self.visibleRows() + 1, self.rowCount())):
+            index = self.lineOfRow(row)
+            y = (row - top) * lineHeight
+            if selected is not None and selected[0] <= index <= selected[1]:
+                painter.fillRect(0, y, self.viewport().width(), lineHeight, self.palette().highlight())
+                painter.setPen(self.palette().color(QPalette.HighlightedText))
+            else:
+                painter.setPen(self.palette().color(QPalette.Text))
+            painter.drawText(x, y + ascent, self.rowText(index))
+
+    def lineAt(self, y: int) -> int:
+        row = self.rowOfLine(self.topLine) + max(0, y) // self.lineHeight()
+        return self.lineOfRow(min(row, self.rowCount() - 1))
+
+    def mousePressEvent(self, event):
+        if self.textSelectable and event.button() == Qt.LeftButton and self.rowCount() > 0:
+            line = self.lineAt(event.pos().y())
+            self.selection = (line, line)
+            self.viewport().update()
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if self.selection is not None and event.buttons() & Qt.LeftButton:
+            self.selection = (self.selection[0], self.lineAt(event.pos().y()))
+            self.viewport().update()
+        super().mouseMoveEvent(event)
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.Copy):
+            self.copySelection()
+        else:
+            super().keyPressEvent(event)
+
+    def copySelection(self):
+        """ Copy the selected rows (only the shown ones, if there is a filter) """
+        if self.selection is None:
+            return
+        first, last = min(self.selection), max(self.selection)
+        rows = range(self.rowOfLine(first), self.rowOfLine(last + 1))
+        QApplication.clipboard().setText('\n'.join(self.rowText(self.lineOfRow(row)) for row in rows))
+
 
 class ConsoleWidget(QWidget):
-    def __init__(self, textSelectable=True, wordWrap=True, defaultText="Console output will appear here...", fixedWidth=None, maxBlockCount=1000):
+    """
+    Console output backed by a LineStore (or a DiskLineStore, see setStore).
+
+    appendText() only queues the text: it is added to the store and shown at most maxFps
+    times per second, so the cost of an append does not depend on the size of the scrollback.
+    The scrollback is limited by a memory budget (in bytes), and by maxBlockCount lines if given.
+    wordWrap is accepted for compatibility but ignored: long lines scroll horizontally.
+
+    appendText() can take the arrival time (time.monotonic) of every '\\n' of the text, which the
+    console can show before every line (Time) or as the time since the previous line (Delta).
+
+    The search box takes a regex: the matches are indexed incrementally (the history in steps of
+    searchStep lines, then the new lines at every flush), Enter / Next / Prev jump between them
+    and Filter shows only the matching lines.
+    """
+    searchStep = 200000     # lines of history searched per event loop iteration
+    def __init__(self, textSelectable=True, wordWrap=True, defaultText="Console output will appear here...", fixedWidth=None, maxBlockCount=None,
+                 memoryBudget=16 * 1024 * 1024, maxFps=30):
         super(ConsoleWidget, self).__init__()
-        
+
         self.defaultText = defaultText
 
         self.setFixedWidth(fixedWidth) if fixedWidth else None
-        
-        # Create the QLabel that will display the console output
-        self.consoleOutput = QTextEdit()
-        self.consoleOutput.setReadOnly(True)
-        self.consoleOutput.setWordWrapMode(wordWrap)
-        self.consoleOutput.setFont(QFont("Monospace", 10))
-        self.consoleOutput.setText(defaultText + '\n')
-        self.consoleOutput.setAlignment(Qt.AlignTop | Qt.AlignLeft)
-        if textSelectable:
-            self.consoleOutput.setTextInteractionFlags(Qt.TextSelectableByMouse)
-        
-        self.consoleOutput.document().setMaximumBlockCount(maxBlockCount)
-        
+
+        self.store = LineStore(memoryBudget, maxBlockCount)
+        self.pending: typing.List[str] = []
+        self.pendingTimes: typing.List[np.ndarray] = []
+
+        self.flushTimer = QTimer(self)
+        self.flushTimer.setInterval(int(1000 / maxFps))
+        self.flushTimer.timeout.connect(self.flush)
+
+        # Create the view that will display the console output
+        self.consoleOutput = ConsoleView(self.store, textSelectable, placeholder=defaultText)
+
         self.lineCount = QLabel("Lines: 0")
-        
-        # Create a QVBoxLayout for this widget and add the QScrollArea to it
+
+        # Search bar
+        self.search: typing.Optional[LineSearch] = None
+        self.searchTimer = QTimer(self)
+        self.searchTimer.setInterval(0)
+        self.searchTimer.timeout.connect(self.searchHistory)
+        self.searchInput = TextInput("Search", placeholder="Regex (Enter: next match)", regex=None, layout='h', on_change=self.setSearch)
+        self.matchLabel = QLabel("")
+        self.filterButton = SwitchButton("Filter On", "Filter Off", on_click=self.setFilter)
+        self.timeMenu = DropDownMenu("Time Off", options={"Time Off": None, "Time": "time", "Delta": "delta"},
+                                     onChoose=lambda key, mode: self.setTimeMode(mode))
+
+        # Create a QVBoxLayout for this widget and add the view to it
         vlayout = QVBoxLayout(self)
         topHLayout = QHBoxLayout()
         topHLayout.setAlignment(Qt.AlignTop | Qt.AlignLeft)
         topHLayout.addWidget(self.lineCount)
         topHLayout.addStretch(1)
+        topHLayout.addWidget(self.timeMenu)
         topHLayout.addWidget(Button("Clear Console", on_click=lambda: self.clearConsole()))
         vlayout.addLayout(topHLayout)
+        searchLayout = QHBoxLayout()
+        searchLayout.setAlignment(Qt.AlignTop | Qt.AlignLeft)
+        searchLayout.addWidget(self.searchInput)
+        searchLayout.addWidget(Button("Prev", on_click=self.findPrevious))
+        searchLayout.addWidget(Button("Next", on_click=self.findNext))
+        searchLayout.addWidget(self.filterButton)
+        searchLayout.addWidget(self.matchLabel)
+        searchLayout.addStretch(1)
+        vlayout.addLayout(searchLayout)
         vlayout.addWidget(self.consoleOutput)
-        
+
         # Set the layout for this widget
         self.setLayout(vlayout)
-        
-        # Additional styling or functionality can be added here as needed
 
     def clear(self):
         self.clearConsole()
 
     def clearConsole(self):
-        self.consoleOutput.clear()
-        self.setText(self.defaultText)
+        self.pending = []
+        self.pendingTimes = []
+        self.store.clear()
+        if self.search is not None:
+            self.search.reset()
+        self.consoleOutput.selection = None
+        self.consoleOutput.follow = True
+        self.updateView()
 
     def setText(self, text):
-        self.consoleOutput.setText(text)
-        newlines = text.count('\n')+1
-        self.lineCount.setText(f"Lines: {newlines}")
-
-    def appendText(self, text):
-        # Method to append text to the console, improving performance for large updates
-        self.consoleOutput.moveCursor(QTextCursor.End)
-        self.consoleOutput.insertPlainText(text)
-        # Update line count
-        newlines = self.consoleOutput.toPlainText().count('\n') + 1
-        self.lineCount.setText(f"Lines: {newlines}")
\ No newline at end of file
+        self.clearConsole()
+        self.appendText(text)
+        self.flush()
+
+    def setMemoryBudget(self, memoryBudget: int):
+        """ Maximum memory of the scrollback, in bytes. The oldest lines are discarded first """
+        self.store.set_memory_budget(memoryBudget)
+        self.updateView()
+
+    def setStore(self, store):
+        """ Show another line store (e.g. a DiskLineStore). The queued text goes to the current one """
+        self.flush()
+        self.store = store
+        self.consoleOutput.store = store
+        self.consoleOutput.selection = None
+        self.consoleOutput.follow = True
+        if self.search is not None:
+            self.setSearch(self.search.pattern, restart=True)
+        self.updateView()
+
+    def setTimeMode(self, mode: typing.Optional[str]):
+        """ Show the arrival time of every line: None, "time" or "delta" """
+        self.consoleOutput.timeMode = mode
+        self.updateView()
+
+    def appendText(self, text, times: typing.Optional[np.ndarray] = None):
+        # Queue the text (str, or raw bytes for a binary store), it is shown by the next flush
+        # times: arrival time of every '\n' of text, by default now
+        if self.store.binary and isinstance(text, str):
+            text = text.encode("utf-8")
+        elif not self.store.binary and not isinstance(text, str):
+            text = bytes(text).decode("utf-8", errors="replace")
+        newlines = text.count(b"\n" if self.store.binary else "\n")
+        if times is None or len(times) != newlines:
+            times = np.full(newlines, time.monotonic())
+        self.pending.append(text)
+        self.pendingTimes.append(times)
+        if not self.flushTimer.isActive():
+            self.flushTimer.start()
+
+    def flush(self):
+        """ Add the queued text to the store and update the view """
+        if len(self.pending) == 0:
+            self.flushTimer.stop()
+            return
+        text = (b"" if self.store.binary else "").join(self.pending)
+        times = np.concatenate(self.pendingTimes)
+        self.pending = []
+        self.pendingTimes = []
+        self.store.append(text, times)
+        if self.search is not None and not self.searchTimer.isActive():
+            self.search.update()        # Only the new lines, the history is searched by searchHistory
+        self.updateView()
+
+    def updateView(self):
+        self.consoleOutput.refresh()
+        self.lineCount.setText(f"Lines: {self.store.first + len(self.store)}")
+        if self.search is not None:
+            searching = "" if self.search.done else " (searching...)"
+            self.matchLabel.setText(f"Matches: {len(self.search)}{searching}")
+
+    def setSearch(self, pattern: str, restart: bool = False):
+        """ Search a regex in the whole scrollback. Searching the same pattern again jumps to the next match """
+        if len(pattern) == 0:
+            self.search = None
+            self.searchTimer.stop()
+            self.consoleOutput.filter = None
+            self.matchLabel.setText("")
+            self.updateView()
+            return
+        if self.search is not None and self.search.pattern == pattern and not restart:
+            self.findNext()
+            return
+        try:
+            self.search = LineSearch(self.store, pattern)
+        except re.error as e:
+            self.matchLabel.setText(f"Invalid regex: {e}")
+            return
+        self.setFilter(self.filterButton.value)
+        self.searchTimer.start()
+
+    def searchHistory(self):
+        """ Search the next searchStep lines of history, until the search catches up with the store """
+        if self.search is None:
+            self.searchTimer.stop()
+            return
+        self.search.update(self.searchStep)
+        if self.search.done:
+            self.searchTimer.stop()
+        self.updateView()
+
+    def setFilter(self, enabled: bool):
+        """ Show only the lines that match the search """
+        self.consoleOutput.filter = self.search if enabled else None
+        self.updateView()
+
+    def findNext(self):
+        if self.search is None or len(self.search) == 0:
+            return
+        view = self.consoleOutput
+        line = max(view.selection) if view.selection is not None else view.topLine - 1
+        match = self.search.next(line)
+        if match is None:
+            match = int(self.search.matches[0])     # Wrap around
+        view.showLine(match)
+
+    def findPrevious(self):
+        if self.search is None or len(self.search) == 0:
+            return
+        view = self.consoleOutput
+        line = min(view.selection) if view.selection is not None else view.topLine
+        match = self.search.previous(line)
+        if match is None:
+            match = int(self.search.matches[-1])    # Wrap around
+        view.showLine(match)
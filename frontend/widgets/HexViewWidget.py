@@ -0,0 +1,263 @@
+from PyQt5.QtWidgets import QWidget, QLabel, QVBoxLayout, QHBoxLayout, QAbstractScrollArea, QApplication
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QFont, QFontMetrics, QPainter, QPalette, QKeySequence
+from frontend.widgets.BasicWidgets import Button
+
+from utils.LineStore import ByteStore
+
+import typing
+
+import numpy as np
+
+
+# Lookup tables: byte -> "XX " and byte -> printable ASCII character (or '.')
+HEX_DIGITS = np.frombuffer(b"0123456789ABCDEF", dtype=np.uint8)
+HEX_LUT = np.array([[HEX_DIGITS[i >> 4], HEX_DIGITS[i & 15], ord(' ')] for i in range(256)], dtype=np.uint8)
+ASCII_LUT = np.array([i if 32 <= i < 127 else ord('.') for i in range(256)], dtype=np.uint8)
+
+
+def format_hex_rows(data: bytes, offset: int, width: int = 16, offsetDigits: int = 8, start: int = None, stop: int = None) -> typing.List[str]:
+    """ Format data as hex dump rows: "offset  XX XX .. XX  XX .. XX  |ascii|".
+    All the rows are formatted at once with the lookup tables.
+    - data: bytes starting at offset, which must be a multiple of width
+    - start, stop: offsets of the valid bytes (the others are left blank), by default all the data
+    """
+    rows = -(-len(data) // width)
+    if rows == 0:
+        return []
+    values = np.zeros(rows * width, dtype=np.uint8)
+    values[:len(data)] = np.frombuffer(data, dtype=np.uint8)
+    values = values.reshape(rows, width)
+
+    hexColumns = HEX_LUT[values]                        # (rows, width, 3)
+    asciiColumn = ASCII_LUT[values]                     # (rows, width)
+    positions = offset + np.arange(rows * width).reshape(rows, width)
+    start = offset if start is None else start
+    stop = offset + len(data) if stop is None else stop
+    missing = (positions < start) | (positions >= stop)
+    hexColumns[missing] = ord(' ')
+    asciiColumn[missing] = ord(' ')
+
+    rowOffsets = offset + width * np.arange(rows, dtype=np.int64)
+    shifts = 4 * np.arange(offsetDigits - 1, -1, -1)
+    offsetColumn = HEX_DIGITS[(rowOffsets[:, None] >> shifts) & 15]
+
+    half = (width // 2) * 3
+    hexColumns = hexColumns.reshape(rows, width * 3)
+    space = np.full((rows, 1), ord(' '), dtype=np.uint8)
+    bar = np.full((rows, 1), ord('|'), dtype=np.uint8)
+    table = np.concatenate([offsetColumn, space, space, hexColumns[:, :half], space, hexColumns[:, half:], space, bar, asciiColumn, bar], axis=1)
+    rowLength = table.shape[1]
+    text = table.tobytes().decode('ascii')
+    return [text[i:i + rowLength] for i in range(0, len(text), rowLength)]
+
+
+class HexView(QAbstractScrollArea):
+    """
+    Virtualized hex dump of a raw byte store (ByteStore, or DiskLineStore for a session file).
+    Only the visible rows are formatted and painted. The view follows the end of the data
+    while the scroll bar is at the bottom. Rows can be selected with the mouse and copied with Ctrl+C.
+    """
+    def __init__(self, store, bytesPerRow: int = 16):
+        super(HexView, self).__init__()
+        self.store = store
+        self.bytesPerRow = bytesPerRow
+        self.follow = True
+        self.topRow = 0                 # absolute row (offset // width) at the top
+        self.selection = None           # (anchor, current) absolute rows
+        self._updating = False
+
+        self.setFont(QFont("Monospace", 10))
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.viewport().setBackgroundRole(QPalette.Base)
+        self.viewport().setAutoFillBackground(True)
+
+    def lineHeight(self) -> int:
+        return QFontMetrics(self.font()).lineSpacing()
+
+    def visibleRows(self) -> int:
+        return max(1, self.viewport().height() // self.lineHeight())
+
+    def firstRow(self) -> int:
+        return self.store.first_offset // self.bytesPerRow
+
+    def endRow(self) -> int:
+        return -(-self.store.end_offset // self.bytesPerRow)
+
+    def offsetDigits(self) -> int:
+        return max(8, len(f"{self.store.end_offset:X}"))
+
+    def formatRows(self, first: int, last: int) -> typing.List[str]:
+        """ Format the absolute rows [first, last) """
+        first = max(first, self.firstRow())
+        last = min(last, self.endRow())
+        if last <= first:
+            return []
+        start, stop = first * self.bytesPerRow, last * self.bytesPerRow
+        data = self.store.read(start, stop)
+        startValid = max(start, self.store.first_offset)
+        data = bytes(startValid - start) + data         # Blank bytes before the first byte kept
+        return format_hex_rows(data, start, self.bytesPerRow, self.offsetDigits(), startValid, self.store.end_offset)
+
+    def refresh(self):
+        """ Update the scroll bars after the store changed, and repaint """
+        self._updating = True
+        rows = self.endRow() - self.firstRow()
+        visible = self.visibleRows()
+        vbar = self.verticalScrollBar()
+        vbar.setRange(0, max(0, rows - visible))
+        vbar.setPageStep(visible)
+        if self.follow:
+            self.topRow = self.firstRow() + vbar.maximum()
+        self.topRow = max(self.topRow, self.firstRow())
+        vbar.setValue(self.topRow - self.firstRow())
+
+        hbar = self.horizontalScrollBar()
+        charWidth = QFontMetrics(self.font()).horizontalAdvance('M')
+        rowLength = self.offsetDigits() + 4 * self.bytesPerRow + 6
+        hbar.setRange(0, max(0, rowLength * charWidth - self.viewport().width()))
+        hbar.setPageStep(self.viewport().width())
+        hbar.setSingleStep(charWidth)
+        self._updating = False
+        self.viewport().update()
+
+    def scrollContentsBy(self, dx: int, dy: int):
+        if not self._updating:
+            vbar = self.verticalScrollBar()
+            self.topRow = self.firstRow() + vbar.value()
+            self.follow = vbar.value() == vbar.maximum()
+        self.viewport().update()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.refresh()
+
+    def paintEvent(self, event):
+        painter = QPainter(self.viewport())
+        lineHeight = self.lineHeight()
+        ascent = QFontMetrics(self.font()).ascent()
+        x = -self.horizontalScrollBar().value() + 2
+
+        selected = None
+        if self.selection is not None:
+            selected = (min(self.selection), max(self.selection))
+        rows = self.formatRows(self.topRow, self.topRow + self.visibleRows() + 1)
+        for i, text in enumerate(rows):
+            y = i * lineHeight
+            if selected is not None and selected[0] <= self.topRow + i <= selected[1]:
+                painter.fillRect(0, y, self.viewport().width(), lineHeight, self.palette().highlight())
+                painter.setPen(self.palette().color(QPalette.HighlightedText))
+            else:
+                painter.setPen(self.palette().color(QPalette.Text))
+            painter.drawText(x, y + ascent, text)
+
+    def rowAt(self, y: int) -> int:
+        return min(self.topRow + max(0, y) // self.lineHeight(), self.endRow() - 1)
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.LeftButton and self.endRow() > self.firstRow():
+            row = self.rowAt(event.pos().y())
+            self.selection = (row, row)
+            self.viewport().update()
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event):
+        if self.selection is not None and event.buttons() & Qt.LeftButton:
+            self.selection = (self.selection[0], self.rowAt(event.pos().y()))
+            self.viewport().update()
+        super().mouseMoveEvent(event)
+
+    def keyPressEvent(self, event):
+        if event.matches(QKeySequence.Copy):
+            self.copySelection()
+        else:
+            super().keyPressEvent(event)
+
+    def copySelection(self):
+        if self.selection is None:
+            return
+        QApplication.clipboard().setText('\n'.join(self.formatRows(min(self.selection), max(self.selection) + 1)))
+
+
+class HexViewWidget(QWidget):
+    """
+    Hex dump of a binary stream.
+
+    appendData() only queues the bytes, they are added to the store and shown at most maxFps
+    times per second. The bytes kept are limited by a memory budget (in bytes).
+    The view can also show an external byte store (see setStore), then appendData() only
+    schedules the repaint.
+    """
+    def __init__(self, memoryBudget=16 * 1024 * 1024, bytesPerRow=16, maxFps=30):
+        super(HexViewWidget, self).__init__()
+
+        self.memoryBudget = memoryBudget
+        self.store = ByteStore(memoryBudget)
+        self.ownStore = True
+        self.pending: typing.List[bytes] = []
+        self.dirty = False
+
+        self.flushTimer = QTimer(self)
+        self.flushTimer.setInterval(int(1000 / maxFps))
+        self.flushTimer.timeout.connect(self.flush)
+
+        self.hexView = HexView(self.store, bytesPerRow)
+        self.byteCount = QLabel("Bytes: 0")
+
+        vlayout = QVBoxLayout(self)
+        topHLayout = QHBoxLayout()
+        topHLayout.setAlignment(Qt.AlignTop | Qt.AlignLeft)
+        topHLayout.addWidget(self.byteCount)
+        topHLayout.addStretch(1)
+        topHLayout.addWidget(Button("Clear", on_click=lambda: self.clear()))
+        vlayout.addLayout(topHLayout)
+        vlayout.addWidget(self.hexView)
+        self.setLayout(vlayout)
+
+    def clear(self):
+        self.pending = []
+        if self.ownStore:
+            self.store.clear()
+        self.hexView.selection = None
+        self.hexView.follow = True
+        self.updateView()
+
+    def setMemoryBudget(self, memoryBudget: int):
+        self.memoryBudget = memoryBudget
+        if self.ownStore:
+            self.store.set_memory_budget(memoryBudget)
+        self.updateView()
+
+    def setStore(self, store):
+        """ Show an external raw byte store (e.g. a DiskLineStore, fed by its owner),
+        or a new ByteStore of this widget if store is None """
+        self.pending = []
+        self.ownStore = store is None
+        self.store = ByteStore(self.memoryBudget) if store is None else store
+        self.hexView.store = self.store
+        self.hexView.selection = None
+        self.hexView.follow = True
+        self.updateView()
+
+    def appendData(self, data: bytes):
+        # Queue the data, it is shown by the next flush
+        if self.ownStore:
+            self.pending.append(bytes(data))
+        self.dirty = True
+        if not self.flushTimer.isActive():
+            self.flushTimer.start()
+
+    def flush(self):
+        """ Add the queued data to the store and update the view """
+        if not self.dirty:
+            self.flushTimer.stop()
+            return
+        self.dirty = False
+        if len(self.pending) > 0:
+            self.store.append(b"".join(self.pending))
+            self.pending = []
+        self.updateView()
+
+    def updateView(self):
+        self.hexView.refresh()
+        self.byteCount.setText(f"Bytes: {self.store.end_offset}")
@@ -33,6 +33,8 @@
 # NO TOCAR  -   NO TOCAR    -   NO TOCAR  -   NO TOCAR    -   NO TOCAR  -   NO TOCAR    -   NO TOCAR  -   NO TOCAR    -   NO TOCAR  -   NO TOCAR
 # NO TOCAR  -   NO TOCAR    -   NO TOCAR  -   NO TOCAR    -   NO TOCAR  -   NO TOCAR    -   NO TOCAR  -   NO TOCAR    -   NO TOCAR  -   NO TOCAR
 # NO TOCAR  -   NO TOCAR    -   NO TOCAR  -   NO TOCAR    -   NO TOCAR  -   NO TOCAR    -   NO TOCAR  -   NO TOCAR    -   NO TOCAR  -   NO TOCAR
+from utils.PlotData import visible_data
+
 
         self.captureDataButton = Button("Capture Visible Data", on_click=self.captureVisibleData)
         hlayout.addWidget(self.captureDataButton)
@@ -85,11 +87,8 @@
                 
     def captureVisibleData(self):
         minX, maxX = self.region.getRegion()
-        x = np.array(self.x)
-        y = np.array(self.y)
-        mask = (x >= minX) & (x <= maxX)
-        x = x[mask]
-        y = y[mask]
+        # Views of the samples in the region, found with a binary search (x is sorted)
+        x, y = visible_data(np.asarray(self.x), np.asarray(self.y), minX, maxX)
 
         event = {
             "type": "captureVisibleData",
@@ -1,17 +1,24 @@
 from PyQt5.QtWidgets import QVBoxLayout, QHBoxLayout, QWidget, QGridLayout, QDialog, QLabel, QSpinBox, QTextEdit
-from PyQt5.QtGui import QTransform
-from PyQt5.QtCore import pyqtSignal, Qt
+from PyQt5.QtCore import pyqtSignal, Qt, QThread, QObject, QTimer, QRectF
 
 import pyqtgraph as pg
 
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 from scipy import signal
 
 from .BasicWidgets import DropDownMenu, Button, TextInput
 from .DynamicSettingsWidget import DynamicSettingsWidget
-from backend.utils.ParamObject import ParameterList, NumParam, TextParam, BoolParam, ChoiceParam
+from utils.ParamList import ParameterList, NumParam, TextParam, BoolParam, ChoiceParam
+from utils.PlotData import minmax_decimate, visible_range, visible_data, visible_spectrogram, MinMaxPyramid, pooled_range, max_pool
+from utils.Cache import LRUCache
+from utils.Spectral import spectrogram, StreamingWelch
+from utils.FFT import amplitude_spectrum
 
 ALLOWED_WINDOWS = ['barthann','bartlett','blackman','blackmanharris','bohman','boxcar','rectangular','flattop','hamming','hann','tukey',]
+WELCH_AVERAGING = {"Linear": "linear", "Exponential": "exponential", "Peak Hold": "peak"}
+ADDON_DATA_TYPES = {"Waveform": "Waveform", "FFT": "FFT", "Welch FFT": "FFT", "Spectrogram": "Spectrogram"}    # plot type -> type of its addon data
 
 
 class AddonBaseClass(QDialog):
@@ -68,12 +75,12 @@ class FindPeaksAddon(AddonBaseClass):
         super().__init__(title="Find Visible Peaks")
 
     def initUI(self, layout):
-        self.settings = ParameterList(
+        self.settings = ParameterList([
             NumParam("markerSize", value=20, interval=(1, 100), step=1, text="Marker Size"),
             NumParam("minHeight", value=0.1, interval=(0, 1), step=0.00001, text="Minimum Peak Height"),
             NumParam("minDistance", value=50, interval=(0.01, 1000), step=0.01, text="Minimum Peak Distance"),
             NumParam("threshold", value=0, interval=(0, 1), step=0.00001, text="Threshold (vertical distance to its neighboring samples)"),
-        )
+        ])
         settingsWidget = DynamicSettingsWidget(paramList=self.settings, on_edit=self.find_peaks, sliderRelease=False)
         settingsWidget.setMinimumHeight(350)
         self.textEdit = QTextEdit()
@@ -132,13 +139,18 @@ class SettingsDialog(AddonBaseClass):
         super().__init__(title="Settings", on_apply=on_apply, title_postfix="")
 
     def initUI(self, layout):
-        self.settings = ParameterList(
+        self.settings = ParameterList([
             NumParam("padding", value=0, interval=(0,10000), step=1, text="Signal Padding"),
             ChoiceParam("FFTWindow", options=ALLOWED_WINDOWS, value='rectangular', text="FFT Window"),
             ChoiceParam("specWindow", options=ALLOWED_WINDOWS, value='rectangular', text="Spectrogram Window"),
             NumParam("nperseg", value=1024, interval=(128, 8192), step=1, text="Spectrogram Window Size"),
             NumParam("noverlap", value=512, interval=(0, 4096), step=1, text="Spectrogram Window Overlap"),
-        )
+            ChoiceParam("welchWindow", options=ALLOWED_WINDOWS, value='hann', text="Welch FFT Window"),
+            NumParam("welchSegment", value=1024, interval=(16, 65536), step=1, text="Welch FFT Segment Size"),
+            NumParam("welchOverlap", value=512, interval=(0, 65535), step=1, text="Welch FFT Segment Overlap"),
+            ChoiceParam("welchAveraging", options=list(WELCH_AVERAGING.keys()), value='Linear', text="Welch FFT Averaging"),
+            NumParam("welchAverages", value=10, interval=(1, 1000), step=1, text="Welch FFT Averages (Exponential)"),
+        ])
         self.dynSettings = DynamicSettingsWidget(self.settings, on_edit=self.on_apply)
         layout.addWidget(self.dynSettings)
 
@@ -147,12 +159,84 @@ class SettingsDialog(AddonBaseClass):
 
 
 
+def pad_signal(x, y, Ts, padding):
+    ''' Add padding zeros on both sides of y, and extend x with the same sampling interval '''
+    if padding > len(x) // 2:
+        padding = len(x) // 2
+    # Add zero padding
+    y = np.pad(y, (padding, padding), 'constant')
+    xLast = x[-1] + Ts * padding * 2
+    x = np.linspace(x[0], xLast, len(y))
+    return x, y
+
+
+def compute_spectral(x, y, Ts, settings):
+    ''' FFT magnitude (f, magnitude) or spectrogram (f, t, Sxx) of the padded signal, None for a waveform.
+    - settings: see WaveformViewerWidget.computeSettings '''
+    plotType = settings["plotType"]
+    if plotType == "FFT":
+        # windowed, and zero padded to a fast FFT length
+        return amplitude_spectrum(y, Ts, settings["window"])
+    elif plotType == "Spectrogram":
+        nperseg, noverlap = settings["nperseg"], settings["noverlap"]
+        if noverlap >= nperseg:
+            noverlap = nperseg - 10
+        # The magnitudes are kept linear, the Log Y scale is applied to the displayed tiles
+        return spectrogram(y, fs=1/Ts, nperseg=nperseg, noverlap=noverlap, window=('tukey', 0.25))    # scipy's default window
+    elif plotType == "Welch FFT":
+        welch = create_welch(1/Ts, settings, len(y))
+        welch.push(y)
+        return welch.frequencies, welch.spectrum()
+    return None
+
+
+def create_welch(fs, settings, length=None):
+    ''' StreamingWelch with the Welch FFT settings (see WaveformViewerWidget.computeSettings)
+    - length: samples of the signal if known, the segment is not longer '''
+    nperseg = settings["welchSegment"] if length is None else max(1, min(settings["welchSegment"], length))
+    noverlap = min(settings["welchOverlap"], nperseg - 1)
+    return StreamingWelch(nperseg, noverlap, fs, settings["welchWindow"], WELCH_AVERAGING[settings["welchAveraging"]], settings["welchAverages"])
+
+
+def compute_plot_data(x, y, Ts, settings, padded=None):
+    ''' Work of a plot computation (runs in the worker pool): the padded signal (unless given) and its spectral data '''
+    if padded is None:
+        padded = pad_signal(x, y, Ts, settings["padding"])
+    return padded, compute_spectral(*padded, Ts, settings)
+
+
+
+class ComputeBridge(QObject):
+    ''' Brings the finished computations of the worker pool to the GUI thread: computed carries the future '''
+    computed = pyqtSignal(object)
+
+
+
+class PyramidBuilder(QThread):
+    ''' Builds the MinMaxPyramid of a dataset in the background. built carries the token of the dataset and the pyramid '''
+    built = pyqtSignal(int, object)
+
+    def __init__(self, token, y):
+        super().__init__()
+        self.token = token
+        self.y = y
+
+    def run(self):
+        self.built.emit(self.token, MinMaxPyramid(self.y))
+
+
+
 class WaveformViewerWidget(QWidget):
+    pyramidMinSize = 1 << 20    # datasets with fewer samples are decimated directly, without a pyramid
+    cacheSize = 512 * 1024 * 1024   # bytes of computed plot data (padding, FFT, spectrogram, pyramids) kept
+    computeWorkers = 1              # the latest request runs as soon as the running one ends, older queued ones are cancelled
+    liveRate = 30                   # refreshes per second of the live Welch FFT
+
     def __init__(self, navHeight=100, plotTypeMenu=True, scaleMenu=True, settingsBtn=True, addonsMenu=True):
         super().__init__()
         pg.setConfigOptions(imageAxisOrder='row-major')
 
-        self.plotTypeMenu = DropDownMenu(options=["Waveform", "FFT", "Spectrogram"], onChoose=self.reloadPlot, firstSelected=True)
+        self.plotTypeMenu = DropDownMenu(options=["Waveform", "FFT", "Spectrogram", "Welch FFT"], onChoose=self.reloadPlot, firstSelected=True)
         self.xAxisScale = DropDownMenu(options=["Linear X", "Log X"], onChoose=self.reloadPlot, firstSelected=True)
         self.yAxisScale = DropDownMenu(options=["Linear Y", "Log Y"], onChoose=self.reloadPlot, firstSelected=True)
 
@@ -190,7 +274,36 @@ class WaveformViewerWidget(QWidget):
         self.waveformPlot2.setMaximumHeight(navHeight)
 
         self.data = None        # x, y
+        self.dataToken = 0      # incremented for every new dataset, identifies it in the cache keys
+        self.cache = LRUCache(self.cacheSize)
+        self.plotKey = None     # cache key of plotData
+        self.plotData = None    # x, y plotted (after padding and FFT), decimated to the width of the plots
+        self.curve1 = None      # PlotDataItem of the visible range of plotData in waveformPlot1
+        self.curve2 = None      # PlotDataItem of the whole plotData in waveformPlot2
+        self.pyramid = None     # MinMaxPyramid of plotData, once built
+        self.pyramidToken = 0   # incremented for every new plotData, to drop the pyramids of older ones
+        self.pyramidBuilders = []
+        self.specData = None    # f, t, Sxx (linear magnitudes) of the spectrogram shown
+        self.specKey = None     # cache key of specData
+        self.specImage = None   # ImageItem of the visible range of the spectrogram, at the resolution of the plot
+
+        # FFTs and spectrograms are computed in a worker pool. Every request gets a generation, and only the
+        # result of the latest one is shown (the others are only cached), the previous plot stays until then
+        self.executor = ThreadPoolExecutor(max_workers=self.computeWorkers)
+        self.computeBridge = ComputeBridge()
+        self.computeBridge.computed.connect(self.computeFinished)
+        self.computeGeneration = 0
+        self.computeRequests = {}       # future -> (generation, request)
         self.addonData = {}   
+
+        # Live Welch FFT: appendSamples feeds the analyzer, the timer shows its spectrum when it changed
+        self.welch = None       # StreamingWelch of the live samples
+        self.welchKey = None    # sample rate and settings of the analyzer (it restarts when they change)
+        self.liveDirty = False
+        self.liveTimer = QTimer(self)
+        self.liveTimer.setTimerType(Qt.PreciseTimer)
+        self.liveTimer.setInterval(int(1000 / self.liveRate))
+        self.liveTimer.timeout.connect(self.renderLive)
         self.histDefaultLevels = None
         self.histLastLevels = None
 
@@ -200,10 +313,21 @@ class WaveformViewerWidget(QWidget):
         self.waveformPlot1.showGrid(x=True, y=True)
         self.waveformPlot2.getViewBox().setMouseEnabled(y=False, x=False)
 
+        # Shown while a computation is running. Its parent is the ViewBox, so it stays at the top left corner
+        self.busyText = pg.TextItem("Computing...", color='y', anchor=(0, 0))
+        self.busyText.setParentItem(self.waveformPlot1.getViewBox())
+        self.busyText.setPos(10, 10)
+        self.busyText.hide()
+
         # Set a LinearRegionItem to select a region of the waveform
         self.region.setZValue(10)
         self.region.sigRegionChanged.connect(self.updatePlot1)
         self.waveformPlot1.sigRangeChanged.connect(self.updateRegion)
+        self.waveformPlot1.sigXRangeChanged.connect(self.updateDecimation)
+        self.waveformPlot1.getViewBox().sigResized.connect(self.updateDecimation)
+        self.waveformPlot1.sigRangeChanged.connect(self.updateSpectrogram)
+        self.waveformPlot1.getViewBox().sigResized.connect(self.updateSpectrogram)
+        self.waveformPlot2.getViewBox().sigResized.connect(self.updateOverview)
 
         self.settingsBtn = Button("Settings", on_click = self.settingsDialog.exec )
         self.settingsBtn.hide()
@@ -233,39 +357,66 @@ class WaveformViewerWidget(QWidget):
     def getViewRangeX(self):
         minX, maxX = self.waveformPlot1.vb.viewRange()[0]
         return minX, maxX
+
+
+    def getDataRangeX(self):
+        ''' Visible x range of waveformPlot1 in data units (the view range is in log10 while the axis is in log mode) '''
+        minX, maxX = self.getViewRangeX()
+        if self.waveformPlot1.getAxis('bottom').logMode:
+            minX, maxX = 10 ** minX, 10 ** maxX
+        return minX, maxX
     
 
     def getAddonData(self):
-        if self.addonData == {}:
+        ''' Data of the plot for the addons. It never waits: if the plot of the current settings is not computed yet,
+        it is requested and the last finished data is returned (None if it is of another plot type) '''
+        live = self.plotTypeMenu.selected == "Welch FFT" and self.welch is not None
+        if not live and not self.addonDataCurrent():
+            self.redraw()       # the live spectrum is refreshed by its timer instead
+        dataType = self.addonData.get("type")
+        if dataType != ADDON_DATA_TYPES.get(self.plotTypeMenu.selected):
             return None, self.waveformPlot1, self.waveformPlot2
-        minX, maxX = self.waveformPlot1.vb.viewRange()[0]
+        minX, maxX = self.getDataRangeX()
         minY, maxY = self.waveformPlot1.vb.viewRange()[1]
 
-        self.redraw()
-
-        if self.plotTypeMenu.selected in ["Waveform", "FFT"]:
+        if dataType in ["Waveform", "FFT"]:
             x, y = self.addonData["data"]
-            x = np.array(x)
-            y = np.array(y)
-            mask = (x >= minX) & (x <= maxX)
-            xvis = x[mask]
-            yvis = y[mask]
-            self.addonData["visibleData"] = (xvis, yvis)
+            # Views of the visible samples, found with a binary search (the x of the plots are sorted)
+            self.addonData["visibleData"] = visible_data(np.asarray(x), np.asarray(y), minX, maxX)
             self.addonData["viewRangeX"] = [minX, maxX]
             self.addonData["viewRangeY"] = [minY, maxY]
             return self.addonData, self.waveformPlot1, self.waveformPlot2
         
-        elif self.plotTypeMenu.selected == "Spectrogram":
+        elif dataType == "Spectrogram":
             f, t, Sxx = self.addonData["data"]
-            maskT = (t >= minX) & (t <= maxX)
-            maskF = (f >= minY) & (f <= maxY)
-            tvis = t[maskT]
-            fvis = f[maskF]
-            Sxxvis = Sxx[maskF, :][:, maskT]
-            self.addonData["visibleData"] = (fvis, tvis, Sxxvis)
-            self.addonData["viewRangeX"] = [minX, maxX]
-            self.addonData["viewRangeY"] = [minY, maxY]
-            return self.addonData, self.waveformPlot1, self.waveformPlot2
+            addonData = dict(self.addonData)    # the magnitudes of addonData stay linear for the tiles
+            if self.yAxisScale.selected == "Log Y":
+                # The addons get the log10 of the magnitudes with Log Y (zeros give -inf)
+                key = ("addonLog", self.specKey)
+                logSxx = self.cache.get(key)
+                if logSxx is None:
+                    with np.errstate(divide='ignore'):
+                        logSxx = np.log10(Sxx)
+                    self.cache.put(key, logSxx)
+                Sxx = logSxx
+            addonData["data"] = (f, t, Sxx)
+            addonData["visibleData"] = visible_spectrogram(f, t, Sxx, minX, maxX, minY, maxY)
+            addonData["viewRangeX"] = [minX, maxX]
+            addonData["viewRangeY"] = [minY, maxY]
+            return addonData, self.waveformPlot1, self.waveformPlot2
+
+
+    def addonDataCurrent(self):
+        ''' True if addonData holds the data of the current dataset and settings (or of the live spectrum) '''
+        plotType = self.plotTypeMenu.selected
+        if plotType == "Welch FFT" and self.welch is not None:
+            return self.plotKey == self.welchKey
+        key = self.computeKey()
+        if plotType == "Spectrogram":
+            return self.addonData.get("type") == "Spectrogram" and self.specKey == key
+        if plotType == "Waveform":
+            return self.addonData.get("type") == "Waveform" and self.plotKey == key[:2] + ("padding",)
+        return self.plotKey == key
 
 
     def onAddonSelected(self, addon):
@@ -286,16 +437,7 @@ class WaveformViewerWidget(QWidget):
     def redraw(self, _=None, __=None, clear=True):
         ''' Plot with the same data without changing the view or the scale '''
         # print("redraw")
-        if clear:
-            self.clear()
-        x, y = self.data
-        Ts = x[1] - x[0]    # sampling interval
-        x, y = self.setPadding(x, y, Ts)
-        x, y = self.computePlotData(x, y, Ts)
-        self.plotComputedData(x, y)
-        if self.plotTypeMenu.selected == "Spectrogram" and self.histLastLevels is not None:
-            self.histogramPlot.setLevels(*self.histLastLevels)
-        self.updateScale()
+        self.requestPlot(resetView=False, clear=clear)
 
 
     def scatter(self, x, y):
@@ -331,22 +473,147 @@ class WaveformViewerWidget(QWidget):
             x = x[::subsampling]
             y = y[::subsampling]
 
+        if self.data is None or self.data[0] is not x or self.data[1] is not y:
+            self.dataToken += 1
         self.data = x, y
+        self.stopLive()
 
+        self.requestPlot(resetView=True, clear=clear)
+
+
+    def requestPlot(self, resetView, clear=True):
+        ''' Plot self.data with the current settings. The padding and the spectral data are taken from the cache,
+        or computed in the worker pool (then the plot is updated when the result arrives) '''
+        if self.data is None:
+            return
+        x, y = self.data
         Ts = x[1] - x[0]    # sampling interval
-        if clear:
+        settings = self.computeSettings()
+        paddingKey = (self.dataToken, settings["padding"], "padding")
+        key = self.computeKey(settings)
+        padded = self.cache.get(paddingKey)
+        computed = self.cache.get(key) if settings["plotType"] != "Waveform" else None
+
+        self.computeGeneration += 1
+        request = (paddingKey, key, Ts, resetView, clear)
+        same = None         # request computing the same data, its result is taken for this one
+        for future, (_, pending) in list(self.computeRequests.items()):
+            if same is None and pending[:2] == (paddingKey, key) and not future.done():
+                same = future
+            else:
+                future.cancel()         # only cancels the requests not started yet
+        if same is not None:
+            self.computeRequests[same] = (self.computeGeneration, request)
+            return
+        if padded is not None and (computed is not None or settings["plotType"] == "Waveform"):
+            self.busyText.hide()
+            self.showPlot(padded, computed, Ts, resetView, clear)
+            return
+
+        future = self.executor.submit(compute_plot_data, x, y, Ts, settings, padded)
+        self.computeRequests[future] = (self.computeGeneration, request)
+        future.add_done_callback(self.computeBridge.computed.emit)
+        self.busyText.show()
+
+
+    def appendSamples(self, y, fs):
+        ''' Add samples of a live signal. In the Welch FFT mode they update its averaged spectrum, which is
+        shown at most liveRate times per second (other plot types ignore them). PlotPage feeds it one channel
+        of the decoded batches of a port (SerialPortsHandler.on_port_batch_received)
+        - y: the new samples
+        - fs: sample rate (Hz) '''
+        if self.plotTypeMenu.selected != "Welch FFT":
+            return
+        settings = self.computeSettings()
+        key = ("live", fs, settings["welchSegment"], settings["welchOverlap"], settings["welchWindow"],
+               settings["welchAveraging"], settings["welchAverages"])
+        if self.welch is None or key != self.welchKey:
+            self.welch = create_welch(fs, settings)
+            self.welchKey = key
+            self.computeGeneration += 1     # the live spectrum replaces the plot of a dataset still computing
+            self.busyText.hide()
+        if self.welch.push(y) > 0:
+            self.liveDirty = True
+        if not self.liveTimer.isActive():
+            self.liveTimer.start()
+
+
+    def stopLive(self):
+        ''' Drop the live analyzer (its samples are replaced by a dataset) '''
+        self.liveTimer.stop()
+        self.welch = None
+        self.welchKey = None
+        self.liveDirty = False
+
+
+    def renderLive(self):
+        ''' Show the averaged spectrum of the live samples if it changed since the last refresh '''
+        if self.welch is None or self.plotTypeMenu.selected != "Welch FFT":
+            self.liveTimer.stop()
+            return
+        if not self.liveDirty:
+            return
+        self.liveDirty = False
+        x, y = self.welch.frequencies, self.welch.spectrum()
+        self.addonData = {
+            "data": (x, y),
+            "type": "FFT",
+        }
+        if self.curve1 is None or self.plotKey != self.welchKey:
+            # First spectrum (or new settings): new curves and view
             self.clear()
+            self.updateLabels()
+            self.plotKey = self.welchKey
+            self.plotComputedData(x, y)
+            self.autoRange()
+            self.updateScale()
+            return
+        self.plotData = x, y
+        self.updateOverview()
+        self.updateDecimation()
+
+
+    def computeFinished(self, future):
+        ''' A computation of the worker pool ended (runs in the GUI thread) '''
+        generation, request = self.computeRequests.pop(future, (None, None))
+        if request is None or future.cancelled():
+            return
+        paddingKey, key, Ts, resetView, clear = request
+        current = generation == self.computeGeneration
+        if current:
+            self.busyText.hide()
+        try:
+            padded, computed = future.result()
+        except Exception as e:
+            print(f"Plot computation failed: {e}")
+            return
+        self.cache.put(paddingKey, padded)
+        if computed is not None:
+            self.cache.put(key, computed)
+        if current:         # Results of older requests are only cached
+            self.showPlot(padded, computed, Ts, resetView, clear)
+
 
-        x, y = self.setPadding(x, y, Ts)
-        x, y = self.computePlotData(x, y, Ts)
-        self.updateLabels()
+    def showPlot(self, padded, computed, Ts, resetView, clear=True):
+        ''' Replace the plot with the padded signal and its computed data '''
+        if clear:
+            self.clear()
+        x, y = self.computePlotData(*padded, Ts, computed)
+        if resetView:
+            self.updateLabels()
         self.plotComputedData(x, y)
-        self.autoRange()
+        if resetView:
+            self.autoRange()
+        elif self.plotTypeMenu.selected == "Spectrogram" and self.histLastLevels is not None:
+            self.histogramPlot.setLevels(*self.histLastLevels)
         self.updateScale()
 
 
     def autoRange(self):
         # print("autoRange")
+        if self.curve1 is not None:
+            self.curve1.setData(*self.decimate(self.waveformPlot1, 0, len(self.plotData[0])))    # whole data, for the bounds
+        self.updateSpectrogram(full=True)       # whole spectrogram, for the bounds
         self.waveformPlot1.autoRange()
         self.waveformPlot2.autoRange()
         self.histogramPlot.autoHistogramRange()
@@ -358,11 +625,103 @@ class WaveformViewerWidget(QWidget):
 
     def plotComputedData(self, x, y):
         # print("plotComputedData")
-        if self.plotTypeMenu.selected in ["Waveform", "FFT"]:
-            self.waveformPlot1.plot(x, y)
-            self.waveformPlot2.plot(x, y)
-        elif self.plotTypeMenu.selected == "Spectrogram":
-            self.waveformPlot2.plot(x, y)
+        # The curves only get the min/max envelope of the data at the width of the plots (updated when the view changes)
+        self.plotData = x, y
+        self.curve1 = None
+        self.buildPyramid(y)
+        if self.plotTypeMenu.selected in ["Waveform", "FFT", "Welch FFT"]:
+            self.curve1 = self.waveformPlot1.plot()
+        self.curve2 = self.waveformPlot2.plot()
+        self.updateOverview()
+        self.updateDecimation()
+
+
+    def buildPyramid(self, y):
+        ''' Build the min/max pyramid of a large dataset in a background thread. Until it is ready, the visible range is decimated directly '''
+        self.pyramid = None
+        self.pyramidToken += 1
+        if len(y) < self.pyramidMinSize:
+            return
+        self.pyramid = self.cache.get(("pyramid", self.plotKey))
+        if self.pyramid is not None:
+            return
+        builder = PyramidBuilder(self.pyramidToken, y)
+        builder.built.connect(self.pyramidBuilt)
+        builder.finished.connect(lambda b=builder: self.pyramidBuilders.remove(b))
+        self.pyramidBuilders.append(builder)    # keep a reference until the thread finishes
+        builder.start()
+
+
+    def pyramidBuilt(self, token, pyramid):
+        if token != self.pyramidToken:
+            return      # built for older data
+        self.pyramid = pyramid
+        self.cache.put(("pyramid", self.plotKey), pyramid)
+        self.updateOverview()
+        self.updateDecimation()
+
+
+    def decimate(self, plot, start, stop):
+        ''' Min/max envelope of plotData[start:stop] with one bin per pixel of the plot (the samples if they are fewer) '''
+        x, y = self.plotData
+        bins = max(1, int(plot.getViewBox().width()))
+        if self.pyramid is not None:
+            return self.pyramid.decimate(x, y, start, stop, bins)
+        return minmax_decimate(x[start:stop], y[start:stop], bins, start)
+
+
+    def updateDecimation(self, _=None, __=None):
+        ''' Update the curve of waveformPlot1 with the samples of the visible range (decimated) '''
+        if self.curve1 is None or self.plotData is None:
+            return
+        minX, maxX = self.getDataRangeX()
+        start, stop = visible_range(self.plotData[0], minX, maxX)
+        self.curve1.setData(*self.decimate(self.waveformPlot1, start, stop))
+
+
+    def updateSpectrogram(self, _=None, __=None, full=False):
+        ''' Show the visible time and frequency range of the spectrogram, max-pooled to the pixels of waveformPlot1
+        (so the peaks stay visible), in log10 with Log Y. The tiles and their levels are cached.
+        - full: show the whole spectrogram instead of the visible range
+        Returns the levels (min, max) of the tile shown, None if nothing is shown '''
+        if self.specImage is None:
+            return None
+        f, t, Sxx = self.specData
+        if full:
+            tStart, tStop, fStart, fStop = 0, len(t), 0, len(f)
+        else:
+            (minX, maxX), (minY, maxY) = self.waveformPlot1.vb.viewRange()
+            tStart, tStop = visible_range(t, minX, maxX)
+            fStart, fStop = visible_range(f, minY, maxY)
+        if tStop <= tStart or fStop <= fStart:
+            return None
+        vb = self.waveformPlot1.getViewBox()
+        tSize, tStart, tStop = pooled_range(tStart, tStop, int(vb.width()), len(t))
+        fSize, fStart, fStop = pooled_range(fStart, fStop, int(vb.height()), len(f))
+        log = self.yAxisScale.selected == "Log Y"
+        key = ("tile", self.specKey, log, tSize, tStart, tStop, fSize, fStart, fStop)
+        cached = self.cache.get(key)
+        if cached is None:
+            tile = max_pool(Sxx[fStart:fStop, tStart:tStop], fSize, tSize)
+            if log:
+                positive = tile[tile > 0]
+                tile = np.log10(np.maximum(tile, positive.min() if len(positive) > 0 else 1.0))    # zeros at the lowest level
+            cached = tile, (float(tile.min()), float(tile.max()))
+            self.cache.put(key, cached)
+        tile, levels = cached
+        # Cells centered at their time and frequency
+        dt = t[1] - t[0] if len(t) > 1 else 1.0
+        df = f[1] - f[0] if len(f) > 1 else 1.0
+        self.specImage.setImage(tile, autoLevels=False)
+        self.specImage.setRect(QRectF(t[tStart] - dt / 2, f[fStart] - df / 2, (tStop - tStart) * dt, (fStop - fStart) * df))
+        return levels
+
+
+    def updateOverview(self, _=None):
+        ''' Update the curve of waveformPlot2 with the whole data (decimated) '''
+        if self.curve2 is None or self.plotData is None:
+            return
+        self.curve2.setData(*self.decimate(self.waveformPlot2, 0, len(self.plotData[0])))
 
 
     def updateScale(self):
@@ -370,10 +729,11 @@ class WaveformViewerWidget(QWidget):
         xlog = True if self.xAxisScale.selected == "Log X" else False
         ylog = True if self.yAxisScale.selected == "Log Y" else False
         plotType = self.plotTypeMenu.selected
-        if plotType in ["FFT", "Waveform"]:
+        if plotType in ["FFT", "Waveform", "Welch FFT"]:
             self.waveformPlot1.setLogMode(x=xlog, y=ylog)
             self.waveformPlot2.setLogMode(x=xlog, y=ylog)
             self.waveformPlot1.setMouseEnabled(x=True, y=False)     # Disable y axis zoom
+            self.waveformPlot1.disableAutoRange(axis='x')           # The curve only has the visible data
             self.waveformPlot1.setAutoVisible(y=True)               # Enable auto range to visible data for the y axis
             self.waveformPlot1.enableAutoRange(axis='y')
             self.histogramPlot.hide()                               # Hide the histogram
@@ -387,15 +747,50 @@ class WaveformViewerWidget(QWidget):
 
 
 
-    def computePlotData(self, x, y, Ts):
+    def computeSettings(self):
+        ''' Settings the computed data depends on '''
+        return {
+            "plotType": self.plotTypeMenu.selected,
+            "padding": int(self.settingsDialog["padding"]),
+            "window": self.settingsDialog["FFTWindow"],
+            "nperseg": int(self.settingsDialog["nperseg"]),
+            "noverlap": int(self.settingsDialog["noverlap"]),
+            "log": self.yAxisScale.selected == "Log Y",
+            "welchWindow": self.settingsDialog["welchWindow"],
+            "welchSegment": int(self.settingsDialog["welchSegment"]),
+            "welchOverlap": int(self.settingsDialog["welchOverlap"]),
+            "welchAveraging": self.settingsDialog["welchAveraging"],
+            "welchAverages": int(self.settingsDialog["welchAverages"]),
+        }
+
+
+    def computeKey(self, settings=None):
+        ''' Cache key of the data computed by compute_spectral: the dataset and the settings the plot type depends on '''
+        settings = self.computeSettings() if settings is None else settings
+        plotType = settings["plotType"]
+        key = (self.dataToken, settings["padding"], plotType)
+        if plotType == "FFT":
+            return key + (settings["window"],)
+        elif plotType == "Spectrogram":
+            return key + (settings["nperseg"], settings["noverlap"])
+        elif plotType == "Welch FFT":
+            return key + (settings["welchWindow"], settings["welchSegment"], settings["welchOverlap"],
+                          settings["welchAveraging"], settings["welchAverages"])
+        return key
+
+
+    def computePlotData(self, x, y, Ts, computed=None):
+        ''' Show the computed data of the plot type (the spectrogram image), and return the x, y of the curves.
+        - computed: result of compute_spectral for x, y, computed now if None '''
         # print("computePlotData")
         plotType = self.plotTypeMenu.selected
-        if plotType == "FFT":
-            # apply the window function
-            window = self.settingsDialog["FFTWindow"]
-            y = y * signal.get_window(window, len(y))
-            y = np.abs(np.fft.rfft(y)) / len(y)
-            x = np.fft.rfftfreq(len(x), d=Ts)
+        # key of the data plotted: the FFT, or the padded waveform (also plotted under the spectrogram)
+        key = self.computeKey()
+        self.plotKey = key if plotType in ["FFT", "Welch FFT"] else key[:2] + ("padding",)
+        if computed is None and plotType != "Waveform":
+            computed = compute_spectral(x, y, Ts, self.computeSettings())
+        if plotType in ["FFT", "Welch FFT"]:
+            x, y = computed
             self.addonData = {
                 "data": (x, y),
                 "type": "FFT",
@@ -407,34 +802,21 @@ class WaveformViewerWidget(QWidget):
                 "type": "Waveform",
             }
         elif plotType == "Spectrogram":
-            nperseg = int(self.settingsDialog["nperseg"])
-            noverlap = int(self.settingsDialog["noverlap"])
-            if noverlap >= nperseg:
-                noverlap = nperseg - 10
-            window = self.settingsDialog["specWindow"]
-            f, t, Sxx = signal.spectrogram(y, fs=1/Ts, nperseg=nperseg, noverlap=noverlap, scaling='spectrum', mode='magnitude')
-
-            if self.yAxisScale.selected == "Log Y":
-                Sxx = np.log10(Sxx)
+            f, t, Sxx = computed
 
             self.addonData = {
                 "data": (f, t, Sxx),
                 "type": "Spectrogram",    
             }
 
-            x_scale = (x.max() - x.min()) / Sxx.shape[1]
-            y_scale = (f.max() - f.min()) / Sxx.shape[0]
-            tr = QTransform()
-            tr.scale(x_scale, y_scale)
-
-            img = pg.ImageItem()
-            img.setImage(Sxx)
-            img.setPos(0, 0)
-            img.setTransform(tr)            
+            # Only a tile of the visible range at the resolution of the plot is shown (see updateSpectrogram)
+            self.specData = computed
+            self.specKey = key
+            self.specImage = pg.ImageItem()
 
             self.histogramPlot.sigLevelChangeFinished.disconnect(self.histogramLevelsChanged)   # DO
-            self.histogramPlot.setImageItem(img)
-            self.histDefaultLevels = (np.min(Sxx), np.max(Sxx))
+            self.histogramPlot.setImageItem(self.specImage)
+            self.histDefaultLevels = self.updateSpectrogram(full=True)     # levels of the whole spectrogram
             self.histogramPlot.setLevels(*self.histDefaultLevels)
             self.histogramPlot.gradient.restoreState(
                 {'mode': 'rgb', 
@@ -443,7 +825,7 @@ class WaveformViewerWidget(QWidget):
                         (0.0, (75, 0, 113, 255))]})
             # hist.gradient.loadPreset('flame')
             self.histogramPlot.sigLevelChangeFinished.connect(self.histogramLevelsChanged)
-            self.waveformPlot1.addItem(img)
+            self.waveformPlot1.addItem(self.specImage)
         else:
             raise ValueError("Invalid plot type")
         
@@ -451,6 +833,10 @@ class WaveformViewerWidget(QWidget):
 
     def clear(self):
         # Clear the plots
+        self.curve1 = None
+        self.curve2 = None
+        self.specImage = None
+        self.specData = None
         self.waveformPlot1.clear()
         self.waveformPlot2.clear()
         self.waveformPlot2.addItem(self.region, ignoreBounds=True)
@@ -460,7 +846,7 @@ class WaveformViewerWidget(QWidget):
     def updateLabels(self):
         # print("updateLabels")
         plotType = self.plotTypeMenu.selected
-        if plotType == "FFT":
+        if plotType in ["FFT", "Welch FFT"]:
             self.waveformPlot1.setLabel('bottom', "Frequency", units='Hz')
             self.waveformPlot2.setLabel('bottom', "Frequency", units='Hz')
         elif plotType == "Waveform":
@@ -473,17 +859,6 @@ class WaveformViewerWidget(QWidget):
             raise ValueError("Invalid plot type")
 
 
-    def setPadding(self, x, y, Ts):
-        padding = int(self.settingsDialog["padding"])
-        if padding > len(x) // 2:
-            padding = len(x) // 2
-        # Add zero padding
-        y = np.pad(y, (padding, padding), 'constant')
-        xLast = x[-1] + Ts * padding * 2
-        x = np.linspace(x[0], xLast, len(y))
-        return x, y
-
-
     def updatePlot1(self):
         ''' Update the waveform plot 1 when the region is changed '''
         self.region.setZValue(10)
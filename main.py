@@ -8,6 +8,7 @@ from backend.MainModel import MainModel
 from frontend.MainWindow import *
 from frontend.pages.SerialPortPage import SerialPortPage
 from frontend.pages.MonitorPage import MonitorPage
+from frontend.pages.PlotPage import PlotPage
 
 import faulthandler
 
@@ -22,10 +23,12 @@ if __name__ == '__main__':
     pages = [
         SerialPortPage(),
         MonitorPage(),
+        PlotPage(),
     ]
 
     print("Pages created, creating main window")
     ex = MainWindow(pages=pages, model=mainModel)
+    app.aboutToQuit.connect(mainModel.serial.stop)
 
     faulthandler.enable()
     sys.exit(app.exec_())
\ No newline at end of file
@@ -0,0 +1,13 @@
+import os
+
+import pytest
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+
+
+@pytest.fixture(scope="session")
+def app():
+    """ One application for the whole session: the Qt objects created at import (MainModel.serial) need it alive """
+    return QApplication.instance() or QApplication([])
@@ -0,0 +1,140 @@
+"""
+SerialFramer must find the same frames however the stream is split into reads, including
+reads that end inside a header or a footer, and recover from the data lost on overflow.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.serial.Structures import SerialBuffer
+from backend.serial.Framer import SerialFramer, to_bytes
+
+
+def reference_frames(stream: bytes, header: bytes, footer: bytes = b'', expected_size: int = 0):
+    """ Frames of the whole stream, found by searching it from the start (not resumable) """
+    frames = []
+    start = stream.find(header)
+    while start >= 0:
+        body = start + len(header)
+        if footer:
+            index = stream.find(footer, body)
+            end = index + len(footer) - start
+            if expected_size > 0 and (end > expected_size or (index < 0 and len(stream) - start > expected_size)):
+                start = stream.find(header, start + 1)      # too long: resync after its header
+                continue
+            if index < 0:
+                break
+            frames.append(stream[body:index])
+            start = stream.find(header, index + len(footer))
+        elif expected_size > 0:
+            if len(stream) - start < expected_size:
+                break
+            frames.append(stream[body:start + expected_size])
+            start = stream.find(header, start + expected_size)
+        else:
+            index = stream.find(header, body)
+            if index < 0:
+                break
+            frames.append(stream[body:index])
+            start = index
+    return frames
+
+
+def feed_chunks(framer: SerialFramer, buffer: SerialBuffer, chunks) -> list:
+    frames = []
+    for chunk in chunks:
+        buffer.push(chunk)
+        frames.extend(bytes(frame) for frame in framer.feed(buffer))
+    return frames
+
+
+def split(rnd: random.Random, stream: bytes, largest: int) -> list:
+    chunks, i = [], 0
+    while i < len(stream):
+        size = rnd.randint(1, largest)
+        chunks.append(stream[i:i + size])
+        i += size
+    return chunks
+
+
+MODES = [
+    (b"\xaa\x55", b"", 0),              # header only
+    (b"\xaa\x55", b"", 6),              # header + expected_size
+    (b"\xaa\x55", b"\r\n", 0),          # header + footer
+    (b"\xaa\x55", b"\r\n", 8),          # header + footer, frames longer than 8 bytes are dropped
+    (b"$", b"\n", 0),
+]
+
+
+@pytest.mark.parametrize("header, footer, expected_size", MODES)
+def test_any_split_finds_the_frames_of_the_whole_stream(header, footer, expected_size):
+    rnd = random.Random(42)
+    for trial in range(200):
+        stream = bytes(rnd.choice(b"\xaa\x55\r\n$xy") for _ in range(rnd.randint(0, 200)))
+        expected = reference_frames(stream, header, footer, expected_size)
+        for largest in (1, 2, 3, 7, 64):
+            framer = SerialFramer(header, footer, expected_size)
+            frames = feed_chunks(framer, SerialBuffer(4096), split(rnd, stream, largest))
+            assert frames == expected, (stream, largest)
+            assert framer.frames == len(expected)
+
+
+def test_header_and_footer_split_between_reads():
+    framer, buffer = SerialFramer(b"\xaa\x55", b"\r\n"), SerialBuffer(64)
+    chunks = [b"junk\xaa", b"\x55one\r", b"\n\xaa", b"\x55two", b"\r", b"\n"]
+    assert feed_chunks(framer, buffer, chunks) == [b"one", b"two"]
+    assert framer.garbage_bytes == 4 and framer.dropped_frames == 0 and len(buffer) == 0
+
+
+def test_hex_settings():
+    assert to_bytes("0xAA55") == b"\xaa\x55"
+    assert to_bytes("\n") == b"\n"
+    assert to_bytes("0xZZ") == b"0xZZ"
+
+
+def test_raw_mode_returns_each_read():
+    framer, buffer = SerialFramer(), SerialBuffer(64)
+    assert feed_chunks(framer, buffer, [b"abc", b"", b"de"]) == [b"abc", b"de"]
+
+
+def process(framer: SerialFramer, buffer: SerialBuffer, chunk: bytes) -> list:
+    """ Push and frame one read like SerialPort._process, including the overflow handling """
+    dropped = buffer.push(chunk)
+    frames = [bytes(frame) for frame in framer.feed(buffer)]
+    if dropped > 0 and buffer.policy != SerialBuffer.DROP_OLDEST:
+        framer.discard_partial(buffer)
+    if buffer.policy == SerialBuffer.BLOCK and buffer.free() == 0:
+        buffer.dropped_bytes += len(buffer)
+        framer.discard_partial(buffer)
+    return frames
+
+
+@pytest.mark.parametrize("policy", SerialBuffer.POLICIES)
+@pytest.mark.parametrize("footer, expected_size", [(b"\n", 0), (b"", 8)])
+def test_overflow_only_loses_whole_frames(policy, footer, expected_size):
+    rnd = random.Random(7)
+    header = b"\xaa\x55"
+    for trial in range(100):
+        # Numbered frames of 8 bytes, read in chunks that sometimes overflow a 24 byte buffer
+        sent = [b"%05d" % i + (b"\n" if footer else b"!") for i in range(60)]
+        stream = b"".join(header + frame for frame in sent)
+        framer, buffer = SerialFramer(header, footer, expected_size), SerialBuffer(24, policy)
+        frames = []
+        for chunk in split(rnd, stream, 40):
+            frames.extend(process(framer, buffer, chunk))
+        if footer:
+            sent = [frame[:-1] for frame in sent]
+        assert len(frames) > 0
+        # The frames received are frames that were sent, complete and in order
+        positions = [sent.index(frame) for frame in frames]
+        assert positions == sorted(set(positions))
+        if buffer.dropped_bytes == 0:
+            assert frames == sent
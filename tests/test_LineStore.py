@@ -0,0 +1,69 @@
+"""
+DiskLineStore must split the lines exactly like LineStore, so the disk and memory scrollback
+have the same line count and indices.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.LineStore import LineStore, DiskLineStore
+
+MAX_LINE = LineStore.MAX_LINE
+
+
+def stores(tmp_path, chunks):
+    memory = LineStore()
+    disk = DiskLineStore(str(tmp_path / "session.log"))
+    for chunk in chunks:
+        memory.append(chunk)
+        disk.append(chunk)
+    return memory, disk
+
+
+def assert_same_lines(memory, disk):
+    assert disk.end == memory.end
+    assert disk.partial == memory.partial
+    assert disk.lines(0, len(disk)) == memory.lines(0, len(memory))
+
+
+@pytest.mark.parametrize("terminator", ["\n", "\r\n"])
+@pytest.mark.parametrize("length", [MAX_LINE - 1, MAX_LINE, MAX_LINE + 1, 2 * MAX_LINE, 3 * MAX_LINE])
+def test_long_lines(tmp_path, terminator, length):
+    memory, disk = stores(tmp_path, ["a" * length + terminator + "b" + terminator])
+    assert_same_lines(memory, disk)
+    disk.close()
+
+
+def test_crlf_line_at_max_line(tmp_path):
+    memory, disk = stores(tmp_path, ["a" * MAX_LINE + "\r\n" + "b\n"])
+    assert [len(line) for line in disk.lines(0, disk.end)] == [MAX_LINE, 1]
+    assert_same_lines(memory, disk)
+    disk.close()
+
+
+@pytest.mark.parametrize("terminator", ["\n", "\r\n"])
+@pytest.mark.parametrize("length", [MAX_LINE, MAX_LINE + 1, 2 * MAX_LINE])
+@pytest.mark.parametrize("size", [1, 1000, MAX_LINE])
+def test_long_lines_in_chunks(tmp_path, terminator, length, size):
+    text = ("a" * length + terminator + "b" + terminator) * 2 + "c" * length
+    memory, disk = stores(tmp_path, [text[i:i + size] for i in range(0, len(text), size)])
+    assert_same_lines(memory, disk)
+    disk.close()
+
+
+def test_max_lines():
+    store = LineStore(max_lines=1000)
+    for i in range(0, 50000, 100):
+        store.append("".join(f"line {j}\n" for j in range(i, i + 100)))
+    assert store.end == 50000 and store.first == 49000 and len(store) == 1000
+    assert store.lines(0, store.end) == [f"line {j}" for j in range(49000, 50000)]
+    assert store.line(48999) == "" and store.line(49000) == "line 49000"
+    assert len(store.times(0, store.end)) == 1000
+    assert store.memory_usage() < 2 * LineStore.CHUNK_SIZE     # the hidden chunks are discarded
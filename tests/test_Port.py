@@ -0,0 +1,69 @@
+"""
+Delivery of the frames of a SerialPort to its subscribers. The frames of a read are handed
+to _deliver, as the GUI thread does after _process, without opening a port.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.serial.Structures import PortInfo, SerialSettings
+from backend.serial.Port import SerialPort
+
+
+@pytest.fixture
+def port(app):
+    info = PortInfo()
+    info.name = "ttyTEST0"
+    return SerialPort(SerialSettings(info))
+
+
+def deliver(port, frames):
+    port._deliver([bytearray(frame) for frame in frames], None, time.monotonic())
+
+
+def test_default_callback_gets_a_bytearray_per_frame(port):
+    received = []
+    port.subscribe(lambda data: received.append(data))
+    deliver(port, [b"1,2\n", b"3,4\n"])
+    deliver(port, [b"5,6\n"])
+    assert received == [bytearray(b"1,2\n"), bytearray(b"3,4\n"), bytearray(b"5,6\n")]
+    assert all(type(data) is bytearray for data in received)
+
+
+def test_batched_callback_gets_the_frames_of_a_read(port):
+    received = []
+    port.subscribe(lambda frames: received.append(frames), batched=True)
+    deliver(port, [b"1,2\n", b"3,4\n"])
+    deliver(port, [b"5,6\n"])
+    assert received == [[bytearray(b"1,2\n"), bytearray(b"3,4\n")], [bytearray(b"5,6\n")]]
+
+
+def test_unsubscribe(port):
+    single, batched = [], []
+    port.subscribe(single.append)
+    port.subscribe(batched.append, batched=True)
+    port.unsubscribe(single.append)
+    deliver(port, [b"a"])
+    assert single == [] and len(batched) == 1
+    port.unsubscribe()
+    deliver(port, [b"b"])
+    assert len(batched) == 1 and port.frameSubscribers == []
+
+
+def test_parse_errors_are_counted_once_across_a_reset(port):
+    metrics = port.metrics
+    metrics.record_read(10, 1, 2)
+    metrics.record_read(10, 1, 5)
+    assert metrics.snapshot()["parse_errors"] == 5
+    metrics.reset()                     # reconnect: new framer and decoder, their counts start at 0
+    metrics.record_read(10, 1, 1)
+    metrics.record_read(10, 1, 3)
+    assert metrics.snapshot()["parse_errors"] == 3
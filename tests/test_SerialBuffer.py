@@ -0,0 +1,177 @@
+"""
+SerialBuffer must behave like a plain bytearray with the overflow policy applied: the ring,
+its mirror area, the raw chunk fast path and the count() bookkeeping are only optimizations.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backend.serial.Structures import SerialBuffer
+
+
+class Reference:
+    """ The unread data as a bytearray, with the overflow policies of SerialBuffer """
+    def __init__(self, max_size, policy):
+        self.max_size = max_size
+        self.policy = policy
+        self.data = bytearray()
+        self.position = 0
+        self.dropped_bytes = 0
+        self.high_water = 0
+
+    def push(self, data):
+        if self.policy == SerialBuffer.DROP_OLDEST:
+            self.data += data
+            dropped = max(0, len(self.data) - self.max_size)
+            self.data = self.data[dropped:]
+            self.position += dropped
+        else:
+            keep = self.max_size - len(self.data)
+            self.data += data[:keep]
+            dropped = max(0, len(data) - keep)
+        self.dropped_bytes += dropped
+        self.high_water = max(self.high_water, len(self.data))
+        return dropped
+
+    def consume(self, size):
+        output = self.data[:size]
+        self.data = self.data[size:]
+        self.position += size
+        return output
+
+    def pop_from(self, header, size=0):
+        index = self.data.find(header)
+        if index < 0 or (size > 0 and len(self.data) < index + size):
+            raise ValueError
+        output = self.data[:index]
+        self.consume(index + size if size > 0 else index + len(header))
+        return output
+
+    def pop_from_to(self, header, footer):
+        index0 = self.data.find(header)
+        index1 = -1 if index0 < 0 else self.data.find(footer, index0 + len(header))
+        if index1 < 0:
+            raise ValueError
+        output = self.data[index0:index1]
+        self.consume(index1 + len(footer))
+        return output
+
+
+def call(obj, method, *args):
+    try:
+        return getattr(obj, method)(*args)
+    except ValueError:
+        return ValueError
+
+
+ITEMS = [b"a", b"ab", b"\xaa\x55", b"aa", b"ba", b"\xaa\x55\xaa"]
+
+
+@pytest.mark.parametrize("policy", SerialBuffer.POLICIES)
+@pytest.mark.parametrize("count_scan", [0, SerialBuffer.COUNT_SCAN])
+def test_random_operations(monkeypatch, policy, count_scan):
+    # count_scan 0 makes count() use its occurrence bookkeeping even on small buffers
+    monkeypatch.setattr(SerialBuffer, "COUNT_SCAN", count_scan)
+    rnd = random.Random(1234)
+    for trial in range(300):
+        cap = rnd.choice([8, 16, 33, 64])
+        buffer, reference = SerialBuffer(cap, policy), Reference(cap, policy)
+        for step in range(80):
+            op = rnd.random()
+            if op < 0.4:
+                data = bytes(rnd.choice(b"ab\xaa\x55") for _ in range(rnd.randint(0, cap + 5)))
+                data = rnd.choice([data, bytearray(data), memoryview(data)])
+                assert buffer.push(data) == reference.push(bytes(data))
+            elif op < 0.5:
+                assert buffer.pop_all() == reference.consume(len(reference.data))
+            elif op < 0.6:
+                size = rnd.randint(0, len(reference.data))
+                buffer.discard(size)
+                reference.consume(size)
+            elif op < 0.7:
+                item = rnd.choice(ITEMS)
+                assert buffer.count(item) == reference.data.count(item)
+            elif op < 0.75:
+                item = rnd.choice(ITEMS)
+                assert buffer.find(item) == reference.data.find(item)
+                assert (item in buffer) == (item in reference.data)
+            elif op < 0.85:
+                args = rnd.choice([(b"\xaa\x55",), (b"\xaa\x55", 4), (b"a", 3)])
+                assert call(buffer, "pop_from", *args) == call(reference, "pop_from", *args)
+            elif op < 0.95:
+                args = rnd.choice([(b"\xaa\x55", b"b"), (b"a", b"a"), (b"\xaa", b"\x55\xaa")])
+                assert call(buffer, "pop_from_to", *args) == call(reference, "pop_from_to", *args)
+            else:
+                size = rnd.randint(0, len(reference.data))
+                assert call(buffer, "pop_bytes", size) == call(reference, "consume", size)
+                assert bytes(buffer.buffer) == reference.data
+                assert buffer.peek(1, 5) == reference.data[1:5]
+            assert len(buffer) == len(reference.data)
+            assert buffer.tell() == reference.position
+            assert buffer.free() == cap - len(reference.data)
+            assert buffer.dropped_bytes == reference.dropped_bytes
+            assert buffer.high_water == reference.high_water
+
+
+def test_raw_chunk_is_returned_as_pushed():
+    buffer = SerialBuffer(16)
+    assert buffer.push(b"0123456789") == 0
+    assert buffer.pop_all() == bytearray(b"0123456789")
+    # A second push before the pop moves the first chunk into the ring
+    buffer.push(bytearray(b"abc"))
+    buffer.push(b"def")
+    assert bytes(buffer.buffer) == b"abcdef"
+    assert buffer.pop_all() == bytearray(b"abcdef")
+    assert buffer.tell() == 16 and len(buffer) == 0
+
+
+def test_unread_data_wrapping_around_the_ring():
+    buffer = SerialBuffer(8)
+    buffer.push(b"xxxxx\xaa")
+    buffer.push(b"z")
+    buffer.discard(5)
+    buffer.push(b"\x55yyyy")        # wraps around the end of the ring
+    assert bytes(buffer.buffer) == b"\xaaz\x55yyyy"
+    assert buffer.find(b"z\x55y") == 1
+    assert buffer.count(b"y") == 4
+    assert buffer.pop_from(b"\x55") == bytearray(b"\xaaz")
+    assert buffer.pop_all() == bytearray(b"yyyy")
+
+
+@pytest.mark.parametrize("policy", [SerialBuffer.DROP_NEWEST, SerialBuffer.BLOCK])
+def test_full_buffer_keeps_the_oldest_bytes(policy):
+    buffer = SerialBuffer(8, policy)
+    assert buffer.push(b"0123456") == 0
+    assert buffer.free() == 1
+    assert buffer.push(b"789") == 2
+    assert buffer.push(b"abc") == 3
+    assert buffer.pop_all() == bytearray(b"01234567")
+    assert buffer.dropped_bytes == 5 and buffer.high_water == 8
+
+
+def test_full_buffer_drops_the_oldest_bytes():
+    buffer = SerialBuffer(8)
+    buffer.push(b"0123456")
+    assert buffer.push(b"789") == 2
+    assert buffer.push(b"abcdefghijk") == 11
+    assert buffer.pop_all() == bytearray(b"defghijk")
+    assert buffer.tell() == 21 and buffer.dropped_bytes == 13
+
+
+def test_count_across_pushes(monkeypatch):
+    monkeypatch.setattr(SerialBuffer, "COUNT_SCAN", 0)
+    buffer = SerialBuffer(64)
+    buffer.push(b"..\xaa")
+    assert buffer.count(b"\xaa\x55") == 0
+    buffer.push(b"\x55..\xaa\x55")      # completes the occurrence split between the pushes
+    assert buffer.count(b"\xaa\x55") == 2
+    buffer.discard(3)                   # consumes the start of the first one
+    assert buffer.count(b"\xaa\x55") == 1
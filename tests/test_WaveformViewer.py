@@ -0,0 +1,108 @@
+"""
+Live Welch FFT of WaveformViewerWidget: the samples appended are averaged by a StreamingWelch,
+and every refresh shows the spectrum of the samples received until then. PlotPage appends
+the samples of its selected channel.
+
+Run from the repository root:
+    python -m pytest tests
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PyQt5.QtWidgets import QVBoxLayout
+
+from backend.MainModel import MainModel
+from frontend.pages.PlotPage import PlotPage
+from frontend.widgets.WaveformViewerWidget import WaveformViewerWidget, create_welch
+
+
+@pytest.fixture
+def viewer(app):
+    viewer = WaveformViewerWidget()
+    viewer.plotTypeMenu.call_selected_option("Welch FFT")
+    yield viewer
+    viewer.stopLive()
+    viewer.executor.shutdown(wait=True)
+
+
+def chunks(fs, count, size, seed=0):
+    rnd = np.random.default_rng(seed)
+    for i in range(count):
+        t = np.arange(i * size, (i + 1) * size) / fs
+        yield np.sin(2 * np.pi * 1000 * t) + 0.1 * rnd.standard_normal(size)
+
+
+def test_refresh_shows_the_spectrum_of_the_samples_received(viewer):
+    fs = 48000.0
+    reference = create_welch(fs, viewer.computeSettings())
+    for i, chunk in enumerate(chunks(fs, 30, 700)):
+        viewer.appendSamples(chunk, fs)
+        reference.push(chunk)
+        if i % 7 == 6:
+            viewer.renderLive()
+            x, y = viewer.plotData
+            assert np.array_equal(x, reference.frequencies)
+            assert np.allclose(y, reference.spectrum())
+    viewer.renderLive()
+    x, y = viewer.plotData
+    assert np.allclose(y, reference.spectrum())
+    assert x[np.argmax(y)] == pytest.approx(1000, abs=fs / len(reference.frequencies) / 2)
+    data, _, _ = viewer.getAddonData()
+    assert data["type"] == "FFT" and data["data"][1] is y
+
+
+def test_refresh_only_when_segments_complete(viewer):
+    fs = 1000.0
+    segment = viewer.computeSettings()["welchSegment"]
+    viewer.appendSamples(np.zeros(segment - 1), fs)
+    viewer.renderLive()
+    assert viewer.plotData is None
+    viewer.appendSamples(np.ones(1), fs)
+    assert viewer.liveDirty
+    viewer.renderLive()
+    assert viewer.plotData is not None and not viewer.liveDirty
+
+
+def test_samples_are_ignored_by_the_other_plot_types(viewer):
+    viewer.plotTypeMenu.call_selected_option("FFT")
+    viewer.appendSamples(np.ones(4096), 1000.0)
+    assert viewer.welch is None and not viewer.liveTimer.isActive()
+
+
+def test_live_spectrum_replaces_a_dataset_still_computing(app, viewer):
+    x = np.arange(1 << 20) / 1e6
+    viewer.plot(x, np.sin(2 * np.pi * 5000 * x))
+    fs = 48000.0
+    for chunk in chunks(fs, 10, 1000):
+        viewer.appendSamples(chunk, fs)
+    viewer.executor.shutdown(wait=True)     # the dataset spectrum is done
+    app.processEvents()
+    viewer.renderLive()
+    assert np.array_equal(viewer.plotData[0], viewer.welch.frequencies)
+
+
+def test_plot_page_feeds_its_channel(app):
+    page = PlotPage()
+    page.set_model(MainModel())
+    page.initUI(QVBoxLayout())
+    rate = float(page.sampleRate.current_value)
+    batches = [{"a": chunk, "b": -chunk} for chunk in chunks(rate, 12, 500)]
+    page.on_batch_received(batches[0])
+    page.channelMenu.call_selected_option("a")
+    page.spectrumButton.set_value(True)
+    page.on_spectrum(True)
+    reference = create_welch(rate, page.spectrumWidget.computeSettings())
+    for batch in batches[1:]:
+        page.on_batch_received(batch)
+        reference.push(batch["a"])
+    page.spectrumWidget.renderLive()
+    assert np.allclose(page.spectrumWidget.plotData[1], reference.spectrum())
+    page.spectrumButton.set_value(False)
+    page.on_spectrum(False)
+    assert page.spectrumWidget.welch is None
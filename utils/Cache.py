@@ -0,0 +1,85 @@
+"""
+Size-bounded LRU cache for the results of expensive computations (padding, FFTs and
+spectrograms of a capture, min/max pyramids...).
+
+The keys must identify the data and every setting the result depends on, e.g.
+(dataset token, plot type, window, nperseg, noverlap). Values are usually numpy arrays or
+tuples of them, and are shared with the caller: they must not be modified in place.
+"""
+
+from collections import OrderedDict
+import typing
+
+import numpy as np
+
+
+def nbytes(value) -> int:
+    """ Approximate memory used by a value: the numpy arrays it contains (in tuples, lists and
+    dicts, or objects with an nbytes attribute) """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(nbytes(v) for v in value.values())
+    return int(getattr(value, "nbytes", 0))
+
+
+class LRUCache:
+    """ Least recently used cache, bounded by the total size of its values (in bytes).
+    When a new value does not fit, the least recently used values are evicted first.
+    A value larger than the whole cache is not stored.
+    """
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items: typing.OrderedDict[typing.Hashable, typing.Tuple[typing.Any, int]] = OrderedDict()
+        self.size = 0           # bytes used by the values
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __contains__(self, key) -> bool:
+        return key in self._items
+
+    def get(self, key, default=None):
+        """ Value of key (and mark it as the most recently used), or default """
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._items.move_to_end(key)
+        return item[0]
+
+    def put(self, key, value, size: typing.Optional[int] = None):
+        """ Store value. size: its memory in bytes, by default estimated with nbytes() """
+        size = nbytes(value) if size is None else size
+        self.pop(key)
+        if size > self.max_bytes:
+            return
+        self._items[key] = (value, size)
+        self.size += size
+        self.evict()
+
+    def pop(self, key, default=None):
+        item = self._items.pop(key, None)
+        if item is None:
+            return default
+        self.size -= item[1]
+        return item[0]
+
+    def evict(self):
+        """ Remove the least recently used values until the cache fits in max_bytes """
+        while self.size > self.max_bytes and len(self._items) > 0:
+            _, (_, size) = self._items.popitem(last=False)
+            self.size -= size
+
+    def set_max_bytes(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.evict()
+
+    def clear(self):
+        self._items.clear()
+        self.size = 0
@@ -0,0 +1,53 @@
+"""
+FFT backend of the plots: scipy.fft with fast lengths, worker threads and cached windows.
+
+The FFT (pocketfft, behind numpy and scipy) is fast for lengths whose prime factors are small
+(2, 3, 5, 7...), and many times slower for a prime or awkward length, which is common after
+padding or cropping a capture: rfft pads the signal with zeros to next_fast_len(n) by default.
+scipy.fft keeps the plans (twiddle factors) of the last lengths used, so repeated FFTs of the
+same length reuse them, and splits batches of FFTs (e.g. the frames of a spectrogram) between
+`workers` threads. A single 1-D FFT runs in one thread.
+"""
+
+import functools
+import os
+
+import numpy as np
+from scipy import fft as sp_fft
+from scipy import signal
+
+WORKERS = os.cpu_count() or 1       # threads of the batched FFTs
+
+
+def next_fast_len(n: int) -> int:
+    """ Smallest length >= n that the real FFT computes fast """
+    return sp_fft.next_fast_len(int(n), real=True)
+
+
+def rfft(y: np.ndarray, n: int = None, axis: int = -1, workers: int = None) -> np.ndarray:
+    """ FFT of the real signal y along axis.
+    - n: points of the FFT (y is zero padded or cropped), by default next_fast_len of the length of y
+    - workers: threads, by default WORKERS """
+    n = next_fast_len(y.shape[axis]) if n is None else n
+    return sp_fft.rfft(y, n=n, axis=axis, workers=WORKERS if workers is None else workers)
+
+
+def rfftfreq(n: int, d: float = 1.0) -> np.ndarray:
+    """ Frequencies of the bins of rfft with n points and a sampling interval d """
+    return sp_fft.rfftfreq(n, d)
+
+
+@functools.lru_cache(maxsize=64)
+def get_window(window, length: int) -> np.ndarray:
+    """ scipy.signal.get_window(window, length), computed once per (window, length). The array is read-only
+    - window: name of the window, or a tuple with its parameters, e.g. ('tukey', 0.25) """
+    values = signal.get_window(window, length)
+    values.flags.writeable = False
+    return values
+
+
+def amplitude_spectrum(y: np.ndarray, Ts: float, window='boxcar') -> tuple:
+    """ (f, |Y| / len(y)) of the windowed signal. The FFT has next_fast_len(len(y)) points, so the
+    frequency step is a bit finer than 1 / (len(y) * Ts) when len(y) is not a fast length """
+    n = next_fast_len(len(y))
+    return rfftfreq(n, Ts), np.abs(rfft(y * get_window(window, len(y)), n)) / len(y)
@@ -0,0 +1,90 @@
+"""
+Incremental regex search over a line store (LineStore or DiskLineStore).
+
+The absolute indices of the matching lines are kept in a growing int64 array, so jumping to
+the next match or showing only the matching lines does not scan the text again: only the
+lines received since the last update are searched.
+"""
+
+import re
+import typing
+
+import numpy as np
+
+
+class LineSearch:
+    """ Regex search over the complete lines of a store, updated incrementally.
+
+    - update(max_lines) searches the lines received since the last call (at most max_lines of them,
+      so a long history can be searched in steps)
+    - matches: sorted absolute indices of the matching lines still kept in the store
+    Raises re.error if the pattern is not a valid regex.
+    """
+    def __init__(self, store, pattern: str, ignore_case: bool = False):
+        self.store = store
+        self.pattern = pattern
+        self.regex = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+        self.reset()
+
+    def reset(self):
+        self._matches = np.empty(1024, dtype=np.int64)
+        self._start = 0             # matches before this position were discarded by the store
+        self._count = 0
+        self.scanned = self.store.first     # absolute index of the next line to search
+
+    @property
+    def matches(self) -> np.ndarray:
+        return self._matches[self._start:self._count]
+
+    def __len__(self) -> int:
+        return self._count - self._start
+
+    @property
+    def done(self) -> bool:
+        """ True if every complete line of the store has been searched """
+        return self.scanned >= self.store.end
+
+    def update(self, max_lines: typing.Optional[int] = None) -> int:
+        """ Search the new lines. Returns the number of new matches """
+        if self.store.end < self.scanned:
+            self.reset()        # The store was cleared
+        if self.scanned < self.store.first:
+            self.scanned = self.store.first
+        if len(self) > 0 and self._matches[self._start] < self.store.first:
+            self._start += int(np.searchsorted(self.matches, self.store.first))
+
+        stop = self.store.end if max_lines is None else min(self.store.end, self.scanned + max_lines)
+        if stop <= self.scanned:
+            return 0
+        search = self.regex.search
+        found = [i for i, line in enumerate(self.store.lines(self.scanned, stop)) if search(line) is not None]
+        self._append(np.array(found, dtype=np.int64) + self.scanned)
+        self.scanned = stop
+        return len(found)
+
+    def _append(self, values: np.ndarray):
+        if len(values) == 0:
+            return
+        # Reuse the space of the discarded matches, or grow the array
+        if self._count + len(values) > len(self._matches):
+            kept = self.matches.copy()
+            size = max(len(self._matches), 2 * (len(kept) + len(values)))
+            self._matches = np.empty(size, dtype=np.int64)
+            self._matches[:len(kept)] = kept
+            self._start, self._count = 0, len(kept)
+        self._matches[self._count:self._count + len(values)] = values
+        self._count += len(values)
+
+    def row(self, line: int) -> int:
+        """ Position in matches of the first match >= line """
+        return int(np.searchsorted(self.matches, line))
+
+    def next(self, line: int) -> typing.Optional[int]:
+        """ First matching line after line, or None """
+        k = int(np.searchsorted(self.matches, line, side='right'))
+        return int(self.matches[k]) if k < len(self) else None
+
+    def previous(self, line: int) -> typing.Optional[int]:
+        """ Last matching line before line, or None """
+        k = self.row(line)
+        return int(self.matches[k - 1]) if k > 0 else None
@@ -0,0 +1,478 @@
+"""
+Line stores for the console scrollback.
+
+A line store receives text in arbitrary chunks and keeps it as lines, addressed by their
+absolute index (the number of lines received before them), so the index of a line does not
+change when older lines are discarded.
+
+- first:    absolute index of the oldest line kept
+- end:      absolute index after the last complete line
+- the incomplete last line (text after the last '\\n') is kept apart, and is shown as the last row
+- every complete line has an arrival time (time.monotonic), kept in float64 arrays: append()
+  takes the arrival time of every '\\n' of the data, by default the time of the call
+
+LineStore keeps the lines in memory, DiskLineStore keeps a whole session in a file.
+ByteStore keeps raw bytes (for the hex view), with the same raw byte interface as DiskLineStore:
+first_offset, end_offset and read(start, stop).
+"""
+
+import bisect
+import mmap
+import struct
+import time
+import typing
+
+import numpy as np
+
+
+class LineStore:
+    """ In-memory line store with a memory budget (in bytes), and optionally a maximum number of lines.
+
+    Lines are kept in chunks of about CHUNK_SIZE characters: one string with the lines
+    concatenated, plus an array with the offset and an array with the arrival time of every line. Appending costs O(new text)
+    no matter how many lines are kept, and the oldest chunks are discarded when the budget
+    is exceeded. Lines beyond max_lines are hidden at once, and their chunk is discarded once all its lines are.
+    """
+    CHUNK_SIZE = 65536      # characters of a chunk before it is closed
+    MAX_LINE = 4096         # longer lines are split
+    binary = False          # append() takes text (bytes are decoded as UTF-8)
+
+    def __init__(self, memory_budget: int = 16 * 1024 * 1024, max_lines: typing.Optional[int] = None):
+        self.memory_budget = memory_budget
+        self.max_lines = max_lines
+        self.clear()
+
+    def clear(self):
+        self._chunks: typing.List[typing.Tuple[str, np.ndarray, np.ndarray]] = []  # closed chunks (text, line offsets, times)
+        self._chunkFirst: typing.List[int] = []                            # absolute index of their first line
+        self._text = ""             # open chunk
+        self._offsets = [0]         # offsets of the lines of the open chunk (len = lines + 1)
+        self._times = np.empty(0)   # arrival times of the lines of the open chunk
+        self._openFirst = 0         # absolute index of the first line of the open chunk
+        self._partial = ""          # incomplete last line
+        self._memory = 0            # memory used by the closed chunks
+        self.first = 0
+        self.end = 0
+        self.max_length = 0         # length of the longest line received
+        self.time_origin = None     # arrival time of the first line
+
+    def __len__(self) -> int:
+        """ Number of rows kept, including the incomplete last line """
+        return self.end - self.first + (1 if len(self._partial) > 0 else 0)
+
+    @property
+    def partial(self) -> str:
+        return self._partial
+
+    def memory_usage(self) -> int:
+        return self._memory + len(self._text) + 8 * len(self._offsets) + self._times.nbytes + len(self._partial)
+
+    def set_memory_budget(self, memory_budget: int):
+        self.memory_budget = memory_budget
+        self._trim()
+
+    def split_lines(self, text: str, times: typing.Optional[np.ndarray] = None) -> typing.Tuple[typing.List[str], np.ndarray]:
+        """ Split text into complete lines (without '\\n' or '\\r\\n'), keeping the incomplete one.
+        Returns the lines and their arrival times (times of the '\\n' of text, or now) """
+        text = (self._partial + text).replace('\r\n', '\n')
+        lines = text.split('\n')
+        self._partial = lines.pop()
+        if times is not None and len(times) == len(lines):
+            times = np.asarray(times, dtype=np.float64)
+        else:
+            times = np.full(len(lines), time.monotonic())
+        # Split a long incomplete line into whole MAX_LINE pieces, keeping at least its last character (and a
+        # trailing '\r', which can be the start of a '\r\n'), so it is split like the same line received at once
+        length = len(self._partial) - self._partial.endswith('\r')
+        if length > self.MAX_LINE:
+            cut = (length - 1) // self.MAX_LINE * self.MAX_LINE
+            lines.append(self._partial[:cut])
+            times = np.append(times, times[-1] if len(times) > 0 else time.monotonic())
+            self._partial = self._partial[cut:]
+        if len(lines) > 0:
+            longest = max(map(len, lines))
+            if longest > self.MAX_LINE:
+                pieces = [max(1, -(-len(line) // self.MAX_LINE)) for line in lines]
+                lines = [line[i:i + self.MAX_LINE] for line in lines for i in range(0, max(len(line), 1), self.MAX_LINE)]
+                times = np.repeat(times, pieces)
+                longest = self.MAX_LINE
+            self.max_length = max(self.max_length, longest)
+        return lines, times
+
+    def append(self, text: typing.Union[str, bytes], times: typing.Optional[np.ndarray] = None) -> int:
+        """ Append text, with the arrival time of each of its '\\n' (or None to use the current time).
+        Returns the absolute index of the first new complete line (the new complete lines are [returned index, end)) """
+        start = self.end
+        if isinstance(text, (bytes, bytearray)):
+            text = text.decode("utf-8", errors="replace")
+        lines, times = self.split_lines(text, times)
+        if len(lines) == 0:
+            return start
+        if self.time_origin is None:
+            self.time_origin = float(times[0])
+
+        # Fill the open chunk, closing it every CHUNK_SIZE characters
+        ends = np.cumsum(np.fromiter(map(len, lines), dtype=np.int64, count=len(lines)))
+        i = 0
+        while i < len(lines):
+            base = int(ends[i - 1]) if i > 0 else 0
+            room = self.CHUNK_SIZE - len(self._text)
+            j = max(i + 1, int(np.searchsorted(ends, base + room, side='right')))
+            self._text += "".join(lines[i:j])
+            self._offsets.extend((ends[i:j] - base + self._offsets[-1]).tolist())
+            self._times = np.concatenate((self._times, times[i:j]))
+            self.end += j - i
+            i = j
+            if len(self._text) >= self.CHUNK_SIZE:
+                self._close_chunk()
+        self._trim()
+        return start
+
+    def _close_chunk(self):
+        offsets = np.array(self._offsets, dtype=np.int32)
+        self._chunks.append((self._text, offsets, self._times))
+        self._chunkFirst.append(self._openFirst)
+        self._memory += len(self._text) + offsets.nbytes + self._times.nbytes
+        self._text = ""
+        self._offsets = [0]
+        self._times = np.empty(0)
+        self._openFirst = self.end
+
+    def _trim(self):
+        """ Discard the lines beyond max_lines, and the oldest chunks until the store fits in its memory budget """
+        if self.max_lines is not None:
+            self.first = max(self.first, self.end - self.max_lines)
+        while len(self._chunks) > 0:
+            nextFirst = self._chunkFirst[1] if len(self._chunkFirst) > 1 else self._openFirst
+            if nextFirst > self.first and self.memory_usage() <= self.memory_budget:
+                break
+            text, offsets, times = self._chunks.pop(0)
+            self._chunkFirst.pop(0)
+            self._memory -= len(text) + offsets.nbytes + times.nbytes
+            self.first = max(self.first, nextFirst)
+
+    def line(self, index: int) -> str:
+        """ Line with absolute index (first <= index <= end, end being the incomplete line) """
+        if index < self.first:
+            return ""
+        if index >= self._openFirst:
+            i = index - self._openFirst
+            if i < len(self._offsets) - 1:
+                return self._text[self._offsets[i]:self._offsets[i + 1]]
+            return self._partial if index == self.end else ""
+        c = bisect.bisect_right(self._chunkFirst, index) - 1
+        text, offsets, _ = self._chunks[c]
+        i = index - self._chunkFirst[c]
+        return text[offsets[i]:offsets[i + 1]]
+
+    def times(self, start: int, stop: int) -> np.ndarray:
+        """ Arrival times of the complete lines with absolute index in [start, stop) """
+        start = max(start, self.first)
+        stop = min(stop, self.end)
+        parts = []
+        while start < stop:
+            if start >= self._openFirst:
+                parts.append(self._times[start - self._openFirst:stop - self._openFirst])
+                break
+            c = bisect.bisect_right(self._chunkFirst, start) - 1
+            times, chunkFirst = self._chunks[c][2], self._chunkFirst[c]
+            end = min(stop, chunkFirst + len(times))
+            parts.append(times[start - chunkFirst:end - chunkFirst])
+            start = end
+        return np.concatenate(parts) if len(parts) > 0 else np.empty(0)
+
+    def lines(self, start: int, stop: int) -> typing.List[str]:
+        """ Lines with absolute index in [start, stop), limited to the lines kept """
+        start = max(start, self.first)
+        stop = min(stop, self.first + len(self))
+        result = []
+        while start < min(stop, self.end):
+            # Slice every line of a chunk at once
+            if start >= self._openFirst:
+                text, offsets, chunkFirst, chunkEnd = self._text, self._offsets, self._openFirst, self.end
+            else:
+                c = bisect.bisect_right(self._chunkFirst, start) - 1
+                (text, offsets, _), chunkFirst = self._chunks[c], self._chunkFirst[c]
+                chunkEnd = self._chunkFirst[c + 1] if c + 1 < len(self._chunkFirst) else self._openFirst
+                offsets = offsets.tolist()
+            end = min(stop, chunkEnd)
+            bounds = offsets[start - chunkFirst:end - chunkFirst + 1]
+            result.extend(text[a:b] for a, b in zip(bounds[:-1], bounds[1:]))
+            start = end
+        if stop > self.end:
+            result.append(self._partial)
+        return result
+
+
+class ByteStore:
+    """ In-memory store of raw bytes with a memory budget, addressed by absolute offset.
+    The bytes are kept in chunks of about CHUNK_SIZE bytes, the oldest chunks are discarded first """
+    CHUNK_SIZE = 65536
+
+    def __init__(self, memory_budget: int = 16 * 1024 * 1024):
+        self.memory_budget = memory_budget
+        self.clear()
+
+    def clear(self):
+        self._chunks: typing.List[bytes] = []       # closed chunks
+        self._chunkStart: typing.List[int] = []     # absolute offset of their first byte
+        self._open = bytearray()                    # open chunk
+        self._openStart = 0
+        self._memory = 0
+        self.first_offset = 0
+        self.end_offset = 0
+
+    def __len__(self) -> int:
+        return self.end_offset - self.first_offset
+
+    def memory_usage(self) -> int:
+        return self._memory + len(self._open)
+
+    def set_memory_budget(self, memory_budget: int):
+        self.memory_budget = memory_budget
+        self._trim()
+
+    def append(self, data: bytes):
+        self._open += data
+        self.end_offset += len(data)
+        if len(self._open) >= self.CHUNK_SIZE:
+            self._chunks.append(bytes(self._open))
+            self._chunkStart.append(self._openStart)
+            self._memory += len(self._open)
+            self._open = bytearray()
+            self._openStart = self.end_offset
+        self._trim()
+
+    def _trim(self):
+        while len(self._chunks) > 0 and self.memory_usage() > self.memory_budget:
+            self._memory -= len(self._chunks.pop(0))
+            self._chunkStart.pop(0)
+            self.first_offset = self._chunkStart[0] if len(self._chunkStart) > 0 else self._openStart
+
+    def read(self, start: int, stop: int) -> bytes:
+        """ Bytes in [start, stop), limited to the bytes kept """
+        start = max(start, self.first_offset)
+        stop = min(stop, self.end_offset)
+        parts = []
+        while start < stop:
+            if start >= self._openStart:
+                parts.append(bytes(self._open[start - self._openStart:stop - self._openStart]))
+                break
+            c = bisect.bisect_right(self._chunkStart, start) - 1
+            chunk, chunkStart = self._chunks[c], self._chunkStart[c]
+            end = min(stop, chunkStart + len(chunk))
+            parts.append(chunk[start - chunkStart:end - chunkStart])
+            start = end
+        return b"".join(parts)
+
+
+class DiskLineStore:
+    """ Line store that appends the raw data to a session file, with every line kept on disk.
+
+    - path:         session file, with the bytes in the order they were appended
+    - path + .idx:  line index, the end offset of every line in the session file (little endian int64)
+    - path + .time: arrival time of every line (time.monotonic, little endian float64)
+
+    Both files are only appended to, and they are read back through mmap, so the memory used
+    does not grow with the session and any line is found in O(1).
+    Text (str) is appended UTF-8 encoded, and lines are decoded when they are read.
+    """
+    MAX_LINE = LineStore.MAX_LINE
+    binary = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self.indexPath = path + ".idx"
+        self.timePath = path + ".time"
+        self._file = open(self.path, "wb")
+        self._indexFile = open(self.indexPath, "wb")
+        self._timeFile = open(self.timePath, "wb")
+        self._reader = open(self.path, "rb")
+        self._indexReader = open(self.indexPath, "rb")
+        self._timeReader = open(self.timePath, "rb")
+        self._map = None
+        self._indexMap = None
+        self._timeMap = None
+        self._reset()
+
+    def _reset(self):
+        self._size = 0              # bytes in the session file
+        self._lineStart = 0         # offset of the incomplete last line
+        self._lastByte = None       # last byte of the session file
+        self.first = 0
+        self.end = 0
+        self.max_length = 0
+        self.time_origin = None
+
+    def __len__(self) -> int:
+        return self.end + (1 if self._size > self._lineStart else 0)
+
+    @property
+    def partial(self) -> str:
+        return self._decode(self.read(self._lineStart, self._size))
+
+    @property
+    def first_offset(self) -> int:
+        """ Offset of the first byte kept (raw byte interface, as ByteStore) """
+        return 0
+
+    @property
+    def end_offset(self) -> int:
+        return self._size
+
+    def memory_usage(self) -> int:
+        return 0
+
+    def set_memory_budget(self, memory_budget: int):
+        pass        # Everything is kept on disk
+
+    def clear(self):
+        self._close_maps()
+        for f in (self._file, self._indexFile, self._timeFile):
+            f.truncate(0)
+            f.seek(0)
+        self._reset()
+
+    def close(self):
+        self._close_maps()
+        for f in (self._file, self._indexFile, self._timeFile, self._reader, self._indexReader, self._timeReader):
+            f.close()
+
+    def append(self, data: typing.Union[bytes, str], times: typing.Optional[np.ndarray] = None) -> int:
+        """ Append data, with the arrival time of each of its '\\n' (or None to use the current time).
+        Returns the absolute index of the first new complete line """
+        start = self.end
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if len(data) == 0:
+            return start
+
+        base = self._size
+        self._file.write(data)
+        self._size += len(data)
+
+        # End offsets of the new lines (after their '\n'), splitting the lines longer than MAX_LINE (like LineStore:
+        # the text without its '\n' or '\r\n' is cut in MAX_LINE pieces, the incomplete line keeps its last piece)
+        ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord('\n')) + (base + 1)
+        newlineEnds = ends
+        bounds = np.concatenate(([self._lineStart], ends, [self._size]))
+        long = np.flatnonzero(np.diff(bounds) > self.MAX_LINE)
+        if len(long) > 0:
+            last = len(bounds) - 2
+            byte = lambda offset: data[offset - base] if offset >= base else self._lastByte
+            extra = []
+            for k in long:
+                # Text of the line: without its terminator, or its trailing '\r' if it is incomplete
+                if k == last:
+                    stop = bounds[k + 1] - (1 if data[-1] == ord('\r') else 0)
+                else:
+                    stop = bounds[k + 1] - (2 if bounds[k + 1] - bounds[k] > 1 and byte(bounds[k + 1] - 2) == ord('\r') else 1)
+                extra.append(np.arange(bounds[k] + self.MAX_LINE, stop, self.MAX_LINE))
+            ends = np.sort(np.concatenate([ends] + extra))
+
+        if len(ends) > 0:
+            # A split line gets the time of the '\n' that ends it (or the last time, if it has none yet)
+            now = time.monotonic()
+            if times is None or len(times) != len(newlineEnds):
+                times = np.full(len(newlineEnds), now)
+            times = np.append(np.asarray(times, dtype=np.float64), times[-1] if len(times) > 0 else now)
+            lineTimes = times[np.searchsorted(newlineEnds, ends)]
+            if self.time_origin is None:
+                self.time_origin = float(lineTimes[0])
+
+            self.max_length = max(self.max_length, int(np.diff(ends, prepend=self._lineStart).max()))
+            self._indexFile.write(ends.astype("<i8").tobytes())
+            self._timeFile.write(lineTimes.astype("<f8").tobytes())
+            self._lineStart = int(ends[-1])
+            self.end += len(ends)
+        self._lastByte = data[-1]
+        self._file.flush()
+        self._indexFile.flush()
+        self._timeFile.flush()
+        return start
+
+    def line(self, index: int) -> str:
+        """ Line with absolute index (0 <= index <= end, end being the incomplete line) """
+        if index < 0 or index > self.end:
+            return ""
+        if index == self.end:
+            return self.partial
+        start = self._line_end(index - 1) if index > 0 else 0
+        data = self.read(start, self._line_end(index))
+        if data.endswith(b"\n"):
+            data = data[:-1]
+            if data.endswith(b"\r"):
+                data = data[:-1]
+        return self._decode(data)
+
+    def lines(self, start: int, stop: int) -> typing.List[str]:
+        """ Lines with absolute index in [start, stop), read with a single access to each file """
+        start = max(start, 0)
+        stop = min(stop, len(self))
+        complete = min(stop, self.end)
+        result = []
+        if complete > start:
+            if self._indexMap is None or 8 * complete > len(self._indexMap):
+                self._indexMap = self._remap(self._indexMap, self._indexReader)
+            ends = np.frombuffer(self._indexMap[8 * max(start - 1, 0):8 * complete], dtype="<i8")
+            if start == 0:
+                ends = np.concatenate(([0], ends))
+            base = int(ends[0])
+            block = self.read(base, int(ends[-1]))
+            # Fast path: every line ends with '\n' (no long line was split)
+            result = self._decode(block).split("\n")
+            if len(result) == len(ends) and result.pop() == "":
+                if b"\r" in block:
+                    result = [line[:-1] if line.endswith("\r") else line for line in result]
+                if stop > self.end:
+                    result.append(self.partial)
+                return result
+            result = []
+            for a, b in zip((ends[:-1] - base).tolist(), (ends[1:] - base).tolist()):
+                line = block[a:b]
+                if line.endswith(b"\n"):
+                    line = line[:-2] if line.endswith(b"\r\n") else line[:-1]
+                result.append(self._decode(line))
+        if stop > self.end:
+            result.append(self.partial)
+        return result
+
+    def times(self, start: int, stop: int) -> np.ndarray:
+        """ Arrival times of the complete lines with absolute index in [start, stop) """
+        start = max(start, 0)
+        stop = min(stop, self.end)
+        if stop <= start:
+            return np.empty(0)
+        if self._timeMap is None or 8 * stop > len(self._timeMap):
+            self._timeMap = self._remap(self._timeMap, self._timeReader)
+        return np.frombuffer(self._timeMap[8 * start:8 * stop], dtype="<f8").astype(np.float64)
+
+    def _decode(self, data: bytes) -> str:
+        return data.decode("utf-8", errors="replace")
+
+    def _line_end(self, index: int) -> int:
+        if self._indexMap is None or 8 * (index + 1) > len(self._indexMap):
+            self._indexMap = self._remap(self._indexMap, self._indexReader)
+        return struct.unpack_from("<q", self._indexMap, 8 * index)[0]
+
+    def read(self, start: int, stop: int) -> bytes:
+        """ Raw bytes of the session file in [start, stop) """
+        if stop <= start:
+            return b""
+        if self._map is None or stop > len(self._map):
+            self._map = self._remap(self._map, self._reader)
+        return self._map[start:stop]
+
+    def _remap(self, old: typing.Optional[mmap.mmap], reader) -> mmap.mmap:
+        """ Map the file again, to see the data appended since the last mapping """
+        if old is not None:
+            old.close()
+        return mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _close_maps(self):
+        for m in (self._map, self._indexMap, self._timeMap):
+            if m is not None:
+                m.close()
+        self._map = None
+        self._indexMap = None
+        self._timeMap = None
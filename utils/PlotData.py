@@ -0,0 +1,148 @@
+"""
+Helpers to reduce the data of a plot to what can be seen on screen.
+
+A line plot cannot show more than about two values per horizontal pixel, so long series are
+reduced to a min/max envelope: for every bin of samples, its minimum and its maximum. The
+envelope keeps every peak and glitch of the data (unlike taking one sample every n), and
+the cost of drawing it only depends on the plot width.
+
+Images (spectrograms) are reduced the same way in two dimensions with max_pool: every pixel
+shows the maximum of a block of values, so narrow peaks stay visible at any zoom.
+"""
+
+import typing
+
+import numpy as np
+
+
+def _envelope(low: np.ndarray, high: np.ndarray, size: int, skip: int) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Min of low and max of high over blocks of size values, the first one starting at skip.
+    The values before skip and after the last whole block make two partial blocks.
+    Returns the index of the first value of every block, and their mins and maxs """
+    n = len(low)
+    count = max(0, (n - skip) // size)
+    stop = skip + count * size
+    mins = low[skip:stop].reshape(count, size).min(axis=1)
+    maxs = high[skip:stop].reshape(count, size).max(axis=1)
+    starts = skip + size * np.arange(count)
+    if skip > 0:
+        mins = np.concatenate(([low[:skip].min()], mins))
+        maxs = np.concatenate(([high[:skip].max()], maxs))
+        starts = np.concatenate(([0], starts))
+    if stop < n:
+        mins = np.concatenate((mins, [low[stop:].min()]))
+        maxs = np.concatenate((maxs, [high[stop:].max()]))
+        starts = np.concatenate((starts, [stop]))
+    return starts, mins, maxs
+
+
+def _interleave(mins: np.ndarray, maxs: np.ndarray) -> np.ndarray:
+    values = np.empty(2 * len(mins), dtype=np.result_type(mins, maxs))
+    values[0::2] = mins
+    values[1::2] = maxs
+    return values
+
+
+def minmax_decimate(x: np.ndarray, y: np.ndarray, bins: int, start: int = 0) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """ Min/max envelope of y in at most bins bins, as (x, y) with two points per bin (min and max).
+    Returns the data unchanged if it has no more than 2 * bins samples.
+    - start: absolute index of y[0]. The bins are aligned to multiples of the bin size, so the
+      envelope of a stream does not flicker when the window moves by a few samples
+    """
+    n = len(y)
+    if bins <= 0 or n <= 2 * bins:
+        return x, y
+    size = -(-n // bins)
+    starts, mins, maxs = _envelope(y, y, size, (-start) % size)
+    return np.repeat(x[starts], 2), _interleave(mins, maxs)
+
+
+class MinMaxPyramid:
+    """ Min/max level-of-detail pyramid of a series, to draw any range of a long series at
+    screen resolution in O(bins), no matter how many samples the range has.
+
+    Level k keeps the min and the max of the blocks of base * 2**k samples (each level halves
+    the resolution of the previous one). Building it costs O(n) and about n / base values of memory.
+    """
+    def __init__(self, y: np.ndarray, base: int = 16):
+        self.base = base
+        self.size = len(y)
+        self.levels: typing.List[typing.Tuple[np.ndarray, np.ndarray]] = []     # (mins, maxs)
+        if len(y) < base:
+            return
+        _, mins, maxs = _envelope(y, y, base, 0)
+        self.levels.append((mins, maxs))
+        while len(mins) > 1:
+            _, mins, maxs = _envelope(mins, maxs, 2, 0)
+            self.levels.append((mins, maxs))
+
+    @property
+    def nbytes(self) -> int:
+        return sum(mins.nbytes + maxs.nbytes for mins, maxs in self.levels)
+
+    def decimate(self, x: np.ndarray, y: np.ndarray, start: int, stop: int, bins: int) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """ Min/max envelope of y[start:stop] in at most bins bins, like minmax_decimate(x[start:stop], y[start:stop], bins, start).
+        Only the level with blocks just below the samples per bin is read.
+        - x, y: the series the pyramid was built from
+        """
+        samplesPerBin = (stop - start) / max(1, bins)
+        if len(self.levels) == 0 or samplesPerBin < 2 * self.base:
+            return minmax_decimate(x[start:stop], y[start:stop], bins, start)
+        level = min(int(np.log2(samplesPerBin / self.base)), len(self.levels) - 1)
+        block = self.base << level
+        mins, maxs = self.levels[level]
+        first, last = -(-start // block), stop // block        # whole blocks of the level in the range
+        # Blocks of the level per bin, aligned to the absolute block index
+        size = -(-(last - first) // bins)
+        starts, mins, maxs = _envelope(mins[first:last], maxs[first:last], size, (-first) % size)
+        positions = (first + starts) * block
+        # The samples before the first whole block and after the last one are reduced from the series
+        head, tail = y[start:first * block], y[last * block:stop]
+        if len(head) > 0:
+            positions = np.concatenate(([start], positions))
+            mins, maxs = np.concatenate(([head.min()], mins)), np.concatenate(([head.max()], maxs))
+        if len(tail) > 0:
+            positions = np.concatenate((positions, [last * block]))
+            mins, maxs = np.concatenate((mins, [tail.min()])), np.concatenate((maxs, [tail.max()]))
+        return np.repeat(x[positions], 2), _interleave(mins, maxs)
+
+
+def visible_range(x: np.ndarray, xmin: float, xmax: float, margin: int = 1) -> typing.Tuple[int, int]:
+    """ Indices [start, stop) of the samples of a sorted x inside [xmin, xmax], found with a binary
+    search, plus margin samples on each side so the lines reach the borders of the view """
+    start = int(np.searchsorted(x, xmin, side='left')) - margin
+    stop = int(np.searchsorted(x, xmax, side='right')) + margin
+    return max(0, start), min(len(x), stop)
+
+
+def visible_data(x: np.ndarray, y: np.ndarray, xmin: float, xmax: float) -> typing.Tuple[np.ndarray, np.ndarray]:
+    """ Samples of a sorted x with xmin <= x <= xmax, and their y, as views (no copy).
+    Same result as the mask (x >= xmin) & (x <= xmax), found with a binary search """
+    start, stop = visible_range(x, xmin, xmax, margin=0)
+    return x[start:stop], y[start:stop]
+
+
+def visible_spectrogram(f: np.ndarray, t: np.ndarray, Sxx: np.ndarray, tmin: float, tmax: float,
+                        fmin: float, fmax: float) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Frequencies, times and values of a spectrogram (Sxx of shape (frequencies, times)) inside
+    [tmin, tmax] x [fmin, fmax], as views (no copy) """
+    tStart, tStop = visible_range(t, tmin, tmax, margin=0)
+    fStart, fStop = visible_range(f, fmin, fmax, margin=0)
+    return f[fStart:fStop], t[tStart:tStop], Sxx[fStart:fStop, tStart:tStop]
+
+
+def pooled_range(start: int, stop: int, bins: int, length: int) -> typing.Tuple[int, int, int]:
+    """ Block size to reduce the indices [start, stop) to at most about bins blocks, and the range extended to
+    whole blocks aligned to multiples of the size (so the blocks do not change when the range moves).
+    Returns (size, start, stop), stop is at most length """
+    size = max(1, -(-(stop - start) // max(1, bins)))
+    return size, start - start % size, min(length, -(-stop // size) * size)
+
+
+def max_pool(image: np.ndarray, rowSize: int, colSize: int) -> np.ndarray:
+    """ Maximum of the blocks of rowSize x colSize values of a 2D image (the last blocks may be smaller) """
+    if rowSize > 1:
+        image = np.maximum.reduceat(image, np.arange(0, image.shape[0], rowSize), axis=0)
+    if colSize > 1:
+        image = np.maximum.reduceat(image, np.arange(0, image.shape[1], colSize), axis=1)
+    return image
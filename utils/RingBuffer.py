@@ -0,0 +1,60 @@
+"""
+Fixed-length ring buffer of samples (or rows, e.g. spectrogram columns) for live plots.
+
+The samples are written twice, at i and i + capacity of a buffer of 2 * capacity, so the last
+samples are always a contiguous slice of the buffer: view() costs O(1) and never copies,
+and it can be passed directly to PlotDataItem.setData.
+"""
+
+import numpy as np
+
+
+class RingBuffer:
+    """ Keeps the last capacity samples of a channel.
+    - extend(values) costs O(len(values)), no matter how many samples are kept
+    - view(): the samples kept, oldest first (a view of the buffer, only valid until the next extend)
+    - total: number of samples received since the last clear
+    - shape: shape of every item (e.g. (frequencies,) to keep spectrogram columns), by default scalars
+    """
+    def __init__(self, capacity: int, dtype=np.float64, shape: tuple = ()):
+        self.capacity = max(1, int(capacity))
+        self._buffer = np.zeros((2 * self.capacity,) + tuple(shape), dtype=dtype)
+        self.clear()
+
+    def clear(self):
+        self._head = 0          # position of the next sample, in [0, capacity)
+        self._size = 0
+        self.total = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def extend(self, values: np.ndarray):
+        values = np.asarray(values)
+        self.total += len(values)
+        values = values[-self.capacity:]        # Older samples would be overwritten anyway
+        n = len(values)
+        if n == 0:
+            return
+        head, capacity = self._head, self.capacity
+        first = min(n, capacity - head)
+        self._buffer[head:head + first] = values[:first]
+        self._buffer[head + capacity:head + capacity + first] = values[:first]
+        rest = n - first
+        if rest > 0:
+            self._buffer[:rest] = values[first:]
+            self._buffer[capacity:capacity + rest] = values[first:]
+        self._head = (head + n) % capacity
+        self._size = min(capacity, self._size + n)
+
+    def view(self) -> np.ndarray:
+        end = self._head + self.capacity
+        return self._buffer[end - self._size:end]
+
+    def resize(self, capacity: int):
+        """ Change the capacity, keeping the last samples """
+        kept = self.view()[-max(1, int(capacity)):].copy()
+        total = self.total
+        self.__init__(capacity, self._buffer.dtype, self._buffer.shape[1:])
+        self.extend(kept)
+        self.total = total
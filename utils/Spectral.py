@@ -0,0 +1,134 @@
+"""
+Spectral analysis of streams: short-time Fourier transform computed incrementally.
+
+StreamingSTFT keeps the samples that overlap the next frame, so every call to push() only
+computes the columns completed by the new samples: the frames are a strided view of the
+samples (no copy), and their FFTs are computed in batches with one rfft call (split between the
+FFT worker threads, see utils/FFT.py). The cost of an
+update depends on the number of new samples, not on the length of the history.
+
+The columns have the same values as scipy.signal.spectrogram(..., scaling='spectrum',
+mode='magnitude') with the default constant detrend.
+
+StreamingWelch averages those spectra as the segments complete (Welch's method), which is the
+live spectrum analyzer: linear, exponential or peak hold averaging, each update only costs the
+FFTs of the new segments.
+"""
+
+import typing
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from utils.FFT import rfft, rfftfreq, get_window
+
+
+class StreamingSTFT:
+    """ Incremental STFT of a stream of samples.
+    - push(samples): spectra of the new complete frames, shape (frames, frequencies)
+    - frequencies: frequency of every bin, times(first, count): center time of columns [first, first + count)
+    - columns: number of columns computed since the last reset
+    """
+    BLOCK = 256         # frames per batched rfft, bounds the temporary memory
+
+    def __init__(self, nperseg: int = 256, noverlap: typing.Optional[int] = None, fs: float = 1.0, window='hann', detrend: bool = True):
+        self.nperseg = int(nperseg)
+        noverlap = self.nperseg // 8 if noverlap is None else int(noverlap)     # scipy's default
+        self.hop = max(1, self.nperseg - noverlap)
+        self.fs = fs
+        self.detrend = detrend
+        self.window = get_window(window, self.nperseg)
+        self.scale = 1.0 / self.window.sum()
+        self.frequencies = rfftfreq(self.nperseg, 1.0 / fs)
+        self.reset()
+
+    def reset(self):
+        self._pending = np.empty(0)     # samples from the start of the next frame
+        self.columns = 0
+
+    def times(self, first: int, count: int) -> np.ndarray:
+        return (self.nperseg / 2 + self.hop * (first + np.arange(count))) / self.fs
+
+    def push(self, samples: np.ndarray) -> np.ndarray:
+        """ Add samples. Returns the spectra of the frames they complete, shape (frames, len(frequencies)) """
+        data = np.concatenate((self._pending, np.asarray(samples, dtype=np.float64)))
+        count = 0 if len(data) < self.nperseg else (len(data) - self.nperseg) // self.hop + 1
+        self._pending = data[count * self.hop:].copy()
+        if count == 0:
+            return np.empty((0, len(self.frequencies)))
+        frames = sliding_window_view(data, self.nperseg)[::self.hop][:count]
+        self.columns += count
+        return self.spectra(frames)
+
+    def spectra(self, frames: np.ndarray) -> np.ndarray:
+        """ Magnitude spectra of frames (frames, nperseg), in batches of BLOCK frames """
+        result = np.empty((len(frames), len(self.frequencies)))
+        for start in range(0, len(frames), self.BLOCK):
+            block = frames[start:start + self.BLOCK]
+            if self.detrend:
+                block = block - block.mean(axis=1, keepdims=True)
+            result[start:start + len(block)] = np.abs(rfft(block * self.window, self.nperseg, axis=1)) * self.scale
+        return result
+
+
+class StreamingWelch:
+    """ Averaged magnitude spectrum of a stream: the power spectra of the segments are averaged as they complete.
+    - averaging: 'linear' (mean of every segment since the last reset), 'exponential' (the weight of a segment
+      decays by 1 - 1/averages per newer segment) or 'peak' (maximum of every segment, peak hold)
+    - spectrum(): square root of the average power, in the units of StreamingSTFT (sqrt of the first bins of
+      scipy.signal.welch(..., scaling='spectrum', return_onesided=False) for the linear average)
+    - segments: number of segments averaged since the last reset
+    """
+    AVERAGING = ('linear', 'exponential', 'peak')
+
+    def __init__(self, nperseg: int = 1024, noverlap: typing.Optional[int] = None, fs: float = 1.0, window='hann',
+                 averaging: str = 'linear', averages: int = 10):
+        if averaging not in self.AVERAGING:
+            raise ValueError(f"Invalid averaging: {averaging}")
+        noverlap = int(nperseg) // 2 if noverlap is None else noverlap
+        self.stft = StreamingSTFT(nperseg, noverlap, fs, window)
+        self.frequencies = self.stft.frequencies
+        self.averaging = averaging
+        self.alpha = 1.0 / max(1, int(averages))
+        self.reset()
+
+    def reset(self):
+        self.stft.reset()
+        self._power = np.zeros(len(self.frequencies))     # sum, exponential average or maximum of the power spectra
+        self.segments = 0
+
+    def push(self, samples: np.ndarray) -> int:
+        """ Add samples. Returns the number of segments they complete (the spectrum changed if > 0) """
+        power = self.stft.push(samples)
+        count = len(power)
+        if count == 0:
+            return 0
+        power *= power
+        if self.averaging == 'linear':
+            self._power += power.sum(axis=0)
+        elif self.averaging == 'peak':
+            np.maximum(self._power, power.max(axis=0), out=self._power)
+        else:
+            if self.segments == 0:          # the average starts at the first segment
+                self._power[:] = power[0]
+                power = power[1:]
+            # k new segments at once: avg = (1 - a)**k * avg + sum(a * (1 - a)**(k - 1 - i) * power[i])
+            decay = 1.0 - self.alpha
+            weights = self.alpha * decay ** np.arange(len(power) - 1, -1, -1)
+            self._power *= decay ** len(power)
+            self._power += weights @ power
+        self.segments += count
+        return count
+
+    def spectrum(self) -> np.ndarray:
+        if self.averaging == 'linear':
+            return np.sqrt(self._power / max(1, self.segments))
+        return np.sqrt(self._power)
+
+
+def spectrogram(y: np.ndarray, fs: float = 1.0, nperseg: int = 256, noverlap: typing.Optional[int] = None, window='hann') -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Magnitude spectrogram of a whole signal, like scipy.signal.spectrogram(y, fs, window, nperseg, noverlap,
+    scaling='spectrum', mode='magnitude'). Returns (f, t, Sxx) with Sxx of shape (frequencies, times) """
+    stft = StreamingSTFT(nperseg, noverlap, fs, window)
+    columns = stft.push(y)
+    return stft.frequencies, stft.times(0, len(columns)), columns.T